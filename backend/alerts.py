@@ -0,0 +1,202 @@
+"""
+Motor de alertas de precio
+
+Cada nueva observación de mercado (suggest, reprice) se evalúa contra el
+umbral de su producto: regla del producto, si no la de su categoría más
+específica (las reglas de "Asientos" aplican a "Asientos - Ejecutiva"), si
+no MOBICORP_ALERT_THRESHOLD_PERCENT (10). Una alerta se descarta como
+repetida si el producto ya tuvo otra en la misma dirección dentro de
+MOBICORP_ALERT_COOLDOWN_HOURS (24) y el precio no se movió al menos un
+umbral más desde entonces.
+
+Las alertas nuevas se difunden con AlertHub a los clientes conectados por
+SSE o WebSocket, así los dashboards no necesitan consultar periódicamente.
+Con varios workers, tanto la difusión como la invalidación de las reglas
+pasan por el estado compartido (shared_state).
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from categories import ancestor_paths
+from models import AlertRule, PriceAlert, Product
+from shared_state import MemoryBackend, StateBackend
+
+DEFAULT_THRESHOLD = float(os.getenv("MOBICORP_ALERT_THRESHOLD_PERCENT", "10"))
+COOLDOWN_HOURS = float(os.getenv("MOBICORP_ALERT_COOLDOWN_HOURS", "24"))
+RULES_TOPIC = "alert_rules"
+ALERTS_CHANNEL = "price_alerts"
+
+
+class AlertEngine:
+    """Evaluación de alertas con umbrales configurables y deduplicación"""
+
+    def __init__(
+        self,
+        default_threshold: float = DEFAULT_THRESHOLD,
+        cooldown_hours: float = COOLDOWN_HOURS,
+        state: Optional[StateBackend] = None,
+    ):
+        self.default_threshold = default_threshold
+        self.cooldown = timedelta(hours=cooldown_hours)
+        self.state = state or MemoryBackend()
+        self._product_rules: Optional[Dict[int, float]] = None
+        self._category_rules: Optional[Dict[str, float]] = None
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def invalidate_rules(self) -> None:
+        """Descartar las reglas cacheadas en todos los workers (llamar tras modificarlas)"""
+        self.state.bump(RULES_TOPIC)
+
+    def _rules(self, db: Session) -> Tuple[Dict[int, float], Dict[str, float]]:
+        with self._lock:
+            version = self.state.version(RULES_TOPIC)
+            if self._product_rules is None or self._version != version:
+                rules = db.query(AlertRule).all()
+                self._product_rules = {r.product_id: r.threshold_percent for r in rules if r.product_id is not None}
+                self._category_rules = {r.category: r.threshold_percent for r in rules if r.category}
+                self._version = version
+            return self._product_rules, self._category_rules
+
+    def threshold_for(self, db: Session, product: Product) -> float:
+        """Umbral (%) del producto: regla propia, de su categoría o por defecto"""
+        product_rules, category_rules = self._rules(db)
+        if product.id in product_rules:
+            return product_rules[product.id]
+        for path in reversed(ancestor_paths(product.category or "")):
+            if path in category_rules:
+                return category_rules[path]
+        return self.default_threshold
+
+    def evaluate(self, db: Session, products: Sequence[Product], reference_prices: Sequence[float]) -> List[PriceAlert]:
+        """
+        Crear las alertas de los productos cuyo precio de referencia se aleja
+        de su precio base más que su umbral. Agrega las alertas a la sesión
+        sin hacer commit.
+        """
+        if not products:
+            return []
+        # NumPy se carga con el primer cálculo, no al importar la app
+        from pricing import alert_indexes, price_variations
+
+        thresholds = [self.threshold_for(db, product) for product in products]
+        current = [product.price for product in products]
+        candidates = alert_indexes(current, reference_prices, [t / 100 for t in thresholds])
+        if not candidates:
+            return []
+        variations = price_variations(current, reference_prices)
+
+        # Última alerta reciente de cada candidato (una consulta para todo el lote)
+        since = datetime.now(timezone.utc) - self.cooldown
+        candidate_ids = [products[i].id for i in candidates]
+        latest = (
+            db.query(func.max(PriceAlert.id))
+            .filter(PriceAlert.product_id.in_(candidate_ids), PriceAlert.created_at >= since)
+            .group_by(PriceAlert.product_id)
+        )
+        previous = {
+            alert.product_id: alert
+            for alert in db.query(PriceAlert).filter(PriceAlert.id.in_(latest)).all()
+        }
+
+        alerts = []
+        seen: Set[int] = set()
+        for i in candidates:
+            product = products[i]
+            if product.id in seen:
+                continue
+            seen.add(product.id)
+            last = previous.get(product.id)
+            if last is not None and (last.variation_percent > 0) == (variations[i] > 0) and last.new_price:
+                moved = abs(reference_prices[i] - last.new_price) / last.new_price * 100
+                if moved < thresholds[i]:
+                    continue
+            alert = PriceAlert(
+                product_id=product.id,
+                old_price=product.price,
+                new_price=reference_prices[i],
+                variation_percent=float(variations[i]),
+                threshold_percent=thresholds[i],
+            )
+            db.add(alert)
+            alerts.append(alert)
+        return alerts
+
+
+def alert_event(alert: PriceAlert, product_name: Optional[str] = None) -> Dict:
+    """Representación JSON de una alerta (API, SSE y WebSocket)"""
+    return {
+        "id": alert.id,
+        "product_id": alert.product_id,
+        "product_name": product_name or (alert.product.name if alert.product else "N/A"),
+        "old_price": alert.old_price,
+        "new_price": alert.new_price,
+        "variation_percent": alert.variation_percent,
+        "threshold_percent": alert.threshold_percent,
+        "created_at": alert.created_at.isoformat() if alert.created_at else None,
+    }
+
+
+class AlertHub:
+    """
+    Difusión de alertas nuevas
+    Cada suscriptor (conexión SSE/WebSocket) tiene una cola en su event loop;
+    publish() se puede llamar desde cualquier hilo. Los eventos viajan por el
+    canal del estado compartido, así llegan a los suscriptores de todos los
+    workers. Si un cliente lento llena su cola, se descartan sus eventos
+    nuevos (al reconectar recupera las alertas perdidas por ID).
+    """
+
+    def __init__(self, max_queue: int = 100, state: Optional[StateBackend] = None):
+        self.max_queue = max_queue
+        self.state = state or MemoryBackend()
+        self._subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+        self.state.subscribe(ALERTS_CHANNEL, lambda message: self._deliver(message["events"]))
+
+    def subscribe(self) -> asyncio.Queue:
+        """Registrar un suscriptor; debe llamarse desde su event loop"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, events: List[Dict]) -> None:
+        """Difundir eventos a los suscriptores de todos los workers"""
+        if events:
+            self.state.publish(ALERTS_CHANNEL, {"events": events})
+
+    def _deliver(self, events: List[Dict]) -> None:
+        """Entregar eventos a los suscriptores de este proceso"""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            for event in events:
+                try:
+                    loop.call_soon_threadsafe(_offer, queue, event)
+                except RuntimeError:
+                    # El loop del suscriptor ya terminó
+                    self.unsubscribe(queue)
+                    break
+
+
+def _offer(queue: asyncio.Queue, event: Dict) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
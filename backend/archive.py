@@ -0,0 +1,196 @@
+"""
+Archivo de comparaciones y alertas de precio viejas
+
+Cada consulta de mercado agrega una fila a price_comparisons (y a veces a
+price_alerts). Las filas más viejas que MOBICORP_ARCHIVE_COMPARISONS_DAYS /
+MOBICORP_ARCHIVE_ALERTS_DAYS se mueven a price_comparisons_archive /
+price_alerts_archive (mismas columnas y mismo ID, más archived_at): las
+tablas que usan las peticiones quedan con los últimos meses y el historial
+se sigue consultando con comparisons_page, alerts_page y latest_comparison.
+
+El movimiento es por lotes de ARCHIVE_BATCH filas: INSERT ... SELECT y
+DELETE de los mismos IDs en una transacción (una fila está en una tabla o
+en la otra, nunca en ambas ni en ninguna), con una pausa entre lotes para
+que entren las escrituras de las peticiones, como la poda del historial de
+precios. Dos procesos archivando a la vez no chocan: el INSERT ignora los
+IDs que ya se movieron.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from alerts import alert_event
+from models import PriceAlert, PriceAlertArchive, PriceComparison, PriceComparisonArchive, Product
+
+# Días en la tabla principal antes de archivar (0 = no archivar)
+RETENTION_DAYS = {
+    "comparisons": int(os.getenv("MOBICORP_ARCHIVE_COMPARISONS_DAYS", "180")),
+    "alerts": int(os.getenv("MOBICORP_ARCHIVE_ALERTS_DAYS", "90")),
+}
+TABLES = {
+    "comparisons": (PriceComparison, PriceComparisonArchive),
+    "alerts": (PriceAlert, PriceAlertArchive),
+}
+ARCHIVE_INTERVAL = 3600  # Como máximo un archivado por hora y proceso
+ARCHIVE_BATCH = 1000  # Filas por transacción
+ARCHIVE_PAUSE = 0.05  # Segundos entre lotes
+
+_lock = threading.Lock()
+_last_archive: Optional[float] = None
+
+
+def _columns(model) -> List[str]:
+    return [column.name for column in model.__table__.columns]
+
+
+def archive_table(db: Session, name: str, cutoff: datetime, batch_size: int = ARCHIVE_BATCH) -> int:
+    """Mover a la tabla de archivo las filas creadas antes de cutoff; devuelve las movidas. Hace commit"""
+    hot, cold = TABLES[name]
+    columns = _columns(hot)
+    # La fila más nueva nunca se archiva: SQLite reutiliza los IDs si la
+    # tabla queda vacía y chocarían con los archivados (y los clientes de
+    # /api/prices/alerts/stream dejarían de recibir alertas por after_id)
+    newest = db.query(func.max(hot.id)).scalar()
+    moved = 0
+    while newest is not None:
+        ids = [
+            id_ for (id_,) in db.query(hot.id)
+            .filter(hot.created_at < cutoff, hot.id < newest)
+            .order_by(hot.id)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        archived_at = datetime.now(timezone.utc)
+        db.execute(
+            insert(cold)
+            .from_select(
+                columns + ["archived_at"],
+                select(*[hot.__table__.c[column] for column in columns], literal(archived_at))
+                .where(hot.id.in_(ids)),
+            )
+            .on_conflict_do_nothing()
+        )
+        # Cuenta solo las que borró esta transacción (otro proceso pudo mover alguna antes)
+        moved += db.query(hot).filter(hot.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        if len(ids) < batch_size:
+            break
+        time.sleep(ARCHIVE_PAUSE)
+    return moved
+
+
+def archive_old_rows(db: Session, now: Optional[datetime] = None, batch_size: int = ARCHIVE_BATCH) -> Dict[str, int]:
+    """Aplicar la política de archivo a comparaciones y alertas; devuelve filas movidas por tabla"""
+    now = now or datetime.now(timezone.utc)
+    return {
+        name: archive_table(db, name, now - timedelta(days=days), batch_size)
+        for name, days in RETENTION_DAYS.items() if days > 0
+    }
+
+
+def maybe_archive(session_factory: Callable[[], Session]) -> bool:
+    """
+    Archivar en un hilo aparte si pasó ARCHIVE_INTERVAL desde la última vez
+    (la petición que lo dispara no espera)
+    """
+    global _last_archive
+    with _lock:
+        now = time.monotonic()
+        if _last_archive is not None and now - _last_archive < ARCHIVE_INTERVAL:
+            return False
+        _last_archive = now
+
+    def run():
+        db = session_factory()
+        try:
+            moved = archive_old_rows(db)
+            if any(moved.values()):
+                print(f"[Archivo] Filas archivadas: {moved}")
+        except Exception as e:
+            print(f"Error al archivar comparaciones y alertas: {type(e).__name__}: {e}")
+        finally:
+            db.close()
+
+    threading.Thread(target=run, name="price-archive", daemon=True).start()
+    return True
+
+
+def archive_stats(db: Session) -> Dict:
+    """Filas en cada tabla principal y de archivo, con la fecha más vieja de cada una"""
+    stats = {}
+    for name, (hot, cold) in TABLES.items():
+        hot_count, hot_oldest = db.query(func.count(hot.id), func.min(hot.created_at)).one()
+        cold_count, cold_oldest = db.query(func.count(cold.id), func.min(cold.created_at)).one()
+        stats[name] = {
+            "retention_days": RETENTION_DAYS[name],
+            "active": hot_count,
+            "oldest_active": hot_oldest,
+            "archived": cold_count,
+            "oldest_archived": cold_oldest,
+        }
+    return stats
+
+
+# ==================== CONSULTAS ====================
+
+def latest_comparison(db: Session, product_id: int):
+    """Última comparación del producto (del archivo si no quedan recientes)"""
+    for model in TABLES["comparisons"]:
+        comparison = db.query(model).filter(model.product_id == product_id).order_by(
+            model.created_at.desc()
+        ).first()
+        if comparison is not None:
+            return comparison
+    return None
+
+
+def _union(name: str, *conditions):
+    """Filas de la tabla principal y del archivo juntas, con la columna archived"""
+    selects = []
+    for model, archived in zip(TABLES[name], (False, True)):
+        columns = [model.__table__.c[column] for column in _columns(TABLES[name][0])]
+        query = select(*columns, literal(archived).label("archived"))
+        for condition in conditions:
+            query = query.where(condition(model))
+        selects.append(query)
+    return union_all(*selects).subquery()
+
+
+def _products(db: Session, product_ids) -> Dict[int, Product]:
+    return {product.id: product for product in db.query(Product).filter(Product.id.in_(set(product_ids)))}
+
+
+def comparisons_page(db: Session, product_id: Optional[int] = None, skip: int = 0, limit: int = 100) -> List[Dict]:
+    """Comparaciones recientes y archivadas, las más nuevas primero"""
+    conditions = [lambda model: model.product_id == product_id] if product_id else []
+    rows = _union("comparisons", *conditions)
+    result = db.execute(
+        select(rows).order_by(rows.c.created_at.desc(), rows.c.id.desc()).offset(skip).limit(limit)
+    ).all()
+    products = _products(db, [row.product_id for row in result])
+    return [{**row._mapping, "product": products.get(row.product_id)} for row in result]
+
+
+def alerts_page(db: Session, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                limit: int = 50) -> List[Dict]:
+    """Alertas recientes y archivadas por ID (más nuevas primero), como alert_event con archived"""
+    conditions = []
+    if after_id is not None:
+        conditions.append(lambda model: model.id > after_id)
+    if before_id is not None:
+        conditions.append(lambda model: model.id < before_id)
+    rows = _union("alerts", *conditions)
+    result = db.execute(select(rows).order_by(rows.c.id.desc()).limit(limit)).all()
+    products = _products(db, [row.product_id for row in result])
+    return [
+        {**alert_event(row, products[row.product_id].name if row.product_id in products else "N/A"),
+         "archived": row.archived}
+        for row in result
+    ]
@@ -0,0 +1,290 @@
+"""
+Registro de auditoría: quién hizo qué y cuándo
+
+Las acciones (crear pedido, aprobar, crear producto, sugerir precio...) se
+registran con AuditLog.record(), que no toca la base: agrega el evento a un
+buffer en memoria y lo escribe en el diario del proceso (una línea JSON).
+Un hilo vuelca el buffer a la tabla audit_events en lotes, con un solo
+INSERT por lote, cada MOBICORP_AUDIT_FLUSH_SECONDS o apenas se juntan
+MOBICORP_AUDIT_BATCH_SIZE eventos. La tabla solo admite inserciones (en
+SQLite, triggers rechazan UPDATE y DELETE; ver models.py).
+
+- Diario: cada lote pendiente tiene su archivo en una subcarpeta de
+  MOBICORP_AUDIT_JOURNAL_DIR propia de la base (hash de su URL; con SQLite,
+  de la ruta absoluta del archivo): audit-<pid>-<n>.jsonl, bloqueado con
+  flock mientras el proceso vive y borrado después del commit del lote. Si
+  el proceso muere, al arrancar el siguiente encuentra archivos sin dueño
+  (el bloqueo se libera con el proceso) y los vuelca. Solo se recupera la
+  subcarpeta de la propia base: el diario de otra (un benchmark corrido en
+  la misma carpeta) nunca termina en esta. Cada evento tiene un UUID:
+  volcar dos veces el mismo lote no duplica filas. Vacío (o sin fcntl) =
+  sin diario; solo se pierde lo que esté en memoria si el proceso muere.
+- Contrapresión: si la base no acepta escrituras, los lotes se reintentan y
+  el buffer crece hasta MOBICORP_AUDIT_MAX_PENDING eventos; ahí record()
+  espera al volcado como mucho MOBICORP_AUDIT_BLOCK_MS y, si sigue lleno,
+  descarta el evento y lo cuenta (la operación del usuario no falla nunca
+  por la auditoría).
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+
+from models import AuditEvent
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos no se puede saber qué diario tiene dueño
+    fcntl = None
+
+ENABLED = os.getenv("MOBICORP_AUDIT", "1") != "0"
+BATCH_SIZE = int(os.getenv("MOBICORP_AUDIT_BATCH_SIZE", "200"))
+FLUSH_SECONDS = float(os.getenv("MOBICORP_AUDIT_FLUSH_SECONDS", "1"))
+MAX_PENDING = int(os.getenv("MOBICORP_AUDIT_MAX_PENDING", "10000"))
+BLOCK_MS = float(os.getenv("MOBICORP_AUDIT_BLOCK_MS", "100"))
+JOURNAL_DIR = os.getenv("MOBICORP_AUDIT_JOURNAL_DIR", "audit_journal")
+# Espera entre reintentos cuando la base rechaza un lote
+RETRY_SECONDS = 2.0
+
+def database_key(session_factory: sessionmaker) -> str:
+    """Identificador corto de la base de las sesiones (nombre de la subcarpeta del diario)"""
+    url = session_factory.kw["bind"].url
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        identity = "sqlite:" + os.path.realpath(url.database)
+    else:
+        identity = url.render_as_string(hide_password=True)
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:12]
+
+
+class _Segment:
+    """Archivo del diario de un lote: abierto y bloqueado hasta que el lote se escribe"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, line: str) -> None:
+        # Sin fsync: write() deja la línea en el sistema operativo, que la
+        # conserva aunque el proceso muera (no ante un corte de energía)
+        self.file.write(line)
+        self.file.flush()
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+        self.file.close()
+
+
+class AuditLog:
+    """Buffer de eventos con volcado por lotes a audit_events"""
+
+    def __init__(self, session_factory: sessionmaker, enabled: bool = ENABLED, batch_size: int = BATCH_SIZE,
+                 flush_seconds: float = FLUSH_SECONDS, max_pending: int = MAX_PENDING,
+                 block_ms: float = BLOCK_MS, journal_dir: Optional[str] = JOURNAL_DIR):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max(max_pending, self.batch_size)
+        self.block_seconds = block_ms / 1000
+        self.journal_dir = (Path(journal_dir) / database_key(session_factory)
+                            if journal_dir and fcntl is not None else None)
+        self._buffer: List[Dict] = []
+        self._segment: Optional[_Segment] = None
+        self._sequence = 0
+        # Lotes tomados del buffer que todavía no se escribieron (se reintentan en orden)
+        self._batches: List[tuple] = []
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+        self.recovered = 0
+
+    # ---- registro ----
+
+    def record(self, action: str, user_id: Optional[int] = None, entity: Optional[str] = None,
+               entity_id: Optional[int] = None, **details) -> None:
+        """Registrar una acción (no bloquea salvo con el buffer lleno; nunca lanza)"""
+        if not self.enabled:
+            return
+        payload = {
+            "event_id": uuid.uuid4().hex,
+            "action": action,
+            "user_id": user_id,
+            "entity": entity,
+            "entity_id": entity_id,
+            "details": json.dumps(details, ensure_ascii=False, default=str) if details else None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._cond:
+            if self._pending >= self.max_pending:
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._pending < self.max_pending, self.block_seconds)
+                if self._pending >= self.max_pending:
+                    self.dropped += 1
+                    if self.dropped == 1 or self.dropped % 1000 == 0:
+                        print(f"Auditoría: buffer lleno, {self.dropped} eventos descartados")
+                    return
+            try:
+                if self._segment is None and self.journal_dir is not None:
+                    self._segment = self._open_segment()
+                if self._segment is not None:
+                    self._segment.append(json.dumps(payload, ensure_ascii=False) + "\n")
+            except OSError as e:
+                # Sin diario el evento igual se escribe en el próximo lote
+                print(f"Auditoría: no se pudo escribir el diario: {e}")
+            self._buffer.append(payload)
+            self._pending += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _open_segment(self) -> _Segment:
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._sequence += 1
+        return _Segment(self.journal_dir / f"audit-{os.getpid()}-{self._sequence}.jsonl")
+
+    # ---- volcado ----
+
+    def flush(self) -> int:
+        """Escribir todo lo pendiente; devuelve los eventos escritos (0 si la base falló)"""
+        with self._flush_lock:
+            with self._cond:
+                if self._buffer:
+                    self._batches.append((self._buffer, self._segment))
+                    self._buffer, self._segment = [], None
+                batches = list(self._batches)
+            written = 0
+            for events, segment in batches:
+                try:
+                    self._insert(events)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Auditoría: error al escribir {len(events)} eventos (se reintentará): "
+                          f"{type(e).__name__}: {e}")
+                    break
+                if segment is not None:
+                    segment.discard()
+                written += len(events)
+                with self._cond:
+                    self._batches.pop(0)
+                    self._pending -= len(events)
+                    self.written += len(events)
+                    self._cond.notify_all()
+            return written
+
+    def _insert(self, events: List[Dict]) -> None:
+        rows = [{**payload, "created_at": datetime.fromisoformat(payload["created_at"])} for payload in events]
+        with self.session_factory() as db:
+            db.execute(insert(AuditEvent).on_conflict_do_nothing(index_elements=["event_id"]), rows)
+            db.commit()
+
+    def _flusher(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or len(self._buffer) >= self.batch_size
+                    or self._pending >= self.max_pending,
+                    self.flush_seconds,
+                )
+                stopping = self._stopping
+            if stopping:
+                return
+            if self._pending and not self.flush() and self._batches:
+                # La base no acepta escrituras: esperar antes de reintentar
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopping, RETRY_SECONDS)
+
+    # ---- recuperación ----
+
+    def recover(self) -> int:
+        """Volcar los diarios de procesos que murieron antes de escribirlos"""
+        if self.journal_dir is None or not self.journal_dir.is_dir():
+            return 0
+        recovered = 0
+        for path in sorted(self.journal_dir.glob("audit-*.jsonl")):
+            try:
+                file = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with file:
+                try:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Lo tiene un proceso vivo
+                events = []
+                for line in file:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        pass  # Última línea cortada por la caída
+                if events:
+                    self._insert(events)
+                path.unlink(missing_ok=True)
+            recovered += len(events)
+        if recovered:
+            print(f"Auditoría: {recovered} eventos recuperados del diario")
+        self.recovered += recovered
+        return recovered
+
+    # ---- ciclo de vida ----
+
+    def start(self) -> None:
+        """Recuperar diarios huérfanos y arrancar el hilo de volcado"""
+        if not self.enabled or self._thread is not None:
+            return
+        try:
+            self.recover()
+        except Exception as e:
+            print(f"Auditoría: error al recuperar el diario: {type(e).__name__}: {e}")
+        self._stopping = False
+        self._thread = threading.Thread(target=self._flusher, name="audit-flusher", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Detener el hilo y escribir lo pendiente (si falla, queda en el diario)"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        self.flush()
+        with self._cond:
+            for _, segment in self._batches:
+                if segment is not None:
+                    segment.file.close()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self._pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "recovered": self.recovered,
+            "journal": str(self.journal_dir) if self.journal_dir is not None else None,
+        }
+
+
+def event_payload(audit_event: AuditEvent) -> Dict:
+    """Evento como dict para la API (details decodificado)"""
+    return {
+        "id": audit_event.id,
+        "action": audit_event.action,
+        "user_id": audit_event.user_id,
+        "entity": audit_event.entity,
+        "entity_id": audit_event.entity_id,
+        "details": json.loads(audit_event.details) if audit_event.details else {},
+        "created_at": audit_event.created_at,
+    }
@@ -1,17 +1,17 @@
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User
+from profiling import phase
+from tokens import ACCESS, TokenError, TokenService
 
-# Configuración
-SECRET_KEY = "mobicorp-secret-key-change-in-production"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Emisión y verificación de tokens (claves rotables, caché y revocación: ver
+# tokens.py); main.py le pasa el estado compartido de la app
+token_service = TokenService(SessionLocal)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -43,16 +43,9 @@ def get_password_hash(password: str) -> str:
     return hashed.decode('utf-8')
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Crear token JWT"""
-    to_encode = data.copy()
-    # Usar datetime.now(timezone.utc) en lugar de datetime.utcnow() (deprecado en Python 3.12+)
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    """Crear token JWT de acceso para data["sub"] (email)"""
+    lifetime = expires_delta.total_seconds() if expires_delta else None
+    return token_service.issue(data["sub"], data.get("uid"), ACCESS, lifetime)
 
 def get_db():
     """Obtener sesión de base de datos"""
@@ -62,35 +55,47 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """Obtener usuario actual desde token"""
+def authenticate_token(token: str, db: Session) -> User:
+    """Validar un token JWT y devolver el usuario activo asociado"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        # Decodificar el token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError as e:
+        claims = token_service.verify(token)
+    except TokenError as e:
         # Log del error para debugging
-        print(f"Error decodificando token: {e}")
+        print(f"Token rechazado: {e}")
         raise credentials_exception
     except Exception as e:
         # Log de otros errores
         print(f"Error inesperado en autenticación: {e}")
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    user = token_service.user(db, claims)
     if user is None:
-        print(f"Usuario no encontrado para email: {email}")
+        print(f"Usuario no encontrado para email: {claims.get('sub')}")
         raise credentials_exception
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuario inactivo"
         )
-    return user
\ No newline at end of file
+    return user
+
+def token_subject(token: str) -> Optional[str]:
+    """
+    Email de un token con firma válida, sin consultar la base (None si el
+    token no es válido). Sirve para identificar al cliente antes de la
+    autenticación completa, por ejemplo en los límites de peticiones.
+    """
+    try:
+        return token_service.decode(token).get("sub")
+    except TokenError:
+        return None
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """Obtener usuario actual desde token"""
+    with phase("auth"):
+        return authenticate_token(token, db)
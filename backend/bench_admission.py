@@ -0,0 +1,129 @@
+"""
+Benchmark del control de admisión
+
+Satura /api/prices/suggest (scraper simulado con latencia) con muchos
+clientes concurrentes y, al mismo tiempo, mide la latencia de un endpoint
+barato (/api/products). Corre dos veces, sin y con límites de peticiones,
+cada una en su propio proceso, y compara:
+
+- sin límites, las sugerencias ocupan el pool de hilos del worker y
+  /api/products espera detrás de ellas;
+- con límites, las sugerencias que exceden el tope reciben 429 con
+  Retry-After y /api/products mantiene su latencia.
+
+Uso:
+    python bench_admission.py [--flood 48] [--duration 10] [--scraper-latency 0.5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict
+
+BENCH_DB = "admission_bench.db"
+PRODUCTS = 500
+ORDERS = 2000
+USERS = 20
+
+
+def run_mode(args) -> Dict:
+    """Una corrida (en este proceso) con los límites activados o no"""
+    os.environ["MOBICORP_DATABASE_URL"] = f"sqlite:///./{BENCH_DB}"
+    os.environ["MOBICORP_RATE_LIMITING"] = "1" if args.mode == "on" else "0"
+
+    import requests
+    from loadtest import database_matches, seed_database, start_server, percentile
+    from auth import create_access_token
+
+    if not database_matches(PRODUCTS, ORDERS):
+        seed_database(PRODUCTS, ORDERS, USERS, seed=42)
+    server, _ = start_server(args.port, args.scraper_latency, seed=42)
+    url = f"http://127.0.0.1:{args.port}"
+    # Tokens emitidos directamente: el login también tiene límite por IP
+    tokens = [create_access_token({"sub": f"user{i}@loadtest.mobicorp.com"}) for i in range(USERS)]
+
+    deadline = time.perf_counter() + args.duration
+    flood_codes: Counter = Counter()
+    probe_latencies = []
+    lock = threading.Lock()
+
+    def flood(index: int):
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {tokens[index % len(tokens)]}"
+        while time.perf_counter() < deadline:
+            response = session.post(f"{url}/api/prices/suggest", params={"product_id": index % PRODUCTS + 1})
+            with lock:
+                flood_codes[response.status_code] += 1
+            if response.status_code == 429:
+                # Un cliente educado respeta Retry-After (acotado para no cortar la prueba)
+                time.sleep(min(float(response.headers.get("retry-after", 1)), 1.0))
+
+    def probe():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {tokens[0]}"
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = session.get(f"{url}/api/products", params={"limit": 50})
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code == 200:
+                probe_latencies.append(elapsed)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=flood, args=(i,)) for i in range(args.flood)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.should_exit = True
+
+    probe_latencies.sort()
+    return {
+        "mode": args.mode,
+        "flood_status": dict(flood_codes),
+        "probe_requests": len(probe_latencies),
+        "probe_p50_ms": round(percentile(probe_latencies, 50), 2),
+        "probe_p95_ms": round(percentile(probe_latencies, 95), 2),
+        "probe_p99_ms": round(percentile(probe_latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del control de admisión")
+    parser.add_argument("--flood", type=int, default=48, help="Clientes concurrentes pidiendo sugerencias")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por corrida")
+    parser.add_argument("--scraper-latency", type=float, default=0.5, help="Latencia simulada del scraper (s)")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--mode", choices=["on", "off"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    results = []
+    for mode in ("off", "on"):
+        command = [sys.executable, __file__, "--mode", mode, "--flood", str(args.flood),
+                   "--duration", str(args.duration), "--scraper-latency", str(args.scraper_latency),
+                   "--port", str(args.port)]
+        output = subprocess.run(command, cwd=Path(__file__).resolve().parent, capture_output=True,
+                                text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.flood} clientes saturando /api/prices/suggest (scraper {args.scraper_latency}s), "
+          f"{args.duration:.0f} s por corrida\n")
+    print(f"{'límites':<8} {'suggest 200':>12} {'suggest 429':>12} {'products p50':>13} "
+          f"{'p95':>9} {'p99':>9}")
+    for result in results:
+        status = result["flood_status"]
+        print(f"{result['mode']:<8} {status.get('200', 0):>12} {status.get('429', 0):>12} "
+              f"{result['probe_p50_ms']:>10.1f} ms {result['probe_p95_ms']:>6.1f} ms {result['probe_p99_ms']:>6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark del costo de autenticación por petición
+
+Mide, en microsegundos por petición, lo que agrega get_current_user:
+
+- anterior: decodificar el JWT con python-jose y buscar al usuario por
+  email en la base, en cada petición;
+- token nuevo: primera petición con un token (verificación completa y
+  usuario desde la base);
+- en caché: peticiones siguientes con el mismo token (claims y usuario en
+  memoria, solo expiración y revocación);
+- revocación: consulta de la lista con N tokens revocados.
+
+Verifica además que un token revocado se rechace, que una rotación de
+claves no invalide los tokens emitidos y que retirar una clave sí lo haga.
+Usa una base y un archivo de claves temporales.
+
+Uso:
+    python bench_auth.py [--requests 20000] [--revoked 100000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="bench_auth_"))
+os.environ["MOBICORP_DATABASE_URL"] = f"sqlite:///{WORKDIR / 'auth_bench.db'}"
+
+from jose import jwt  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import RevokedToken, User  # noqa: E402
+from tokens import KeyRing, TokenError, TokenService, rotate_key_file  # noqa: E402
+
+EMAIL = "bench@mobicorp.com"
+
+
+def per_request(function, requests: int) -> float:
+    """Microsegundos por llamada"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        function()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del costo de autenticación por petición")
+    parser.add_argument("--requests", type=int, default=20000, help="Peticiones simuladas por caso")
+    parser.add_argument("--revoked", type=int, default=100000, help="Tokens revocados en la lista")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(User(email=EMAIL, hashed_password="-", full_name="Bench", role="sales", is_active=True))
+        db.commit()
+
+    keys_file = WORKDIR / "jwt_keys.json"
+    service = TokenService(SessionLocal, keys=KeyRing(inline="", path=str(keys_file), check_seconds=0))
+    token = service.issue(EMAIL, 1)
+
+    # Camino anterior: decodificar y consultar al usuario en cada petición
+    legacy_secret = "bench-secret"
+    legacy_token = jwt.encode({"sub": EMAIL, "exp": int(time.time()) + 3600}, legacy_secret, algorithm="HS256")
+
+    def legacy():
+        email = jwt.decode(legacy_token, legacy_secret, algorithms=["HS256"])["sub"]
+        with SessionLocal() as db:
+            db.query(User).filter(User.email == email).first()
+
+    def cold():
+        service._verified.clear()
+        service._users.clear()
+        with SessionLocal() as db:
+            service.user(db, service.verify(token))
+
+    def cached():
+        with SessionLocal() as db:
+            service.user(db, service.verify(token))
+
+    requests = args.requests
+    results = {
+        "Anterior (jose + consulta)": per_request(legacy, requests),
+        "Token nuevo (sin caché)": per_request(cold, max(requests // 4, 1)),
+        "En caché": per_request(cached, requests),
+    }
+
+    # Lista de revocación grande: la consulta sigue siendo O(1)
+    now = time.time()
+    with SessionLocal() as db:
+        db.execute(RevokedToken.__table__.insert(), [
+            {"jti": f"bench-{i}", "expires_at": now + 3600} for i in range(args.revoked)
+        ])
+        db.commit()
+    service.state.bump("revocations")
+    claims = service.decode(token)
+    service.revocations.is_revoked(claims)  # Sincroniza una vez
+    results[f"Revocación ({args.revoked:,} revocados)"] = per_request(
+        lambda: service.revocations.is_revoked(claims), requests
+    )
+    results[f"En caché ({args.revoked:,} revocados)"] = per_request(cached, requests)
+
+    print(f"Peticiones por caso: {requests:,}")
+    for name, micros in results.items():
+        print(f"  {name:<32} {micros:8.1f} µs/petición")
+
+    # Verificaciones
+    checks = []
+    with SessionLocal() as db:
+        service.revoke(db, service.verify(token))
+    try:
+        service.verify(token)
+        checks.append(("token revocado rechazado", False))
+    except TokenError:
+        checks.append(("token revocado rechazado", True))
+
+    before = service.issue(EMAIL, 1)
+    rotate_key_file(str(keys_file), keep=2)
+    after = service.issue(EMAIL, 1)
+    checks.append(("rotación: firma con la clave nueva",
+                   jwt.get_unverified_header(after)["kid"] != jwt.get_unverified_header(before)["kid"]))
+    try:
+        service.verify(before)
+        checks.append(("rotación: el token anterior sigue valiendo", True))
+    except TokenError:
+        checks.append(("rotación: el token anterior sigue valiendo", False))
+    rotate_key_file(str(keys_file), keep=1)
+    try:
+        service.verify(before)
+        checks.append(("clave retirada: el token anterior se rechaza", False))
+    except TokenError:
+        checks.append(("clave retirada: el token anterior se rechaza", True))
+
+    for name, ok in checks:
+        print(f"  [{'OK' if ok else 'ERROR'}] {name}")
+
+
+if __name__ == "__main__":
+    main()
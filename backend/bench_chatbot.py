@@ -0,0 +1,128 @@
+"""
+Benchmark del motor de intenciones del chatbot
+
+Mide mensajes por segundo y precisión de clasificación sobre un corpus
+etiquetado en español e inglés. No necesita base de datos: el catálogo
+se carga con los productos de ejemplo de init_db.py.
+
+Uso:
+    python bench_chatbot.py [--iterations 2000]
+"""
+import argparse
+import time
+
+from intent_engine import (
+    IntentEngine,
+    GREETING, HELP, PRICE, PRODUCT, ORDER, COMPARISON, REPORT, GENERAL,
+)
+
+CATALOG = [
+    (1, "Silla Ejecutiva Ergonómica Premium", "MCP-SEJ-001", "Asientos - Ejecutiva"),
+    (2, "Silla Gerencial con Reposacabezas", "MCP-SGE-002", "Asientos - Gerencial"),
+    (3, "Silla Operativa Básica", "MCP-SOP-003", "Asientos - Operativa"),
+    (4, "Escritorio Ejecutivo Directoría", "MCP-EDE-004", "Mobiliario Corporativo - Directoría"),
+    (5, "Escritorio Gerencial Moderno", "MCP-EGM-005", "Mobiliario Corporativo - Gerencial"),
+    (6, "Mesa de Reunión Ovalada 8 Personas", "MCP-MRO-006", "Mobiliario Corporativo - Reuniones"),
+    (7, "Mesa de Reunión Rectangular 12 Personas", "MCP-MRR-007", "Mobiliario Corporativo - Reuniones"),
+    (8, "Estación de Trabajo Individual", "MCP-ETI-008", "Mobiliario Corporativo - Estaciones de trabajo"),
+    (9, "Módulo de Recepción Moderno", "MCP-MRM-009", "Mobiliario Corporativo - Recepción"),
+    (10, "Archivero de 4 Cajones", "MCP-ARC-010", "Mobiliario Corporativo - Apoyo"),
+    (11, "Estantería de Acero 5 Niveles", "MCP-EAC-011", "Mobiliario Corporativo - Acero"),
+    (12, "Sofá Lounge Ejecutivo", "MCP-SLE-012", "Asientos - Lounge"),
+    (13, "Mesa de Centro Moderna", "MCP-MCM-013", "Mobiliario Corporativo - Apoyo"),
+    (14, "Silla Longarina para Sala de Espera", "MCP-SLO-014", "Asientos - Longarinas"),
+    (15, "Escritorio Operativo con Estante", "MCP-EOE-015", "Mobiliario Corporativo - Operativa"),
+]
+
+# (mensaje, intención esperada)
+CORPUS = [
+    ("Hola", GREETING),
+    ("Buenos días", GREETING),
+    ("buenas tardes!", GREETING),
+    ("hello there", GREETING),
+    ("Hi", GREETING),
+    ("ayuda", HELP),
+    ("¿Qué puedo hacer aquí?", HELP),
+    ("help", HELP),
+    ("show me the commands", HELP),
+    ("¿Cuál es el precio de Silla Operativa Básica?", PRICE),
+    ("precio del Escritorio Gerencial Moderno", PRICE),
+    ("cuánto cuesta la Mesa de Centro Moderna", PRICE),
+    ("what is the price of Sofá Lounge Ejecutivo", PRICE),
+    ("how much is the Archivero de 4 Cajones", PRICE),
+    ("costo de MCP-SEJ-001", PRICE),
+    ("Listar productos", PRODUCT),
+    ("lista productos", PRODUCT),
+    ("Mostrar productos de Asientos - Ejecutiva", PRODUCT),
+    ("productos de la categoría Mobiliario Corporativo - Reuniones", PRODUCT),
+    ("list all products", PRODUCT),
+    ("stock de Silla Gerencial con Reposacabezas", PRODUCT),
+    ("show products in Asientos - Lounge", PRODUCT),
+    ("Estantería de Acero 5 Niveles", PRODUCT),
+    ("Ver mis pedidos", ORDER),
+    ("Estado del pedido 5", ORDER),
+    ("precio del pedido 5", ORDER),
+    ("pedido #12", ORDER),
+    ("my orders", ORDER),
+    ("order 7 status", ORDER),
+    ("cuánto costó la orden 3", ORDER),
+    ("mis ventas", ORDER),
+    ("Comparar precios de Silla Ejecutiva Ergonómica Premium", COMPARISON),
+    ("comparación de Mesa de Reunión Ovalada 8 Personas", COMPARISON),
+    ("compare prices for Escritorio Ejecutivo Directoría", COMPARISON),
+    ("precios del mercado para Módulo de Recepción Moderno", COMPARISON),
+    ("Mostrar reporte de ventas", REPORT),
+    ("Estadísticas de márgenes", REPORT),
+    ("sales report", REPORT),
+    ("resumen de ingresos", REPORT),
+    ("revenue summary", REPORT),
+    ("hola, ¿me muestras el reporte de ventas?", REPORT),
+    ("gracias", GENERAL),
+    ("el clima está agradable", GENERAL),
+    ("thanks a lot", GENERAL),
+]
+
+
+def build_engine() -> IntentEngine:
+    engine = IntentEngine()
+    engine.load_catalog(
+        [(pid, name, sku) for pid, name, sku, _ in CATALOG],
+        sorted({category for *_, category in CATALOG}),
+    )
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de intenciones")
+    parser.add_argument("--iterations", type=int, default=2000, help="Pasadas sobre el corpus")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = build_engine()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    errors = []
+    for message, expected in CORPUS:
+        got = engine.classify(message).intent
+        if got != expected:
+            errors.append((message, expected, got))
+    accuracy = 1 - len(errors) / len(CORPUS)
+
+    messages = [message for message, _ in CORPUS]
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for message in messages:
+            engine.classify(message)
+    elapsed = time.perf_counter() - start
+    total = args.iterations * len(messages)
+
+    print(f"Corpus: {len(CORPUS)} mensajes etiquetados")
+    print(f"Construcción del motor: {build_ms:.2f} ms")
+    print(f"Precisión: {accuracy * 100:.1f}% ({len(CORPUS) - len(errors)}/{len(CORPUS)})")
+    print(f"Rendimiento: {total / elapsed:,.0f} mensajes/s ({elapsed * 1e6 / total:.1f} µs/mensaje)")
+    for message, expected, got in errors:
+        print(f"  [ERROR] '{message}': esperado={expected} obtenido={got}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark del motor de precios
+
+Genera mercados sintéticos (3 a 8 fuentes por producto, algunos con un
+precio atípico) y mide productos por segundo calculando uno a uno y todo el
+catálogo en una sola pasada. Verifica además que ambos caminos den
+exactamente las mismas estadísticas y que el atípico no arrastre la sugerencia.
+
+Uso:
+    python bench_pricing.py [--products 20000] [--seed 42]
+"""
+import argparse
+import random
+import time
+from dataclasses import asdict
+
+from pricing import PricingEngine
+
+SOURCES = ["Agimex", "Corimexo", "Blau", "Living Room", "Tua Casa", "La cuisine", "Hogar Plus", "Oficentro"]
+
+
+def build_markets(products: int, seed: int):
+    """Mercados sintéticos; uno de cada cinco productos trae una fuente atípica (x3)"""
+    rng = random.Random(seed)
+    markets = []
+    for _ in range(products):
+        base = rng.uniform(200, 8000)
+        sources = rng.sample(SOURCES, rng.randint(3, len(SOURCES)))
+        market = [{"source": name, "price": round(base * rng.uniform(0.85, 1.15), 2)} for name in sources]
+        if len(market) >= 5 and rng.random() < 0.2:
+            market[rng.randrange(len(market))]["price"] = round(base * 3, 2)
+        markets.append((base, market))
+    return markets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de precios")
+    parser.add_argument("--products", type=int, default=20000, help="Productos sintéticos")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = PricingEngine(source_weights={"Agimex": 1.2, "Blau": 0.8})
+    data = build_markets(args.products, args.seed)
+    markets = [market for _, market in data]
+
+    start = time.perf_counter()
+    one_by_one = [engine.price(market) for market in markets]
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = engine.price_many(markets)
+    batch_elapsed = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(one_by_one, batch)) if asdict(a) != asdict(b)]
+
+    # Con un atípico, la sugerencia robusta debe quedar cerca del precio base
+    skewed = [(base, stats) for (base, market), stats in zip(data, batch) if stats.outlier_sources]
+    mean_error = sum(abs(stats.avg_price - base) / base for base, stats in skewed) / max(len(skewed), 1)
+    robust_error = sum(abs(stats.suggested_price - base) / base for base, stats in skewed) / max(len(skewed), 1)
+
+    print(f"Productos: {args.products:,}")
+    print(f"Uno a uno:     {args.products / single_elapsed:,.0f} productos/s ({single_elapsed * 1000:.1f} ms)")
+    print(f"Catálogo:      {args.products / batch_elapsed:,.0f} productos/s ({batch_elapsed * 1000:.1f} ms)")
+    print(f"Resultados idénticos: {'sí' if not mismatches else f'NO ({len(mismatches)} diferencias)'}")
+    print(f"Productos con atípico: {len(skewed):,} | error medio del promedio: {mean_error * 100:.1f}% "
+          f"| error medio de la sugerencia: {robust_error * 100:.1f}%")
+    for i in mismatches[:5]:
+        print(f"  [ERROR] producto {i}: {asdict(one_by_one[i])} != {asdict(batch[i])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark del camino de precios sin red (fuentes simuladas)
+
+Con el simulador de scraper_sim.py (semilla fija, latencia lognormal, una
+fracción de errores y una cola lenta) compara tres formas de consultar las
+seis fuentes de un producto:
+
+- en serie, como PriceScraper (el tiempo es la suma de las fuentes);
+- en paralelo (el tiempo es la fuente más lenta);
+- en paralelo con timeout por fuente (la cola lenta se corta, a cambio de
+  perder esas fuentes).
+
+Para cada una informa la latencia de una sugerencia (p50/p95/p99, tiempo
+simulado), las fuentes perdidas, cuánto se aparta el precio sugerido del
+que se obtendría con el mercado completo y el tiempo de un repricing del
+catálogo con SCRAPING_WORKERS hilos (tiempo real con las esperas escaladas
+por --time-scale, expresado en tiempo simulado).
+
+Verifica además que dos corridas con la misma semilla y distinto orden de
+los hilos den exactamente los mismos resultados, y que una página grabada
+se reproduzca sin red con el mismo precio (--fixtures DIR reproduce además
+una grabación real hecha con record_scraper_fixtures.py).
+
+Uso:
+    python bench_scraper.py [--products 200] [--seed 42] [--timeout-ms 500] [--fixtures DIR]
+"""
+import argparse
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from loadtest import PRODUCT_TEMPLATES, percentile
+from price_scraper import FetchedPage, PriceScraper
+from pricing import PricingEngine
+from scraper_sim import (
+    DEFAULT_SOURCES, PARALLEL, SEQUENTIAL, FixtureStore, RecordingFetcher, ReplayFetcher, SimulatedScraper,
+    with_overrides,
+)
+
+SCRAPING_WORKERS = 8  # Como main.SCRAPING_WORKERS
+
+
+def build_products(count: int, seed: int):
+    rng = random.Random(seed)
+    products = []
+    for index in range(count):
+        name, category, _ = rng.choice(PRODUCT_TEMPLATES)
+        products.append((f"{name} {index + 1:05d}", category))
+    return products
+
+
+def simulate(scraper: SimulatedScraper, products, engine: PricingEngine, complete: Dict) -> Dict:
+    """Una sugerencia por producto, en tiempo simulado (sin esperar)"""
+    latencies, lost, empty, deviations = [], 0, 0, []
+    for name, category in products:
+        market = scraper.scrape_prices(name, category)
+        latencies.append(scraper.elapsed_ms(scraper.plan(name, category, 0)))
+        lost += len(scraper.sources) - len(market)
+        stats = engine.price(market)
+        if stats is None:
+            empty += 1
+            continue
+        reference = complete[name]
+        deviations.append(abs(stats.suggested_price - reference) / reference * 100)
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "lost": lost / (len(products) * len(scraper.sources)) * 100,
+        "empty": empty,
+        "deviation": sum(deviations) / max(len(deviations), 1),
+    }
+
+
+def reprice_wall(scraper: SimulatedScraper, products) -> float:
+    """Repricing del catálogo con SCRAPING_WORKERS hilos; devuelve el tiempo simulado en ms"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SCRAPING_WORKERS) as pool:
+        list(pool.map(lambda product: scraper.scrape_prices(*product), products))
+    return (time.perf_counter() - start) / scraper.time_scale * 1000
+
+
+def run_threads(scraper: SimulatedScraper, products, workers: int) -> List:
+    """Cada producto consultado dos veces, en el orden en que terminen los hilos"""
+    jobs = products + products[::-1]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda product: (product[0], scraper.scrape_prices(*product)), jobs))
+    return sorted((name, repr(market)) for name, market in results)
+
+
+def fake_page(url: str, headers: Dict[str, str], timeout: float) -> FetchedPage:
+    """'Sitio' local para la prueba de grabación: el precio sale de la URL"""
+    price = 1000 + sum(map(ord, url)) % 2000
+    html = (f"<html><body><h1>{url}</h1><span class='precio'>Bs {price:,}.50</span></body></html>")
+    return FetchedPage(url=url, status=200, content=html.encode("utf-8"), elapsed_ms=120.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del camino de precios sin red")
+    parser.add_argument("--products", type=int, default=200, help="Productos del catálogo simulado")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Latencia mediana por fuente")
+    parser.add_argument("--error-rate", type=float, default=0.03, help="Fracción de consultas con error")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="Fracción de consultas en la cola lenta")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="Latencia extra de la cola lenta")
+    parser.add_argument("--timeout-ms", type=float, default=500.0, help="Timeout por fuente del tercer caso")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="Escala de las esperas reales del repricing")
+    parser.add_argument("--fixtures", help="Carpeta grabada con record_scraper_fixtures.py para reproducir")
+    args = parser.parse_args()
+
+    sources = with_overrides(DEFAULT_SOURCES, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                             slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    products = build_products(args.products, args.seed)
+    engine = PricingEngine()
+
+    # Precio de referencia: todas las fuentes respondiendo
+    perfect = SimulatedScraper(args.seed, with_overrides(sources, error_rate=0, slow_rate=0), time_scale=0)
+    complete = {name: engine.price(perfect.scrape_prices(name, category)).suggested_price
+                for name, category in products}
+
+    cases = {
+        "En serie (actual)": dict(mode=SEQUENTIAL),
+        "En paralelo": dict(mode=PARALLEL),
+        f"En paralelo + timeout {args.timeout_ms:.0f} ms": dict(mode=PARALLEL, timeout_ms=args.timeout_ms),
+    }
+    print(f"{args.products} productos x {len(sources)} fuentes, semilla {args.seed}: latencia mediana "
+          f"{args.latency_ms:.0f} ms, errores {args.error_rate:.0%}, cola lenta {args.slow_rate:.0%} "
+          f"(+{args.slow_ms:.0f} ms)")
+    print(f"  {'Caso':<30} {'p50':>7} {'p95':>7} {'p99':>7} {'perdidas':>9} {'sin precio':>11} "
+          f"{'desvío':>7} {'repricing':>10}")
+    for name, options in cases.items():
+        virtual = simulate(SimulatedScraper(args.seed, sources, time_scale=0, **options), products, engine, complete)
+        wall = reprice_wall(SimulatedScraper(args.seed, sources, time_scale=args.time_scale, **options), products)
+        print(f"  {name:<30} {virtual['p50']:6.0f}ms {virtual['p95']:6.0f}ms {virtual['p99']:6.0f}ms "
+              f"{virtual['lost']:8.1f}% {virtual['empty']:11d} {virtual['deviation']:6.2f}% {wall / 1000:9.1f}s")
+
+    # Verificaciones
+    checks = []
+    options = dict(mode=PARALLEL, timeout_ms=args.timeout_ms, time_scale=0.001)
+    first = SimulatedScraper(args.seed, sources, **options)
+    second = SimulatedScraper(args.seed, sources, **options)
+    same = run_threads(first, products, 8) == run_threads(second, products, 3)
+    checks.append(("misma semilla, otro orden de hilos: mismos resultados",
+                   same and first.stats() == second.stats()))
+    other = SimulatedScraper(args.seed + 1, sources, time_scale=0)
+    checks.append(("otra semilla: otros precios",
+                   other.scrape_prices(*products[0]) != SimulatedScraper(args.seed, sources, time_scale=0)
+                   .scrape_prices(*products[0])))
+
+    with tempfile.TemporaryDirectory(prefix="bench_scraper_") as directory:
+        store = FixtureStore(directory)
+        urls = [f"https://tienda.example/producto/{index}" for index in range(20)]
+        recorder = PriceScraper(fetcher=RecordingFetcher(store, inner=fake_page))
+        recorded = [recorder.scrape_real_price(url) for url in urls]
+        replayer = PriceScraper(fetcher=ReplayFetcher(FixtureStore(directory), time_scale=0))
+        checks.append(("grabación reproducida sin red: mismos precios",
+                       [replayer.scrape_real_price(url) for url in urls] == recorded))
+        slow = PriceScraper(fetcher=ReplayFetcher(FixtureStore(directory), latency_ms=20000, time_scale=0))
+        checks.append(("reproducción más lenta que el timeout: sin precio", slow.scrape_real_price(urls[0]) is None))
+
+    if args.fixtures:
+        store = FixtureStore(args.fixtures)
+        fetcher = ReplayFetcher(store, time_scale=0)
+        replayer = PriceScraper(fetcher=fetcher)
+        start = time.perf_counter()
+        results = {url: replayer.scrape_real_price(url) for url in store.urls()}
+        elapsed = time.perf_counter() - start
+        found = sum(1 for result in results.values() if result)
+        print(f"Reproducción de {args.fixtures}: {len(results)} páginas, {found} con precio, "
+              f"{elapsed / max(len(results), 1) * 1000:.1f} ms por página (sin red)")
+        for url, result in results.items():
+            print(f"  {result['price'] if result else '-':>12}  {url}")
+
+    for name, ok in checks:
+        print(f"  [{'OK' if ok else 'ERROR'}] {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark de arranque de la app
+
+Mide, en procesos nuevos (sin caché de módulos):
+- el tiempo de importar main.py según `python -X importtime` y los módulos
+  que más pesan;
+- que importar main.py no cargue dependencias pesadas (requests, bs4,
+  NumPy, uvicorn): se construyen en su primer uso;
+- el arranque del lifespan (tablas + directorio) y la construcción de los
+  servicios diferidos, sobre una base temporal. Las claves de tokens, las
+  copias de reportes y las imágenes también van a la carpeta temporal y la
+  auditoría queda apagada: la medición no toca ni lee los archivos del
+  servidor de desarrollo.
+
+Termina con código 1 si la importación supera el presupuesto o si se cargó
+alguna dependencia pesada, para usarlo en CI.
+
+Uso:
+    python bench_startup.py [--runs 5] [--budget-ms 1200] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent
+HEAVY_MODULES = ["requests", "bs4", "numpy", "uvicorn", "price_scraper", "pricing"]
+DEFAULT_BUDGET_MS = float(os.getenv("MOBICORP_STARTUP_BUDGET_MS", "1200"))
+# Prefijo de las líneas de resultado: la app puede escribir sus propios mensajes al arrancar
+RESULT_MARKER = "BENCH_STARTUP"
+
+LIFESPAN_SCRIPT = """
+import asyncio, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        t2 = time.perf_counter()
+        main._preload_services()
+        t3 = time.perf_counter()
+    return t2, t3
+
+t2, t3 = asyncio.run(run())
+print(f"%s {(t1 - t0) * 1000:.1f} {(t2 - t1) * 1000:.1f} {(t3 - t2) * 1000:.1f}")
+""" % RESULT_MARKER
+
+
+def run_python(args: List[str], env: Dict[str, str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable] + args, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def marked_values(stdout: str) -> List[str]:
+    """Valores de la línea marcada con RESULT_MARKER (ignora el resto de la salida)"""
+    for line in stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return line.split()[1:]
+    raise ValueError(f"Sin línea {RESULT_MARKER} en la salida:\n{stdout}")
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """Total de `import main` (ms) y [(módulo, propio ms, acumulado ms)]"""
+    modules = []
+    total = 0.0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        module = name.strip()
+        modules.append((module, int(self_us) / 1000, int(cumulative_us) / 1000))
+        if module == "main":
+            total = int(cumulative_us) / 1000
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de la app")
+    parser.add_argument("--runs", type=int, default=5, help="Procesos por medición (se reporta la mediana)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Presupuesto para importar main.py")
+    parser.add_argument("--top", type=int, default=15, help="Módulos más pesados a listar")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["MOBICORP_DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'startup.db'}"
+        env["MOBICORP_PRELOAD_SERVICES"] = "0"
+        env["MOBICORP_AUDIT"] = "0"
+        env["MOBICORP_JWT_KEYS_FILE"] = str(Path(tmp) / "jwt_keys.json")
+        env["MOBICORP_REPORTING_SNAPSHOT_DIR"] = str(Path(tmp) / "reporting")
+        env["MOBICORP_IMAGE_DIR"] = str(Path(tmp) / "images")
+        run_python(["-c", "import main"], env)  # Calentar la caché de bytecode
+
+        totals, slowest = [], []
+        for _ in range(args.runs):
+            result = run_python(["-X", "importtime", "-c", "import main"], env)
+            total, modules = parse_importtime(result.stderr)
+            totals.append(total)
+            slowest = modules
+
+        loaded = marked_values(run_python(
+            ["-c", f"import sys, main; print({RESULT_MARKER!r}, *(m for m in {HEAVY_MODULES!r} if m in sys.modules))"],
+            env,
+        ).stdout)
+
+        phases = []
+        for _ in range(args.runs):
+            result = run_python(["-c", LIFESPAN_SCRIPT], env)
+            phases.append([float(value) for value in marked_values(result.stdout)])
+
+    import_ms = statistics.median(totals)
+    print(f"Importar main.py (importtime, mediana de {args.runs}): {import_ms:.1f} ms "
+          f"(presupuesto {args.budget_ms:.0f} ms)")
+    print(f"Import en proceso: {statistics.median(p[0] for p in phases):.1f} ms | "
+          f"lifespan: {statistics.median(p[1] for p in phases):.1f} ms | "
+          f"servicios diferidos: {statistics.median(p[2] for p in phases):.1f} ms")
+    print(f"Dependencias pesadas cargadas al importar: {', '.join(loaded) if loaded else 'ninguna'}")
+
+    print("\nMódulos con más tiempo propio (última corrida):")
+    for module, own, cumulative in sorted(slowest, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"  {own:8.1f} ms  {cumulative:8.1f} ms acum.  {module}")
+
+    failed = False
+    if import_ms > args.budget_ms:
+        print(f"\n[ERROR] La importación ({import_ms:.1f} ms) supera el presupuesto ({args.budget_ms:.0f} ms)")
+        failed = True
+    if loaded:
+        print(f"\n[ERROR] main.py carga dependencias que deberían ser diferidas: {', '.join(loaded)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
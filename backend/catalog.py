@@ -0,0 +1,117 @@
+"""
+Catálogo compacto de productos para selectores y búsqueda incremental
+
+Los selectores solo necesitan (id, name, sku, price) de cada producto.
+CatalogSnapshot arma esa lista una vez por versión del tema "catalog", que
+cambia con las altas de productos y no con los pedidos, y la guarda ya
+serializada junto con su ETag, un hash del contenido: igual en todos los
+workers y estable entre reinicios. El stock no forma parte de la copia:
+cambia con cada pedido y obligaría a rearmarla (y a volver a descargarla)
+todo el tiempo; lookup lo lee de la base solo para los productos que
+devuelve.
+
+Cuando la versión cambia, la primera petición que la ve rearma la copia
+(las demás esperan a esa construcción): las altas son raras y quien acaba
+de crear un producto tiene que poder elegirlo enseguida en el selector.
+
+La búsqueda incremental (lookup) se resuelve sobre la copia en memoria:
+coinciden los productos cuyo nombre o SKU contiene todas las palabras
+buscadas (sin distinguir tildes ni mayúsculas); primero los que empiezan
+con la búsqueda.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from intent_engine import normalize_text
+from models import Product
+from shared_state import MemoryBackend, StateBackend
+
+LOOKUP_LIMIT = 20
+MAX_LOOKUP_LIMIT = 100
+
+# Tema del estado compartido: altas de productos (no movimientos de stock)
+CATALOG = "catalog"
+
+
+@dataclass
+class Snapshot:
+    """Catálogo de una versión: filas, cuerpo JSON, ETag y claves de búsqueda"""
+    version: int
+    etag: str
+    body: bytes
+    items: List[Dict]
+    keys: List[str]
+    sku_keys: List[str]
+
+
+class CatalogSnapshot:
+    """Copia compacta y versionada del catálogo"""
+
+    def __init__(self, state: Optional[StateBackend] = None):
+        self.state = state or MemoryBackend()
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """Marcar la copia como vieja en todos los workers (después del commit de un alta)"""
+        self.state.bump(CATALOG)
+
+    def get(self, db: Session) -> Snapshot:
+        """Catálogo vigente; si cambió la versión se rearma aquí (una sola construcción a la vez)"""
+        version = self.state.version(CATALOG)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self._build(db, version)
+            return self._snapshot
+
+    def _build(self, db: Session, version: int) -> Snapshot:
+        rows = db.query(Product.id, Product.name, Product.sku, Product.price).order_by(
+            Product.name, Product.id
+        ).all()
+        items = [{"id": row.id, "name": row.name, "sku": row.sku, "price": row.price} for row in rows]
+        payload = json.dumps(items, ensure_ascii=False, separators=(",", ":"))
+        etag = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+        body = f'{{"version":"{etag}","items":{payload}}}'.encode("utf-8")
+        keys = [normalize_text(f"{item['name'] or ''} {item['sku'] or ''}") for item in items]
+        sku_keys = [normalize_text(item["sku"] or "") for item in items]
+        return Snapshot(version=version, etag=f'"{etag}"', body=body, items=items, keys=keys, sku_keys=sku_keys)
+
+    def lookup(self, db: Session, query: str, limit: int = LOOKUP_LIMIT) -> List[Dict]:
+        """Productos que coinciden con la búsqueda (con su stock actual), primero los que empiezan con ella"""
+        return self._with_stock(db, self._matches(db, query, limit))
+
+    def _with_stock(self, db: Session, items: List[Dict]) -> List[Dict]:
+        """Agregar el stock actual de la base a los pocos productos devueltos"""
+        if not items:
+            return []
+        stock = dict(db.query(Product.id, Product.stock).filter(Product.id.in_([item["id"] for item in items])))
+        return [{**item, "stock": stock.get(item["id"]) or 0} for item in items]
+
+    def _matches(self, db: Session, query: str, limit: int) -> List[Dict]:
+        snapshot = self.get(db)
+        text = normalize_text(query).strip()
+        limit = max(1, min(limit, MAX_LOOKUP_LIMIT))
+        if not text:
+            return snapshot.items[:limit]
+        words = text.split()
+        matches = []
+        for item, key, sku_key in zip(snapshot.items, snapshot.keys, snapshot.sku_keys):
+            if all(word in key for word in words):
+                # 0: el nombre o el SKU empiezan con la búsqueda; 1: alguna palabra; 2: contiene
+                if key.startswith(text) or sku_key.startswith(text):
+                    rank = 0
+                elif f" {words[0]}" in f" {key}":
+                    rank = 1
+                else:
+                    rank = 2
+                matches.append((rank, len(matches), item))
+        matches.sort(key=lambda match: match[:2])
+        return [item for _, _, item in matches[:limit]]
@@ -0,0 +1,178 @@
+"""
+Categorías jerárquicas de productos
+
+Las categorías llegan como texto libre con niveles separados por " - "
+("Mobiliario Corporativo - Gerencial"). Aquí se normalizan en la tabla
+categories (un nodo por nivel, con su ruta completa indexada) y se mantiene
+un contador de productos por nodo que incluye a las subcategorías, de modo
+que los facets se leen sin agregar sobre products.
+"""
+import re
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import Session
+
+from models import Category, Product
+from shared_state import MemoryBackend, StateBackend
+
+CATEGORIES_TOPIC = "categories"
+
+CATEGORY_SEPARATOR = " - "
+_SEPARATOR_RE = re.compile(r"\s+-\s+")
+
+
+def split_category_path(path: str) -> List[str]:
+    """Dividir una ruta de categoría en sus niveles"""
+    return [part.strip() for part in _SEPARATOR_RE.split(path.strip()) if part.strip()]
+
+
+def ancestor_paths(path: str) -> List[str]:
+    """Rutas de todos los niveles, de la raíz a la hoja"""
+    parts = split_category_path(path)
+    return [CATEGORY_SEPARATOR.join(parts[:i + 1]) for i in range(len(parts))]
+
+
+def get_or_create_category(db: Session, path: str) -> Category:
+    """
+    Obtener la categoría hoja de una ruta, creando los niveles que falten
+    No hace commit: los nodos nuevos quedan en la transacción en curso
+    """
+    parent: Optional[Category] = None
+    for depth, node_path in enumerate(ancestor_paths(path)):
+        category = db.query(Category).filter(Category.path == node_path).first()
+        if category is None:
+            category = Category(
+                name=split_category_path(node_path)[-1],
+                path=node_path,
+                parent_id=parent.id if parent else None,
+                depth=depth,
+                product_count=0,
+            )
+            db.add(category)
+            db.flush()
+        parent = category
+    return parent
+
+
+def assign_product_category(db: Session, product: Product) -> Optional[Category]:
+    """
+    Vincular un producto nuevo a su categoría normalizada y sumar 1 al
+    contador de la hoja y de todos sus ancestros (un único UPDATE)
+    """
+    if not product.category:
+        return None
+    category = get_or_create_category(db, product.category)
+    product.category_id = category.id
+    db.execute(
+        update(Category)
+        .where(Category.path.in_(ancestor_paths(product.category)))
+        .values(product_count=Category.product_count + 1)
+    )
+    return category
+
+
+def descendant_ids(db: Session, path: str) -> List[int]:
+    """
+    IDs de la categoría y de todas sus subcategorías (búsqueda por índice de ruta)
+    Las subcategorías se buscan como un rango [ruta + " - ", ruta + " -!"):
+    a diferencia de LIKE, no interpreta "%" ni "_" del nombre, distingue
+    mayúsculas y usa el índice único de la ruta
+    """
+    prefix = path + CATEGORY_SEPARATOR
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    rows = db.query(Category.id).filter(
+        or_(Category.path == path, and_(Category.path >= prefix, Category.path < upper))
+    ).all()
+    return [row[0] for row in rows]
+
+
+def rebuild_categories(db: Session) -> int:
+    """
+    Reconstruir categorías y contadores a partir de products.category
+    Se usa en la migración y en init_db.py; devuelve la cantidad de nodos
+    """
+    counts = dict(
+        db.query(Product.category, func.count(Product.id))
+        .filter(Product.category.isnot(None))
+        .group_by(Product.category)
+        .all()
+    )
+    totals: Dict[str, int] = {}
+    for path, count in counts.items():
+        for node_path in ancestor_paths(path):
+            totals[node_path] = totals.get(node_path, 0) + count
+
+    leaf_ids: Dict[str, int] = {}
+    for path in counts:
+        if split_category_path(path):
+            leaf_ids[path] = get_or_create_category(db, path).id
+
+    db.query(Category).update({Category.product_count: 0}, synchronize_session=False)
+    for node_path, total in totals.items():
+        db.query(Category).filter(Category.path == node_path).update(
+            {Category.product_count: total}, synchronize_session=False
+        )
+    for path, category_id in leaf_ids.items():
+        db.query(Product).filter(Product.category == path).update(
+            {Product.category_id: category_id}, synchronize_session=False
+        )
+    db.commit()
+    return db.query(Category).count()
+
+
+class CategoryTreeCache:
+    """
+    Árbol de categorías cacheado en memoria
+    Se invalida en cada escritura de productos y se reconstruye con una sola
+    consulta a categories en el siguiente acceso. La invalidación pasa por
+    el estado compartido, así alcanza a las copias de todos los workers.
+    """
+
+    def __init__(self, state: Optional[StateBackend] = None):
+        self.state = state or MemoryBackend()
+        self._tree: Optional[List[Dict]] = None
+        self._paths: Optional[List[str]] = None
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self.state.bump(CATEGORIES_TOPIC)
+
+    def _ensure_loaded(self, db: Session) -> None:
+        version = self.state.version(CATEGORIES_TOPIC)
+        if self._tree is None or self._version != version:
+            self._load(db)
+            self._version = version
+
+    def _load(self, db: Session) -> None:
+        nodes: Dict[int, Dict] = {}
+        roots: List[Dict] = []
+        categories = db.query(Category).order_by(Category.depth, Category.path).all()
+        for category in categories:
+            nodes[category.id] = {
+                "id": category.id,
+                "name": category.name,
+                "path": category.path,
+                "product_count": category.product_count or 0,
+                "children": [],
+            }
+        for category in categories:
+            node = nodes[category.id]
+            parent = nodes.get(category.parent_id)
+            (parent["children"] if parent else roots).append(node)
+        self._tree = roots
+        self._paths = [category.path for category in categories]
+
+    def tree(self, db: Session) -> List[Dict]:
+        """Árbol completo con contadores de productos por nodo"""
+        with self._lock:
+            self._ensure_loaded(db)
+            return self._tree
+
+    def paths(self, db: Session) -> List[str]:
+        """Rutas de todas las categorías (para el motor de intenciones del chatbot)"""
+        with self._lock:
+            self._ensure_loaded(db)
+            return self._paths
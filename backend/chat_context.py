@@ -0,0 +1,147 @@
+"""
+Contexto de conversación por usuario y caché de respuestas del chatbot
+
+ChatSessionStore guarda, por usuario, las entidades de la última consulta
+(para preguntas de seguimiento como "¿y su stock?") y una caché compartida
+de respuestas para intenciones de solo lectura. Ambas estructuras tienen
+tamaño acotado (LRU) y TTL.
+
+La invalidación es por "temas" (products, orders, comparisons): cada tema
+tiene un contador de versión que se incrementa en cada escritura. Una
+respuesta cacheada guarda las versiones de sus temas al momento de
+calcularse y deja de ser válida en cuanto alguna cambia, sin recorrer la
+caché.
+
+Los contextos y las versiones viven en el backend de estado compartido
+(shared_state): con varios workers, una escritura en uno invalida las
+respuestas cacheadas en todos y la pregunta de seguimiento puede llegar a
+cualquier worker. La caché de respuestas en sí es local a cada proceso.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from shared_state import MemoryBackend, StateBackend
+
+# Temas de invalidación
+PRODUCTS = "products"
+ORDERS = "orders"
+COMPARISONS = "comparisons"
+
+
+@dataclass
+class ConversationContext:
+    """Estado de la conversación de un usuario"""
+    last_intent: Optional[str] = None
+    product_ids: List[int] = field(default_factory=list)
+    categories: List[str] = field(default_factory=list)
+    order_ids: List[int] = field(default_factory=list)
+
+
+class ChatSessionStore:
+    """
+    Contextos por usuario y respuestas cacheadas
+
+    Seguro para hilos: los endpoints síncronos de FastAPI se ejecutan en un
+    pool de hilos y comparten la misma instancia.
+    """
+
+    def __init__(
+        self,
+        state: Optional[StateBackend] = None,
+        session_ttl: float = 30 * 60,
+        max_responses: int = 256,
+        response_ttl: float = 5 * 60,
+    ):
+        self.state = state or MemoryBackend()
+        self.session_ttl = session_ttl
+        self.max_responses = max_responses
+        self.response_ttl = response_ttl
+        self._responses: "OrderedDict[Hashable, Tuple[float, Tuple[Tuple[str, int], ...], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- Contexto de conversación ----------
+
+    @staticmethod
+    def _context_key(user_id: int) -> str:
+        return f"chat:context:{user_id}"
+
+    def get_context(self, user_id: int) -> ConversationContext:
+        """Obtener el contexto vigente del usuario (vacío si no hay o expiró)"""
+        data = self.state.get_json(self._context_key(user_id))
+        return ConversationContext(**data) if data else ConversationContext()
+
+    def update_context(
+        self,
+        user_id: int,
+        intent: str,
+        product_ids: List[int],
+        categories: List[str],
+        order_ids: List[int],
+    ) -> None:
+        """Guardar las entidades de la última consulta del usuario (renueva el TTL)"""
+        context = self.get_context(user_id)
+        context.last_intent = intent
+        # Conservar las entidades previas si la consulta no trajo nuevas
+        if product_ids or categories or order_ids:
+            context.product_ids = list(product_ids)
+            context.categories = list(categories)
+            context.order_ids = list(order_ids)
+        self.state.set_json(self._context_key(user_id), asdict(context), ttl=self.session_ttl)
+
+    def clear_context(self, user_id: int) -> None:
+        self.state.delete(self._context_key(user_id))
+
+    # ---------- Caché de respuestas ----------
+
+    def version(self, topic: str) -> int:
+        """Versión actual de un tema de invalidación"""
+        return self.state.version(topic)
+
+    def invalidate(self, *topics: str) -> None:
+        """Invalidar las respuestas que dependen de los temas indicados (en todos los workers)"""
+        self.state.bump(*topics)
+
+    def get_response(self, key: Hashable) -> Optional[str]:
+        """Obtener una respuesta cacheada si sigue vigente"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is not None:
+                stored_at, versions, response = entry
+                if now - stored_at <= self.response_ttl and all(
+                    self.state.version(topic) == version for topic, version in versions
+                ):
+                    self._responses.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._responses[key]
+            self.misses += 1
+            return None
+
+    def snapshot(self, topics: Tuple[str, ...]) -> Tuple[Tuple[str, int], ...]:
+        """
+        Capturar las versiones de los temas antes de calcular una respuesta,
+        para no cachear datos leídos antes de una escritura concurrente
+        """
+        return tuple((topic, self.state.version(topic)) for topic in topics)
+
+    def put_response(self, key: Hashable, versions: Tuple[Tuple[str, int], ...], response: str) -> None:
+        """Guardar una respuesta junto con las versiones capturadas en snapshot()"""
+        with self._lock:
+            self._responses[key] = (time.monotonic(), versions, response)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_responses:
+                self._responses.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "cached_responses": len(self._responses),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,214 +1,336 @@
-from sqlalchemy.orm import Session
-from models import User, Product, Order, PriceComparison
-from typing import Dict, List
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from models import User, Product, Order, OrderItem
+from archive import latest_comparison
+from intent_engine import (
+    IntentEngine, Classification,
+    GREETING, HELP, PRICE, PRODUCT, ORDER, COMPARISON, REPORT, GENERAL,
+)
+from chat_context import ChatSessionStore, ConversationContext, PRODUCTS, ORDERS, COMPARISONS
+from categories import CategoryTreeCache, descendant_ids
+from catalog import CATALOG
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from reporting import ReportingDatabase
+
+# Intenciones de solo lectura cuya respuesta se cachea, con los temas que la invalidan
+CACHEABLE_INTENTS = {
+    PRODUCT: (PRODUCTS,),
+    PRICE: (PRODUCTS,),
+    COMPARISON: (PRODUCTS, COMPARISONS),
+    REPORT: (ORDERS,),
+}
+
+# Palabras que piden un listado general en lugar de un producto concreto
+LIST_TOKENS = ("listar", "lista", "mostrar", "todos", "list", "show", "all")
+
+# Palabras que indican una pregunta de seguimiento ("¿y su stock?", "and its price?")
+FOLLOWUP_TOKENS = (
+    "y", "su", "sus", "ese", "esa", "este", "esta", "eso", "mismo", "misma",
+    "and", "it", "its", "that", "this", "same",
+)
+
+def _format_price(value: Optional[float]) -> str:
+    """Formatear un precio que puede no estar definido"""
+    return f"Bs. {value:.2f}" if value is not None else "Sin precio definido"
 
 class ChatbotAssistant:
     """
     Chatbot inteligente para asistencia al personal de ventas
     Proporciona información sobre productos, precios, pedidos y ayuda general
     """
-    
-    def __init__(self):
-        self.greetings = [
-            "hola", "buenos días", "buenas tardes", "buenas noches",
-            "hi", "hello", "saludos"
-        ]
-        self.help_keywords = ["ayuda", "help", "comandos", "qué puedo", "cómo"]
-        self.price_keywords = ["precio", "price", "costo", "cuánto", "valor"]
-        self.product_keywords = ["producto", "product", "artículo", "item"]
-        self.order_keywords = ["pedido", "order", "venta", "orden"]
-    
+
+    def __init__(
+        self,
+        sessions: Optional[ChatSessionStore] = None,
+        categories: Optional[CategoryTreeCache] = None,
+        reporting: Optional["ReportingDatabase"] = None,
+    ):
+        self.engine = IntentEngine()
+        self.sessions = sessions or ChatSessionStore()
+        self.categories = categories or CategoryTreeCache()
+        # Fuente de lectura de los reportes (copia o réplica); None = la sesión de la petición
+        self.reporting = reporting
+        # Versión del tema "catalog" (altas de productos) con la que se compiló el catálogo
+        self._catalog_version: Optional[int] = None
+        self.handlers = {
+            GREETING: lambda analysis, db, user: self._handle_greeting(user),
+            HELP: lambda analysis, db, user: self._handle_help(),
+            PRICE: lambda analysis, db, user: self._handle_price_query(analysis, db),
+            PRODUCT: lambda analysis, db, user: self._handle_product_query(analysis, db),
+            ORDER: lambda analysis, db, user: self._handle_order_query(analysis, db, user),
+            COMPARISON: lambda analysis, db, user: self._handle_comparison_query(analysis, db),
+            REPORT: lambda analysis, db, user: self._handle_report_query(db, user),
+        }
+
+    def refresh_catalog(self, db: Session, force: bool = False) -> None:
+        """
+        Recompilar productos y categorías en el motor de intenciones
+        Solo recarga si hubo altas de productos desde la última compilación:
+        el tema "products" también cambia con cada movimiento de stock (cada
+        pedido), que no toca nombres, SKUs ni categorías
+        """
+        version = self.sessions.version(CATALOG)
+        if not force and version == self._catalog_version:
+            return
+        products = db.query(Product.id, Product.name, Product.sku).all()
+        self.engine.load_catalog(products, self.categories.paths(db))
+        self._catalog_version = version
+
+    def classify(self, message: str, db: Session) -> Classification:
+        """Clasificar el mensaje con el catálogo actualizado"""
+        self.refresh_catalog(db)
+        return self.engine.classify(message)
+
     def process_message(self, message: str, db: Session, user: User) -> str:
         """Procesar mensaje del usuario y generar respuesta"""
-        message_lower = message.lower().strip()
-        
-        # Detectar intención
-        if any(greeting in message_lower for greeting in self.greetings):
-            return self._handle_greeting(user)
-        
-        elif any(keyword in message_lower for keyword in self.help_keywords):
-            return self._handle_help()
-        
-        elif any(keyword in message_lower for keyword in self.price_keywords):
-            return self._handle_price_query(message_lower, db)
-        
-        elif any(keyword in message_lower for keyword in self.product_keywords):
-            return self._handle_product_query(message_lower, db)
-        
-        elif any(keyword in message_lower for keyword in self.order_keywords):
-            return self._handle_order_query(message_lower, db, user)
-        
-        elif "comparar" in message_lower or "comparación" in message_lower:
-            return self._handle_comparison_query(message_lower, db)
-        
-        elif "reporte" in message_lower or "estadística" in message_lower:
-            return self._handle_report_query(db, user)
-        
+        return "".join(self.stream_message(message, db, user))
+
+    def stream_message(self, message: str, db: Session, user: User) -> Iterator[str]:
+        """
+        Procesar mensaje del usuario y generar la respuesta por fragmentos
+        Cada handler entrega sus líneas a medida que resuelve sus consultas
+        """
+        analysis = self.classify(message, db)
+        self._apply_context(analysis, self.sessions.get_context(user.id))
+        self.sessions.update_context(
+            user.id, analysis.intent, analysis.product_ids, analysis.categories, analysis.order_ids
+        )
+
+        handler = self.handlers.get(analysis.intent)
+        if handler is None:
+            yield from self._handle_general(message)
+            return
+
+        topics = CACHEABLE_INTENTS.get(analysis.intent)
+        # Con una copia para reportes, cachear la respuesta la dejaría vigente
+        # más allá de la antigüedad máxima de la copia
+        if analysis.intent == REPORT and self.reporting is not None:
+            topics = None
+        if topics is None:
+            yield from handler(analysis, db, user)
+            return
+
+        key = (
+            analysis.intent,
+            tuple(analysis.product_ids),
+            tuple(analysis.categories),
+            analysis.has_token(*LIST_TOKENS),
+        )
+        cached = self.sessions.get_response(key)
+        if cached is not None:
+            yield cached
+            return
+        versions = self.sessions.snapshot(topics)
+        fragments = []
+        for fragment in handler(analysis, db, user):
+            fragments.append(fragment)
+            yield fragment
+        self.sessions.put_response(key, versions, "".join(fragments))
+
+    def _apply_context(self, analysis: Classification, context: ConversationContext) -> None:
+        """
+        Completar una pregunta de seguimiento con las entidades de la consulta anterior
+        Ej.: "precio de Silla Operativa Básica" seguido de "¿y su stock?"
+        """
+        if analysis.product_ids or analysis.categories or analysis.order_ids:
+            return
+        if context.last_intent is None or not analysis.has_token(*FOLLOWUP_TOKENS):
+            return
+        if analysis.has_token(*LIST_TOKENS):
+            return
+
+        if context.last_intent == ORDER and analysis.numbers:
+            analysis.order_ids = analysis.numbers[:1]
         else:
-            return self._handle_general(message)
-    
-    def _handle_greeting(self, user: User) -> str:
+            analysis.product_ids = list(context.product_ids)
+            analysis.categories = list(context.categories)
+            analysis.order_ids = list(context.order_ids)
+
+        has_entities = analysis.product_ids or analysis.categories or analysis.order_ids
+        if analysis.intent == GENERAL and has_entities:
+            analysis.intent = context.last_intent
+
+    def _products_by_id(self, db: Session, product_ids: List[int]) -> List[Product]:
+        """Cargar productos por ID respetando el orden en que se mencionaron"""
+        if not product_ids:
+            return []
+        found = {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()}
+        return [found[pid] for pid in product_ids if pid in found]
+
+    def _handle_greeting(self, user: User) -> Iterator[str]:
         """Manejar saludos"""
-        return f"¡Hola {user.full_name}! 👋\n\nSoy tu asistente virtual de MobiCorp. Puedo ayudarte con:\n\n" \
-               f"• Consultar precios de productos\n" \
-               f"• Información sobre pedidos\n" \
-               f"• Comparaciones de mercado\n" \
-               f"• Reportes y estadísticas\n\n" \
-               f"¿En qué puedo ayudarte hoy?"
-    
-    def _handle_help(self) -> str:
+        yield f"¡Hola {user.full_name}! 👋\n\nSoy tu asistente virtual de MobiCorp. Puedo ayudarte con:\n\n" \
+              f"• Consultar precios de productos\n" \
+              f"• Información sobre pedidos\n" \
+              f"• Comparaciones de mercado\n" \
+              f"• Reportes y estadísticas\n\n" \
+              f"¿En qué puedo ayudarte hoy?"
+
+    def _handle_help(self) -> Iterator[str]:
         """Mostrar ayuda"""
-        return "📋 **Comandos disponibles:**\n\n" \
-               "• **Precios**: '¿Cuál es el precio de [producto]?' o 'Comparar precios de [producto]'\n" \
-               "• **Productos**: 'Listar productos' o 'Mostrar productos de [categoría]'\n" \
-               "• **Pedidos**: 'Ver mis pedidos' o 'Estado del pedido [ID]'\n" \
-               "• **Reportes**: 'Mostrar reporte de ventas' o 'Estadísticas de márgenes'\n" \
-               "• **Comparaciones**: 'Comparar precios de [producto]'\n\n" \
-               "También puedes hacer preguntas generales sobre el sistema."
-    
-    def _handle_price_query(self, message: str, db: Session) -> str:
+        yield "📋 **Comandos disponibles:**\n\n" \
+              "• **Precios**: '¿Cuál es el precio de [producto]?' o 'Comparar precios de [producto]'\n" \
+              "• **Productos**: 'Listar productos' o 'Mostrar productos de [categoría]'\n" \
+              "• **Pedidos**: 'Ver mis pedidos' o 'Estado del pedido [ID]'\n" \
+              "• **Reportes**: 'Mostrar reporte de ventas' o 'Estadísticas de márgenes'\n" \
+              "• **Comparaciones**: 'Comparar precios de [producto]'\n\n" \
+              "También puedes hacer preguntas generales sobre el sistema."
+
+    def _handle_price_query(self, analysis: Classification, db: Session) -> Iterator[str]:
         """Manejar consultas de precios"""
-        # Buscar productos mencionados
-        products = db.query(Product).all()
-        
-        mentioned_products = []
-        for product in products:
-            if product.name.lower() in message:
-                mentioned_products.append(product)
-        
+        mentioned_products = self._products_by_id(db, analysis.product_ids)
+
         if mentioned_products:
-            response = "💰 **Información de precios:**\n\n"
+            yield "💰 **Información de precios:**\n\n"
             for product in mentioned_products[:3]:  # Limitar a 3
-                response += f"• **{product.name}**: Bs. {product.price:.2f}\n"
-                response += f"  Categoría: {product.category}\n"
-                response += f"  Stock: {product.stock} unidades\n\n"
-            
+                yield f"• **{product.name}**: {_format_price(product.price)}\n" \
+                      f"  Categoría: {product.category}\n" \
+                      f"  Stock: {product.stock} unidades\n\n"
+
             if len(mentioned_products) > 3:
-                response += f"_... y {len(mentioned_products) - 3} productos más_\n\n"
-            
-            response += "💡 **Tip**: Usa 'Comparar precios de [producto]' para ver precios del mercado."
-            return response
-        
-        return "No encontré productos específicos en tu consulta. " \
-               "Puedes preguntar por ejemplo: '¿Cuál es el precio de [nombre del producto]?'"
-    
-    def _handle_product_query(self, message: str, db: Session) -> str:
+                yield f"_... y {len(mentioned_products) - 3} productos más_\n\n"
+
+            yield "💡 **Tip**: Usa 'Comparar precios de [producto]' para ver precios del mercado."
+            return
+
+        yield "No encontré productos específicos en tu consulta. " \
+              "Puedes preguntar por ejemplo: '¿Cuál es el precio de [nombre del producto]?'"
+
+    def _handle_product_query(self, analysis: Classification, db: Session) -> Iterator[str]:
         """Manejar consultas de productos"""
-        if "listar" in message or "mostrar" in message or "todos" in message:
+        # Producto mencionado por nombre o SKU
+        mentioned_products = self._products_by_id(db, analysis.product_ids)
+        if mentioned_products:
+            yield "📦 **Detalle de productos:**\n\n"
+            for product in mentioned_products[:3]:
+                yield f"• **{product.name}** (ID: {product.id})\n" \
+                      f"  Precio: {_format_price(product.price)} | Stock: {product.stock}\n" \
+                      f"  Categoría: {product.category}\n\n"
+            return
+
+        # Buscar por categoría
+        if analysis.categories:
+            category = analysis.categories[0]
+            yield f"📦 **Productos en categoría '{category}':**\n\n"
+            category_ids = descendant_ids(db, category)
+            for product in db.query(Product).filter(Product.category_id.in_(category_ids)).limit(10):
+                yield f"• {product.name} - {_format_price(product.price)}\n"
+            return
+
+        if analysis.has_token(*LIST_TOKENS):
             products = db.query(Product).limit(10).all()
-            
+
             if not products:
-                return "No hay productos registrados en el sistema."
-            
-            response = "📦 **Productos disponibles:**\n\n"
+                yield "No hay productos registrados en el sistema."
+                return
+
+            yield "📦 **Productos disponibles:**\n\n"
             for product in products:
-                response += f"• **{product.name}** (ID: {product.id})\n"
-                response += f"  Precio: Bs. {product.price:.2f} | Stock: {product.stock}\n"
-                response += f"  Categoría: {product.category}\n\n"
-            
-            return response
-        
-        # Buscar por categoría
-        categories = db.query(Product.category).distinct().all()
-        for cat_tuple in categories:
-            if cat_tuple[0] and cat_tuple[0].lower() in message:
-                products = db.query(Product).filter(Product.category == cat_tuple[0]).limit(10).all()
-                response = f"📦 **Productos en categoría '{cat_tuple[0]}':**\n\n"
-                for product in products:
-                    response += f"• {product.name} - Bs. {product.price:.2f}\n"
-                return response
-        
-        return "Puedo ayudarte a listar productos. Prueba con: 'Listar productos' o 'Mostrar productos de [categoría]'"
-    
-    def _handle_order_query(self, message: str, db: Session, user: User) -> str:
+                yield f"• **{product.name}** (ID: {product.id})\n" \
+                      f"  Precio: {_format_price(product.price)} | Stock: {product.stock}\n" \
+                      f"  Categoría: {product.category}\n\n"
+            return
+
+        yield "Puedo ayudarte a listar productos. Prueba con: 'Listar productos' o 'Mostrar productos de [categoría]'"
+
+    def _handle_order_query(self, analysis: Classification, db: Session, user: User) -> Iterator[str]:
         """Manejar consultas de pedidos"""
-        if "mis pedidos" in message or "pedidos" in message:
-            orders = db.query(Order).filter(Order.user_id == user.id).order_by(Order.created_at.desc()).limit(5).all()
-            
-            if not orders:
-                return "No tienes pedidos registrados."
-            
-            response = "📋 **Tus pedidos recientes:**\n\n"
-            for order in orders:
-                status_emoji = "✅" if order.status == "approved" else "⏳" if order.status == "pending" else "❌"
-                response += f"{status_emoji} **Pedido #{order.id}**\n"
-                response += f"  Producto: {order.product.name}\n"
-                response += f"  Cantidad: {order.quantity}\n"
-                response += f"  Estado: {order.status}\n"
-                if order.final_price:
-                    response += f"  Precio final: Bs. {order.final_price:.2f}\n"
-                response += f"  Fecha: {order.created_at.strftime('%d/%m/%Y %H:%M')}\n\n"
-            
-            return response
-        
         # Buscar por ID
-        import re
-        order_ids = re.findall(r'\d+', message)
-        if order_ids:
-            order = db.query(Order).filter(Order.id == int(order_ids[0])).first()
+        if analysis.order_ids:
+            order_id = analysis.order_ids[0]
+            order = db.query(Order).options(
+                selectinload(Order.items).selectinload(OrderItem.product)
+            ).filter(Order.id == order_id).first()
             if order:
-                return f"📋 **Pedido #{order.id}**\n\n" \
-                       f"Producto: {order.product.name}\n" \
-                       f"Cantidad: {order.quantity}\n" \
-                       f"Estado: {order.status}\n" \
-                       f"Precio solicitado: Bs. {order.requested_price:.2f}\n" \
-                       f"Precio final: Bs. {order.final_price:.2f if order.final_price else 'Pendiente'}\n" \
-                       f"Fecha: {order.created_at.strftime('%d/%m/%Y %H:%M')}"
+                yield f"📋 **Pedido #{order.id}**\n\n"
+                for item in order.items:
+                    final = _format_price(item.final_price) if item.final_price is not None else "Pendiente"
+                    yield f"• {item.product.name} x{item.quantity} — " \
+                          f"solicitado {_format_price(item.requested_price)}, final {final}\n"
+                total_final = order.total_final
+                yield f"\nEstado: {order.status}\n" \
+                      f"Total solicitado: {_format_price(order.total_requested)}\n" \
+                      f"Total final: {_format_price(total_final) if total_final is not None else 'Pendiente'}\n" \
+                      f"Fecha: {order.created_at.strftime('%d/%m/%Y %H:%M')}"
             else:
-                return f"No se encontró el pedido #{order_ids[0]}"
-        
-        return "Puedo ayudarte con tus pedidos. Prueba con: 'Ver mis pedidos' o 'Estado del pedido [ID]'"
-    
-    def _handle_comparison_query(self, message: str, db: Session) -> str:
+                yield f"No se encontró el pedido #{order_id}"
+            return
+
+        orders = db.query(Order).options(
+            selectinload(Order.items).selectinload(OrderItem.product)
+        ).filter(Order.user_id == user.id).order_by(Order.created_at.desc()).limit(5).all()
+
+        if not orders:
+            yield "No tienes pedidos registrados."
+            return
+
+        yield "📋 **Tus pedidos recientes:**\n\n"
+        for order in orders:
+            status_emoji = "✅" if order.status == "approved" else "⏳" if order.status == "pending" else "❌"
+            lines = [
+                f"{status_emoji} **Pedido #{order.id}**\n",
+                f"  Productos: {', '.join(f'{item.product.name} x{item.quantity}' for item in order.items)}\n",
+                f"  Estado: {order.status}\n",
+            ]
+            if order.total_final is not None:
+                lines.append(f"  Total final: Bs. {order.total_final:.2f}\n")
+            lines.append(f"  Fecha: {order.created_at.strftime('%d/%m/%Y %H:%M')}\n\n")
+            yield "".join(lines)
+
+    def _handle_comparison_query(self, analysis: Classification, db: Session) -> Iterator[str]:
         """Manejar consultas de comparación"""
-        products = db.query(Product).all()
-        
-        for product in products:
-            if product.name.lower() in message:
-                # Buscar última comparación
-                comparison = db.query(PriceComparison).filter(
-                    PriceComparison.product_id == product.id
-                ).order_by(PriceComparison.created_at.desc()).first()
-                
-                if comparison:
-                    return f"📊 **Comparación de precios: {product.name}**\n\n" \
-                           f"Precio sugerido: **Bs. {comparison.suggested_price:.2f}**\n" \
-                           f"Precio mínimo del mercado: Bs. {comparison.min_price:.2f}\n" \
-                           f"Precio máximo del mercado: Bs. {comparison.max_price:.2f}\n" \
-                           f"Precio promedio: Bs. {comparison.avg_price:.2f}\n" \
-                           f"Fuentes consultadas: {comparison.source_count}\n" \
-                           f"Fecha: {comparison.created_at.strftime('%d/%m/%Y %H:%M')}\n\n" \
-                           f"💡 Usa el sistema para generar una nueva comparación actualizada."
-                else:
-                    return f"No hay comparaciones registradas para '{product.name}'. " \
-                           f"Puedes generar una nueva comparación desde el sistema."
-        
-        return "No encontré el producto en tu consulta. Prueba con: 'Comparar precios de [nombre del producto]'"
-    
-    def _handle_report_query(self, db: Session, user: User) -> str:
-        """Manejar consultas de reportes"""
-        total_orders = db.query(Order).count()
-        pending_orders = db.query(Order).filter(Order.status == "pending").count()
-        approved_orders = db.query(Order).filter(Order.status == "approved").count()
-        
-        total_revenue = sum(
-            order.final_price for order in 
-            db.query(Order).filter(Order.status == "approved", Order.final_price.isnot(None)).all()
-        )
-        
-        return f"📈 **Reporte General:**\n\n" \
-               f"Total de pedidos: {total_orders}\n" \
-               f"Pedidos pendientes: {pending_orders}\n" \
-               f"Pedidos aprobados: {approved_orders}\n" \
-               f"Ingresos totales: Bs. {total_revenue:.2f}\n\n" \
-               f"💡 Para reportes detallados, usa la sección de Reportes en el sistema."
-    
-    def _handle_general(self, message: str) -> str:
-        """Manejar mensajes generales"""
-        return "Entiendo tu consulta. Puedo ayudarte con:\n\n" \
-               "• Consultas de precios y productos\n" \
-               "• Información sobre pedidos\n" \
-               "• Comparaciones de mercado\n" \
-               "• Reportes y estadísticas\n\n" \
-               "Escribe 'ayuda' para ver todos los comandos disponibles."
+        products = self._products_by_id(db, analysis.product_ids)
+
+        if products:
+            product = products[0]
+            # Buscar última comparación (en el archivo si no hay recientes)
+            comparison = latest_comparison(db, product.id)
+
+            if comparison:
+                yield f"📊 **Comparación de precios: {product.name}**\n\n" \
+                      f"Precio sugerido: **Bs. {comparison.suggested_price:.2f}**\n" \
+                      f"Precio mínimo del mercado: Bs. {comparison.min_price:.2f}\n" \
+                      f"Precio máximo del mercado: Bs. {comparison.max_price:.2f}\n" \
+                      f"Precio promedio: Bs. {comparison.avg_price:.2f}\n" \
+                      f"Fuentes consultadas: {comparison.source_count}\n" \
+                      f"Fecha: {comparison.created_at.strftime('%d/%m/%Y %H:%M')}\n\n" \
+                      f"💡 Usa el sistema para generar una nueva comparación actualizada."
+            else:
+                yield f"No hay comparaciones registradas para '{product.name}'. " \
+                      f"Puedes generar una nueva comparación desde el sistema."
+            return
 
+        yield "No encontré el producto en tu consulta. Prueba con: 'Comparar precios de [nombre del producto]'"
+
+    def _handle_report_query(self, db: Session, user: User) -> Iterator[str]:
+        """Manejar consultas de reportes (leídas de la copia para reportes, si hay)"""
+        if self.reporting is not None:
+            with self.reporting.session() as report_db:
+                yield from self._report_lines(report_db)
+        else:
+            yield from self._report_lines(db)
+
+    def _report_lines(self, db: Session) -> Iterator[str]:
+        yield "📈 **Reporte General:**\n\n"
+        yield f"Total de pedidos: {db.query(Order).count()}\n"
+        yield f"Pedidos pendientes: {db.query(Order).filter(Order.status == 'pending').count()}\n"
+        yield f"Pedidos aprobados: {db.query(Order).filter(Order.status == 'approved').count()}\n"
+
+        total_revenue = db.query(
+            func.coalesce(func.sum(OrderItem.final_price * OrderItem.quantity), 0.0)
+        ).join(Order, Order.id == OrderItem.order_id).filter(
+            Order.status == "approved", OrderItem.final_price.isnot(None)
+        ).scalar()
+        yield f"Ingresos totales: Bs. {total_revenue:.2f}\n\n" \
+              f"💡 Para reportes detallados, usa la sección de Reportes en el sistema."
+
+    def _handle_general(self, message: str) -> Iterator[str]:
+        """Manejar mensajes generales"""
+        yield "Entiendo tu consulta. Puedo ayudarte con:\n\n" \
+              "• Consultas de precios y productos\n" \
+              "• Información sobre pedidos\n" \
+              "• Comparaciones de mercado\n" \
+              "• Reportes y estadísticas\n\n" \
+              "Escribe 'ayuda' para ver todos los comandos disponibles."
@@ -0,0 +1,86 @@
+"""
+Estadísticas del dashboard
+
+Todo lo que muestra el dashboard en dos consultas agregadas, sin importar
+cuántos pedidos haya: pedidos por estado (GROUP BY) y, en una sola
+sentencia con subconsultas escalares, productos, ingresos de los pedidos
+aprobados (de los agregados mensuales de margins.py), cantidad de alertas
+vigentes (las archivadas no cuentan, ver archive.py) y el ID de la última
+(para suscribirse al stream de alertas sin perder ninguna).
+
+El resultado se cachea por proceso hasta MOBICORP_DASHBOARD_CACHE_SECONDS
+(10) y se descarta antes si cambia la versión de products, orders o
+comparisons (las alertas se crean junto con las comparaciones).
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from chat_context import COMPARISONS, ORDERS, PRODUCTS
+from margins import TOTAL
+from models import MarginRollup, Order, PriceAlert, Product
+from shared_state import MemoryBackend, StateBackend
+
+CACHE_SECONDS = float(os.getenv("MOBICORP_DASHBOARD_CACHE_SECONDS", "10"))
+TOPICS = (PRODUCTS, ORDERS, COMPARISONS)
+ORDER_STATUSES = ("pending", "approved", "rejected")
+
+
+def compute_stats(db: Session) -> Dict:
+    """Calcular las estadísticas con dos consultas agregadas"""
+    by_status = dict(db.query(Order.status, func.count(Order.id)).group_by(Order.status).all())
+
+    # Ingresos de los agregados de márgenes (una fila por mes), no de las líneas de pedido
+    revenue = (
+        select(func.coalesce(func.sum(MarginRollup.revenue + MarginRollup.uncosted_revenue), 0.0))
+        .where(MarginRollup.dimension == TOTAL)
+        .scalar_subquery()
+    )
+    products, alerts, latest_alert_id, total_revenue = db.query(
+        select(func.count(Product.id)).scalar_subquery(),
+        select(func.count(PriceAlert.id)).scalar_subquery(),
+        select(func.max(PriceAlert.id)).scalar_subquery(),
+        revenue,
+    ).one()
+
+    orders_by_status = {status: by_status.get(status, 0) for status in ORDER_STATUSES}
+    for status, count in by_status.items():
+        orders_by_status.setdefault(status, count)
+    return {
+        "total_products": products,
+        "total_orders": sum(by_status.values()),
+        "orders_by_status": orders_by_status,
+        "pending_orders": orders_by_status["pending"],
+        "total_revenue": round(float(total_revenue or 0), 2),
+        "price_alerts": alerts,
+        "latest_alert_id": latest_alert_id,
+    }
+
+
+class DashboardStatsCache:
+    """Caché de las estadísticas validada por TTL y versiones de temas"""
+
+    def __init__(self, state: Optional[StateBackend] = None, ttl: float = CACHE_SECONDS):
+        self.state = state or MemoryBackend()
+        self.ttl = ttl
+        self._entry: Optional[Tuple[float, Tuple[int, ...], Dict]] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Dict:
+        """Estadísticas vigentes (recalculadas si expiraron o hubo escrituras)"""
+        # Versiones capturadas antes de consultar: una escritura concurrente
+        # deja la entrada ya vencida en lugar de cachear datos viejos
+        versions = tuple(self.state.version(topic) for topic in TOPICS)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry
+        if entry is not None and entry[1] == versions and now - entry[0] <= self.ttl:
+            return entry[2]
+        stats = compute_stats(db)
+        with self._lock:
+            self._entry = (now, versions, stats)
+        return stats
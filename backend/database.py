@@ -1,11 +1,29 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./mobicorp.db"
+# Se puede apuntar a otra base (ej. la del benchmark) con MOBICORP_DATABASE_URL
+SQLALCHEMY_DATABASE_URL = os.getenv("MOBICORP_DATABASE_URL", "sqlite:///./mobicorp.db")
 
+# Hasta 40 conexiones: una por hilo del pool de FastAPI (40 por defecto). Con
+# el valor por defecto de SQLAlchemy (5 + 10), las peticiones que retienen
+# la sesión mientras esperan al scraper agotaban el pool y el resto de los
+# endpoints esperaba hasta 30 s por una conexión
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+    pool_size=20, max_overflow=20
 )
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: las lecturas no esperan a la escritura en curso (importante con
+        # varios workers sobre el mismo archivo); con WAL, synchronous=NORMAL
+        # sigue siendo seguro ante caídas del proceso
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Usar DeclarativeBase para SQLAlchemy 2.0+
@@ -0,0 +1,223 @@
+"""
+Imágenes de productos: almacenamiento por contenido y entrega con caché
+
+- Nombres por contenido: cada imagen subida se guarda como
+  <sha256[:32]>.<ext> en MOBICORP_IMAGE_DIR. Dos subidas iguales son el
+  mismo archivo (no se duplica en disco) y un archivo nunca cambia: se
+  sirve con Cache-Control immutable de un año y el hash como ETag, así el
+  navegador (o la CDN) no vuelve a pedirla al ver el catálogo. El formato
+  sale de los primeros bytes, no del nombre que mandó el cliente: solo se
+  aceptan JPEG, PNG, GIF, WebP y AVIF (nada que el navegador ejecute).
+- Imágenes anteriores (nombres con fecha): se siguen sirviendo, con ETag y
+  revalidación en cada vista (304 si no cambió).
+  migrate_content_addressed_images.py las renombra por contenido.
+- Rangos: Range / If-Range con 206 (FileResponse de Starlette, que también
+  usa http.response.pathsend si el servidor lo ofrece).
+- Variantes precomprimidas: los formatos aceptados ya vienen comprimidos;
+  se guarda <nombre>.gz (y .br si está instalado brotli) solo cuando una
+  muestra comprimida ahorra al menos COMPRESS_MIN_SAVING, y se entrega
+  según Accept-Encoding.
+- Sin copia en Python: con MOBICORP_IMAGES_ACCEL_REDIRECT (ej.
+  "/protected-images/") la respuesta es solo cabeceras más
+  X-Accel-Redirect y nginx envía el archivo con sendfile.
+"""
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo hay variante gzip
+    brotli = None
+
+IMAGE_DIR = Path(os.getenv("MOBICORP_IMAGE_DIR", "uploads/images"))
+IMAGE_URL_PREFIX = "/uploads/images/"
+MAX_BYTES = int(float(os.getenv("MOBICORP_IMAGE_MAX_MB", "10")) * 1024 * 1024)
+ACCEL_REDIRECT = os.getenv("MOBICORP_IMAGES_ACCEL_REDIRECT", "")
+CHUNK_SIZE = 1024 * 1024
+# Una variante comprimida se guarda solo si la muestra se reduce al menos esto
+COMPRESS_MIN_SAVING = 0.1
+COMPRESS_SAMPLE = 64 * 1024
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+}
+# (codificación, extensión del archivo), en orden de preferencia
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")] if brotli is not None else [("gzip", ".gz")]
+HASHED_NAME = re.compile(r"^[0-9a-f]{32}\.(jpg|png|gif|webp|avif)$")
+
+
+class ImageError(Exception):
+    """Subida rechazada (status_code: 400 formato no admitido, 413 demasiado grande)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """Extensión según los primeros bytes del archivo (None si no es un formato admitido)"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return ".avif"
+    return None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _accepts(request: Request, encoding: str) -> bool:
+    """El cliente acepta la codificación (q=0 la excluye)"""
+    for entry in request.headers.get("accept-encoding", "").lower().split(","):
+        name, _, params = entry.strip().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ImageStore:
+    """Guardar imágenes subidas por contenido y servirlas con cabeceras de caché"""
+
+    def __init__(self, directory: Path = IMAGE_DIR, max_bytes: int = MAX_BYTES,
+                 accel_redirect: str = ACCEL_REDIRECT):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.accel_redirect = accel_redirect.rstrip("/")
+
+    # ---- subida ----
+
+    def save(self, source: BinaryIO) -> Tuple[str, bool]:
+        """
+        Guardar el contenido de source; devuelve (URL, ya existía). Lee por
+        bloques (no carga la imagen en memoria) y escribe en un temporal que
+        se renombra al final: nunca queda un archivo a medias con el nombre
+        definitivo. Lanza ImageError si no es una imagen admitida o es muy
+        grande
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        extension = None
+        fd, temp_name = tempfile.mkstemp(dir=self.directory, prefix=".upload-")
+        temp = Path(temp_name)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := source.read(CHUNK_SIZE):
+                    if extension is None:
+                        extension = sniff_extension(chunk[:16])
+                        if extension is None:
+                            raise ImageError(400, "Formato de imagen no admitido (JPEG, PNG, GIF, WebP o AVIF)")
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageError(413, f"La imagen supera {self.max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    out.write(chunk)
+            if extension is None:
+                raise ImageError(400, "La imagen está vacía")
+            name = digest.hexdigest()[:32] + extension
+            target = self.directory / name
+            if target.exists():
+                return IMAGE_URL_PREFIX + name, True
+            # Dos subidas iguales a la vez renombran el mismo contenido: gana cualquiera
+            os.replace(temp, target)
+            self._precompress(target)
+            return IMAGE_URL_PREFIX + name, False
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def _precompress(self, path: Path) -> None:
+        """Guardar variantes comprimidas si la muestra indica que vale la pena"""
+        with open(path, "rb") as file:
+            sample = file.read(COMPRESS_SAMPLE)
+        for encoding, suffix in ENCODINGS:
+            if len(_compress(sample, encoding)) > len(sample) * (1 - COMPRESS_MIN_SAVING):
+                continue
+            data = _compress(path.read_bytes(), encoding)
+            if len(data) > path.stat().st_size * (1 - COMPRESS_MIN_SAVING):
+                continue
+            fd, temp_name = tempfile.mkstemp(dir=self.directory, prefix=".upload-")
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(temp_name, path.with_name(path.name + suffix))
+
+    # ---- entrega ----
+
+    def response(self, request: Request, name: str) -> Response:
+        """Respuesta para GET/HEAD de /uploads/images/{name}"""
+        extension = os.path.splitext(name)[1].lower()
+        if "/" in name or "\\" in name or name.startswith(".") or extension not in MEDIA_TYPES:
+            return Response(status_code=404)
+        path = self.directory / name
+        try:
+            stat_result = path.stat()
+        except OSError:
+            return Response(status_code=404)
+
+        immutable = HASHED_NAME.match(name) is not None
+        if immutable:
+            tag = name.split(".")[0]
+        else:
+            tag = f"{int(stat_result.st_mtime_ns):x}-{stat_result.st_size:x}"
+        headers = {
+            "Cache-Control": IMMUTABLE if immutable else REVALIDATE,
+            "Vary": "Accept-Encoding",
+            "X-Content-Type-Options": "nosniff",
+        }
+
+        # Variante precomprimida (no para rangos: los bytes pedidos son de la imagen original)
+        if "range" not in request.headers:
+            for encoding, suffix in ENCODINGS:
+                if not _accepts(request, encoding):
+                    continue
+                variant = path.with_name(name + suffix)
+                try:
+                    variant_stat = variant.stat()
+                except OSError:
+                    continue
+                path, stat_result = variant, variant_stat
+                tag = f"{tag}-{encoding}"
+                headers["Content-Encoding"] = encoding
+                break
+
+        etag = f'"{tag}"'
+        headers["ETag"] = etag
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        if self.accel_redirect:
+            headers["X-Accel-Redirect"] = f"{self.accel_redirect}/{path.name}"
+            return Response(media_type=MEDIA_TYPES[extension], headers=headers)
+        return FileResponse(path, media_type=MEDIA_TYPES[extension], headers=headers, stat_result=stat_result)
@@ -4,6 +4,7 @@ Script para inicializar la base de datos con datos de ejemplo
 from database import SessionLocal, engine, Base
 from models import User, Product
 from auth import get_password_hash
+from categories import rebuild_categories
 
 # Crear tablas
 Base.metadata.create_all(bind=engine)
@@ -152,5 +153,6 @@ for product_data in sample_products:
         print(f"Producto creado: {product_data['name']}")
 
 db.commit()
+print(f"Categorías normalizadas: {rebuild_categories(db)}")
 print("\nBase de datos inicializada correctamente!")
 db.close()
@@ -0,0 +1,270 @@
+"""
+Motor de clasificación de intenciones para el chatbot
+
+Normaliza y tokeniza el mensaje una sola vez y lo recorre con un autómata
+de frases (trie por tokens) construido al inicializar. Cada coincidencia suma
+puntaje a una o más intenciones y extrae entidades (productos, categorías,
+IDs de pedido). La intención con mayor puntaje gana; los empates se resuelven
+con un orden de prioridad fijo.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Intenciones soportadas
+GREETING = "greeting"
+HELP = "help"
+PRICE = "price"
+PRODUCT = "product"
+ORDER = "order"
+COMPARISON = "comparison"
+REPORT = "report"
+GENERAL = "general"
+
+# Orden de desempate: la primera intención de la lista gana ante igual puntaje
+INTENT_PRIORITY = [COMPARISON, REPORT, ORDER, PRICE, PRODUCT, HELP, GREETING]
+
+# Palabras clave por intención (texto normalizado, sin tildes).
+# Un "*" final indica coincidencia por prefijo ("producto*" -> "productos").
+# Las frases de varias palabras pesan más que las palabras sueltas.
+INTENT_KEYWORDS: Dict[str, List[Tuple[str, float]]] = {
+    GREETING: [
+        ("hola", 0.5), ("buenos dias", 0.5), ("buenas tardes", 0.5),
+        ("buenas noches", 0.5), ("hi", 0.5), ("hello", 0.5), ("hey", 0.5),
+        ("saludo*", 0.5),
+    ],
+    HELP: [
+        ("ayuda", 1.0), ("help", 1.0), ("comando*", 1.0), ("command*", 1.0),
+        ("que puedo", 1.0), ("what can", 1.0), ("como", 0.3),
+    ],
+    PRICE: [
+        ("precio*", 1.0), ("price*", 1.0), ("costo*", 1.0), ("cost*", 1.0),
+        ("cuanto*", 1.0), ("valor*", 1.0), ("how much", 1.5),
+    ],
+    PRODUCT: [
+        ("producto*", 1.0), ("product*", 1.0), ("articulo*", 1.0), ("item*", 1.0),
+        ("catalogo*", 1.0), ("catalog*", 1.0), ("listar", 0.5), ("lista", 0.5),
+        ("list", 0.5), ("mostrar", 0.5), ("show", 0.5), ("stock", 1.0),
+        ("inventario", 1.0), ("inventory", 1.0), ("categoria*", 1.0),
+        ("category", 1.0), ("categories", 1.0),
+    ],
+    ORDER: [
+        ("pedido*", 1.0), ("order*", 1.0), ("orden*", 1.0), ("venta*", 1.0),
+        ("mis pedidos", 1.5), ("my orders", 1.5), ("estado del pedido", 1.5),
+        ("order status", 1.5),
+    ],
+    COMPARISON: [
+        ("compar*", 1.0), ("mercado", 1.0), ("market", 1.0),
+        ("competencia", 0.5), ("competitor*", 0.5),
+    ],
+    REPORT: [
+        ("reporte*", 1.0), ("report*", 1.0), ("estadistica*", 1.0),
+        ("statistic*", 1.0), ("stats", 1.0), ("ingreso*", 1.0), ("revenue", 1.0),
+        ("resumen", 1.0), ("summary", 1.0), ("margen*", 1.0), ("margin*", 1.0),
+    ],
+}
+
+# Puntaje extra que aporta cada tipo de entidad encontrada
+ENTITY_BOOSTS: Dict[str, Dict[str, float]] = {
+    "order_id": {ORDER: 1.5},
+    "product": {PRODUCT: 0.75, PRICE: 0.5, COMPARISON: 0.5},
+    "category": {PRODUCT: 1.0},
+}
+
+# Prefijos que introducen un ID de pedido ("pedido 5", "orden #12", "order 7")
+ORDER_ID_PREFIXES = ("pedido", "orden", "order", "#", "nro", "numero")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|#")
+
+
+def normalize_text(text: str) -> str:
+    """Pasar a minúsculas y quitar tildes/diacríticos"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenizar en una sola pasada sobre el texto normalizado"""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+@dataclass
+class Classification:
+    """Resultado de clasificar un mensaje"""
+    intent: str
+    scores: Dict[str, float] = field(default_factory=dict)
+    product_ids: List[int] = field(default_factory=list)
+    categories: List[str] = field(default_factory=list)
+    order_ids: List[int] = field(default_factory=list)
+    numbers: List[int] = field(default_factory=list)
+    tokens: List[str] = field(default_factory=list)
+
+    def has_token(self, *words: str) -> bool:
+        """Indicar si alguno de los tokens normalizados aparece en el mensaje"""
+        return any(word in self.tokens for word in words)
+
+
+class _PhraseTrie:
+    """Trie por tokens: cada nodo terminal guarda las etiquetas de la frase"""
+
+    __slots__ = ("root",)
+
+    _LABELS = "\0"
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def add(self, tokens: List[str], label: Tuple) -> None:
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(self._LABELS, []).append(label)
+
+    def longest_match(self, tokens: List[str], start: int) -> Tuple[int, List[Tuple]]:
+        """Devolver (longitud, etiquetas) de la frase más larga desde start"""
+        node = self.root
+        best_len, best_labels = 0, []
+        i = start
+        while i < len(tokens):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            i += 1
+            labels = node.get(self._LABELS)
+            if labels:
+                best_len, best_labels = i - start, labels
+        return best_len, best_labels
+
+
+class IntentEngine:
+    """
+    Clasificador de intenciones con matchers precompilados
+
+    Las palabras clave se compilan una vez en el constructor. El catálogo de
+    productos y categorías se compila aparte con load_catalog() y puede
+    recargarse sin reconstruir las palabras clave.
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, List[Tuple[str, float]]]] = None):
+        self._keyword_trie = _PhraseTrie()
+        self._stems: Dict[str, List[Tuple]] = {}
+        self._stem_lengths: List[int] = []
+        self._catalog_trie = _PhraseTrie()
+
+        for intent, entries in (keywords or INTENT_KEYWORDS).items():
+            for keyword, weight in entries:
+                label = ("intent", intent, weight)
+                if keyword.endswith("*"):
+                    self._stems.setdefault(keyword[:-1], []).append(label)
+                else:
+                    self._keyword_trie.add(tokenize(keyword), label)
+        self._stem_lengths = sorted({len(stem) for stem in self._stems}, reverse=True)
+
+    def load_catalog(
+        self,
+        products: Iterable[Tuple[int, str, Optional[str]]],
+        categories: Iterable[str] = (),
+    ) -> None:
+        """
+        Compilar nombres de productos, SKUs y categorías en el autómata
+
+        products: tuplas (id, nombre, sku). Las categorías jerárquicas
+        ("Asientos - Ejecutiva") también se reconocen por su último nivel.
+        """
+        trie = _PhraseTrie()
+        for product_id, name, sku in products:
+            if name:
+                trie.add(tokenize(name), ("product", product_id))
+            if sku:
+                trie.add(tokenize(sku), ("product", product_id))
+        for category in categories:
+            if not category:
+                continue
+            trie.add(tokenize(category), ("category", category))
+            leaf = category.rsplit("-", 1)[-1]
+            if leaf != category:
+                trie.add(tokenize(leaf), ("category", category))
+        self._catalog_trie = trie
+
+    def _match_stem(self, token: str) -> List[Tuple]:
+        for length in self._stem_lengths:
+            if len(token) >= length:
+                labels = self._stems.get(token[:length])
+                if labels:
+                    return labels
+        return []
+
+    def classify(self, message: str) -> Classification:
+        """Clasificar un mensaje y extraer sus entidades"""
+        tokens = tokenize(message)
+        scores: Dict[str, float] = {}
+        product_ids: List[int] = []
+        categories: List[str] = []
+        order_ids: List[int] = []
+        loose_numbers: List[int] = []
+
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+
+            # 1) Entidades del catálogo (frase más larga primero)
+            length, labels = self._catalog_trie.longest_match(tokens, i)
+            if length:
+                for label in labels:
+                    if label[0] == "product" and label[1] not in product_ids:
+                        product_ids.append(label[1])
+                    elif label[0] == "category" and label[1] not in categories:
+                        categories.append(label[1])
+                i += length
+                continue
+
+            # 2) Números: ID de pedido si van precedidos por un prefijo conocido
+            if token.isdigit():
+                if i > 0 and tokens[i - 1] in ORDER_ID_PREFIXES:
+                    order_ids.append(int(token))
+                else:
+                    loose_numbers.append(int(token))
+                i += 1
+                continue
+
+            # 3) Palabras clave: frases exactas y luego prefijos
+            length, labels = self._keyword_trie.longest_match(tokens, i)
+            if not length:
+                labels = self._match_stem(token)
+                length = 1
+            for _, intent, weight in labels:
+                scores[intent] = scores.get(intent, 0.0) + weight
+            i += length
+
+        # Un número suelto cuenta como ID si el mensaje habla de pedidos
+        if not order_ids and loose_numbers and scores.get(ORDER):
+            order_ids.append(loose_numbers[0])
+
+        for entity, present in (
+            ("order_id", order_ids),
+            ("product", product_ids),
+            ("category", categories),
+        ):
+            if present:
+                for intent, boost in ENTITY_BOOSTS[entity].items():
+                    scores[intent] = scores.get(intent, 0.0) + boost
+
+        intent = GENERAL
+        best = 0.0
+        for candidate in INTENT_PRIORITY:
+            score = scores.get(candidate, 0.0)
+            if score > best:
+                intent, best = candidate, score
+
+        return Classification(
+            intent=intent,
+            scores=scores,
+            product_ids=product_ids,
+            categories=categories,
+            order_ids=order_ids,
+            numbers=loose_numbers,
+            tokens=tokens,
+        )
@@ -0,0 +1,91 @@
+"""
+Reserva de inventario para pedidos
+
+El stock se descuenta con un UPDATE condicional por producto
+(stock = stock - n WHERE stock >= n): la verificación y el descuento son una
+sola sentencia atómica, así que dos pedidos concurrentes por la última
+unidad no pueden tener éxito ambos, sin bloquear la tabla ni leer antes de
+escribir. Ninguna función hace commit: el llamador decide la transacción y
+hace rollback si alguna línea falla.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import Order, OrderItem, Product
+
+
+class InsufficientStockError(Exception):
+    """No hay stock suficiente para una línea del pedido"""
+
+    def __init__(self, product_id: int, requested: int, available: Optional[int]):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available or 0
+        super().__init__(
+            f"Stock insuficiente para el producto {product_id}: "
+            f"solicitado {requested}, disponible {self.available}"
+        )
+
+
+def _merge_lines(lines: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Agrupar cantidades por producto y ordenar por ID (orden de escritura estable)"""
+    merged: Dict[int, int] = {}
+    for product_id, quantity in lines:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return sorted(merged.items())
+
+
+def reserve_stock(db: Session, lines: Iterable[Tuple[int, int]]) -> None:
+    """
+    Descontar el stock de todas las líneas (product_id, cantidad)
+    Lanza InsufficientStockError en la primera línea sin stock suficiente
+    """
+    for product_id, quantity in _merge_lines(lines):
+        result = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            available = db.query(Product.stock).filter(Product.id == product_id).scalar()
+            raise InsufficientStockError(product_id, quantity, available)
+
+
+def release_stock(db: Session, lines: Iterable[Tuple[int, int]]) -> None:
+    """Devolver al inventario las cantidades de las líneas indicadas"""
+    for product_id, quantity in _merge_lines(lines):
+        db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(stock=Product.stock + quantity)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def release_order_reservations(db: Session, order_ids: List[int]) -> int:
+    """
+    Liberar el stock reservado por los pedidos indicados
+    Un único UPDATE ... RETURNING marca stock_reserved=False solo en los pedidos
+    que aún lo tenían en True y devuelve sus IDs, así una reserva nunca se
+    devuelve dos veces aunque dos rechazos lleguen a la vez; luego se devuelven
+    las líneas (order_items) de esos pedidos.
+    Devuelve la cantidad de pedidos liberados.
+    """
+    if not order_ids:
+        return 0
+    released = db.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.stock_reserved.is_(True))
+        .values(stock_reserved=False)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if released:
+        lines = db.query(OrderItem.product_id, OrderItem.quantity).filter(
+            OrderItem.order_id.in_(released)
+        ).all()
+        release_stock(db, [(line.product_id, line.quantity) for line in lines])
+    return len(released)
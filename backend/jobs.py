@@ -0,0 +1,341 @@
+"""
+Tareas en segundo plano con cola persistente en la base
+
+Las operaciones largas (scraping, repricing, reportes) pueden encolarse en
+lugar de ejecutarse dentro de la petición HTTP: el endpoint guarda un Job y
+responde 202 con su ID, y un pool de hilos del propio proceso la ejecuta.
+El cliente consulta el estado y el avance en /api/jobs/{id}.
+
+- Cola: la tabla jobs. Un worker toma la tarea más antigua con un único
+  UPDATE ... RETURNING condicionado a status='queued', así dos hilos o dos
+  procesos (uvicorn --workers) nunca toman la misma.
+- Concesión: mientras corre, la tarea tiene lease_until, renovado por un
+  hilo de latido. Si el proceso muere, al vencer vuelve a la cola y otro
+  worker la retoma (cuenta como un intento).
+- Reintentos: un error inesperado reencola la tarea con espera exponencial
+  hasta max_attempts; JobError (y las excepciones de permanent_errors) la
+  marcan fallida sin reintentar: errores de negocio, como un producto sin
+  precios de mercado.
+- Avance: el handler llama a job.report(hechos, total, mensaje); se escribe
+  en la base como mucho cada PROGRESS_INTERVAL segundos.
+- Retención: las tareas terminadas se borran pasadas RETENTION_HOURS.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import Job
+
+JOB_WORKERS = int(os.getenv("MOBICORP_JOB_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("MOBICORP_JOB_MAX_ATTEMPTS", "3"))
+POLL_SECONDS = float(os.getenv("MOBICORP_JOB_POLL_SECONDS", "1"))
+LEASE_SECONDS = float(os.getenv("MOBICORP_JOB_LEASE_SECONDS", "60"))
+RETENTION_HOURS = float(os.getenv("MOBICORP_JOB_RETENTION_HOURS", "24"))
+RETRY_BASE_SECONDS = 2.0
+PROGRESS_INTERVAL = 0.5
+PRUNE_INTERVAL = 3600
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobError(Exception):
+    """Error definitivo de una tarea: se marca fallida sin reintentar"""
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
+def job_payload(job: Job) -> Dict:
+    """Estado de una tarea para la API (parámetros y resultado ya decodificados)"""
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress or 0.0,
+        "message": job.message,
+        "attempts": job.attempts or 0,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "params": json.loads(job.params) if job.params else {},
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class RunningJob:
+    """Tarea en ejecución tal como la ve su handler"""
+
+    def __init__(self, queue: "JobQueue", job_id: int, kind: str, params: Dict, user_id: Optional[int],
+                 attempt: int):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.user_id = user_id
+        self.attempt = attempt
+        self._last_report = 0.0
+
+    def report(self, done: int, total: int, message: Optional[str] = None, force: bool = False) -> None:
+        """Informar el avance (se persiste como mucho cada PROGRESS_INTERVAL segundos)"""
+        now = time.monotonic()
+        if not force and done < total and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        progress = min(1.0, done / total) if total else 0.0
+        self.queue._update(self, progress=progress, message=message)
+
+
+Handler = Callable[[Session, RunningJob], Any]
+
+
+class JobQueue:
+    """Cola persistente de tareas y pool de workers del proceso"""
+
+    def __init__(self, session_factory: sessionmaker, workers: int = JOB_WORKERS,
+                 poll_seconds: float = POLL_SECONDS, lease_seconds: float = LEASE_SECONDS,
+                 permanent_errors: Tuple[Type[Exception], ...] = ()):
+        self.session_factory = session_factory
+        # Excepciones que fallan la tarea sin reintentar (su detail o mensaje queda como error)
+        self.permanent_errors = (JobError,) + tuple(permanent_errors)
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._handlers: Dict[str, Handler] = {}
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[int, str] = {}
+        self._running_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._last_prune = 0.0
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    # ---- registro y encolado ----
+
+    def handler(self, kind: str) -> Callable[[Handler], Handler]:
+        """Registrar la función que ejecuta las tareas de un tipo"""
+        def register(func: Handler) -> Handler:
+            self._handlers[kind] = func
+            return func
+        return register
+
+    def submit(self, db: Session, kind: str, params: Dict, user_id: Optional[int] = None,
+               max_attempts: int = MAX_ATTEMPTS) -> Job:
+        """Encolar una tarea (hace commit) y despertar a un worker"""
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de tarea desconocido: {kind}")
+        job = Job(kind=kind, status="queued", params=dumps(params), user_id=user_id,
+                  max_attempts=max_attempts, run_after=time.time())
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._wakeup.set()
+        return job
+
+    def cancel(self, db: Session, job_id: int) -> bool:
+        """Cancelar una tarea que todavía no empezó"""
+        cancelled = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="cancelled", finished_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return cancelled == 1
+
+    # ---- ciclo de vida ----
+
+    def start(self) -> None:
+        """Arrancar los workers y el latido de concesiones (0 workers = solo encolar)"""
+        if self._threads or self.workers <= 0:
+            return
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Detener los workers; las tareas en curso que no terminen se retoman al vencer su concesión"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ---- ejecución ----
+
+    def _claim(self) -> Optional[RunningJob]:
+        """Tomar la tarea pendiente más antigua (atómico entre hilos y procesos)"""
+        now = time.time()
+        queued = and_(Job.status == "queued", Job.run_after <= now)
+        orphaned = and_(Job.status == "running", Job.lease_until < now)
+        with self.session_factory() as db:
+            # Consulta de solo lectura primero: una cola vacía no toma el lock de escritura
+            if db.query(Job.id).filter(or_(queued, orphaned)).first() is None:
+                return None
+            # Tareas cuyo worker murió: vuelven a la cola (o fallan si agotaron sus intentos)
+            exhausted = Job.attempts >= Job.max_attempts
+            db.execute(
+                update(Job)
+                .where(orphaned)
+                .values(
+                    status=case((exhausted, "failed"), else_="queued"),
+                    error=case((exhausted, "El worker que la ejecutaba se detuvo"), else_=Job.error),
+                    finished_at=case((exhausted, datetime.now(timezone.utc)), else_=None),
+                    worker=None,
+                    lease_until=None,
+                    message="Retomada tras perder su worker",
+                )
+                .execution_options(synchronize_session=False)
+            )
+            candidate = (
+                select(Job.id)
+                .where(queued)
+                .order_by(Job.run_after, Job.id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            row = db.execute(
+                update(Job)
+                .where(Job.id == candidate, Job.status == "queued")
+                .values(
+                    status="running",
+                    worker=self.name,
+                    attempts=Job.attempts + 1,
+                    lease_until=now + self.lease_seconds,
+                    started_at=datetime.now(timezone.utc),
+                )
+                .returning(Job.id, Job.kind, Job.params, Job.user_id, Job.attempts)
+                .execution_options(synchronize_session=False)
+            ).first()
+            db.commit()
+        if row is None:
+            return None
+        return RunningJob(self, row.id, row.kind, json.loads(row.params or "{}"), row.user_id, row.attempts)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"Error al tomar tareas de la cola: {type(e).__name__}: {e}")
+                job = None
+            if job is None:
+                self._maybe_prune()
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: RunningJob) -> None:
+        with self._running_lock:
+            self._running[job.id] = job.kind
+        try:
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                raise JobError(f"Tipo de tarea desconocido: {job.kind}")
+            with self.session_factory() as db:
+                result = handler(db, job)
+            self._finish(job, "succeeded", result=dumps(result))
+        except self.permanent_errors as e:
+            self._finish(job, "failed", error=str(getattr(e, "detail", None) or e))
+        except Exception as e:
+            print(f"Error en la tarea {job.id} ({job.kind}), intento {job.attempt}: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            self._retry_or_fail(job, f"{type(e).__name__}: {e}")
+        finally:
+            with self._running_lock:
+                self._running.pop(job.id, None)
+
+    def _finish(self, job: RunningJob, status: str, result: Optional[str] = None,
+                error: Optional[str] = None) -> None:
+        values = {"status": status, "result": result, "error": error, "lease_until": None,
+                  "finished_at": datetime.now(timezone.utc)}
+        if status == "succeeded":
+            values.update(progress=1.0, message=None)
+        self._update(job, **values)
+
+    def _retry_or_fail(self, job: RunningJob, error: str) -> None:
+        with self.session_factory() as db:
+            max_attempts = db.query(Job.max_attempts).filter(Job.id == job.id).scalar() or 1
+        if job.attempt >= max_attempts:
+            self._finish(job, "failed", error=error)
+            return
+        delay = RETRY_BASE_SECONDS * 2 ** (job.attempt - 1)
+        self._update(job, status="queued", error=error, worker=None, lease_until=None,
+                     run_after=time.time() + delay, message=f"Reintento {job.attempt + 1} en {delay:.0f} s")
+
+    def _update(self, job: RunningJob, **values) -> bool:
+        """
+        Actualizar una tarea en su propia sesión (independiente de la del
+        handler), solo si sigue siendo esta ejecución: si la concesión venció
+        y otro worker (u otro intento) la tomó, el resultado tardío se
+        descarta en vez de pisar el de la ejecución vigente
+        """
+        with self.session_factory() as db:
+            updated = db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == "running", Job.worker == self.name,
+                       Job.attempts == job.attempt)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+        if not updated:
+            print(f"Tarea {job.id} (intento {job.attempt}): perdió su concesión, se descarta la actualización")
+        return bool(updated)
+
+    def _heartbeat(self) -> None:
+        """Renovar la concesión de las tareas en curso de este proceso"""
+        while not self._stopping.wait(self.lease_seconds / 3):
+            with self._running_lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                with self.session_factory() as db:
+                    db.execute(
+                        update(Job)
+                        .where(Job.id.in_(job_ids), Job.status == "running", Job.worker == self.name)
+                        .values(lease_until=time.time() + self.lease_seconds)
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.commit()
+            except Exception as e:
+                print(f"Error al renovar concesiones de tareas: {type(e).__name__}: {e}")
+
+    def _maybe_prune(self) -> None:
+        """Borrar las tareas terminadas más viejas que RETENTION_HOURS (como mucho una vez por hora)"""
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=RETENTION_HOURS)
+        try:
+            with self.session_factory() as db:
+                db.query(Job).filter(Job.status.in_(FINISHED), Job.finished_at < cutoff).delete(
+                    synchronize_session=False
+                )
+                db.commit()
+        except Exception as e:
+            print(f"Error al depurar tareas terminadas: {type(e).__name__}: {e}")
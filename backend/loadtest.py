@@ -0,0 +1,447 @@
+"""
+Suite de pruebas de carga y benchmark de la API de MobiCorp
+
+1. Siembra una base sintética a la escala indicada (por defecto 100k productos
+   y 1M de pedidos), con datos reproducibles a partir de --seed.
+2. Levanta la aplicación real con uvicorn en un hilo, con el scraper
+   simulado de scraper_sim.py (sin red; sin esperas salvo
+   --scraper-latency), o apunta a un servidor externo con --url.
+3. Ejecuta cada escenario (login, products, orders, suggest, chat, reports,
+   history, dashboard, lookup, margins) con N workers concurrentes y mide latencias p50/p95/p99 y RPS.
+4. Guarda los resultados en JSON; con --compare muestra la diferencia contra
+   una corrida anterior para detectar regresiones entre commits.
+
+Uso:
+    python loadtest.py --products 1000 --orders 10000 --requests 100
+    python loadtest.py --output bench_results.json --compare bench_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_DB_URL = "sqlite:///./loadtest.db"
+LOADTEST_PASSWORD = "loadtest123"
+HISTORY_PRODUCTS = 200  # Productos con un año de historial de precios sembrado
+
+PRODUCT_TEMPLATES = [
+    ("Silla Ejecutiva", "Asientos - Ejecutiva", 1250.0),
+    ("Silla Gerencial", "Asientos - Gerencial", 980.0),
+    ("Silla Operativa", "Asientos - Operativa", 450.0),
+    ("Sofá Lounge", "Asientos - Lounge", 2800.0),
+    ("Silla Longarina", "Asientos - Longarinas", 1200.0),
+    ("Escritorio Ejecutivo", "Mobiliario Corporativo - Directoría", 3200.0),
+    ("Escritorio Gerencial", "Mobiliario Corporativo - Gerencial", 1850.0),
+    ("Mesa de Reunión", "Mobiliario Corporativo - Reuniones", 2800.0),
+    ("Estación de Trabajo", "Mobiliario Corporativo - Estaciones de trabajo", 1200.0),
+    ("Módulo de Recepción", "Mobiliario Corporativo - Recepción", 2200.0),
+    ("Archivero", "Mobiliario Corporativo - Apoyo", 650.0),
+    ("Estantería de Acero", "Mobiliario Corporativo - Acero", 850.0),
+]
+
+CHAT_MESSAGES = [
+    "hola",
+    "lista productos",
+    "productos de asientos",
+    "ver mis pedidos",
+    "estado del pedido 5",
+    "reporte de ventas",
+    "precio de Silla Ejecutiva 00001",
+    "comparar precios de Escritorio Gerencial 00007",
+]
+
+
+# ==================== SIEMBRA DE DATOS ====================
+
+def seed_database(products: int, orders: int, users: int, seed: int, batch_size: int = 20000) -> None:
+    """Poblar la base configurada en MOBICORP_DATABASE_URL con datos sintéticos"""
+    from sqlalchemy import insert
+    from database import SessionLocal, engine, Base
+    from models import User, Product, Order, OrderItem, PriceSource, PriceObservation
+    from auth import get_password_hash
+    from categories import rebuild_categories
+    from price_history import rebuild_rollups
+    from scraper_sim import DEFAULT_SOURCES
+    import margins
+
+    rng = random.Random(seed)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    now = datetime.now(timezone.utc)
+    # Un solo hash bcrypt para todos los usuarios: el costo del hash no es lo que se mide aquí
+    hashed = get_password_hash(LOADTEST_PASSWORD)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {
+                "email": f"user{i}@loadtest.mobicorp.com",
+                "full_name": f"Usuario de carga {i}",
+                "hashed_password": hashed,
+                "role": "admin" if i == 0 else "sales",
+                "is_active": True,
+                "created_at": now,
+            }
+            for i in range(users)
+        ])
+
+        for start in range(0, products, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, products)):
+                name, category, price = PRODUCT_TEMPLATES[i % len(PRODUCT_TEMPLATES)]
+                rows.append({
+                    "name": f"{name} {i + 1:05d}",
+                    "category": category,
+                    "description": f"Producto sintético de carga #{i + 1}",
+                    "price": round(price * rng.uniform(0.7, 1.3), 2),
+                    "stock": rng.randint(0, 200),
+                    "sku": f"LT-{i + 1:07d}",
+                    "created_at": now,
+                })
+            conn.execute(insert(Product), rows)
+        print(f"  {products:,} productos en {time.perf_counter() - started:.1f}s")
+
+        for start in range(0, orders, batch_size):
+            rows, items = [], []
+            for order_id in range(start + 1, min(start + batch_size, orders) + 1):
+                created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+                status = rng.choices(("pending", "approved", "rejected"), weights=(3, 6, 1))[0]
+                # La mayoría de los pedidos tiene una línea; algunos son pedidos de oficina completos
+                lines = []
+                for _ in range(rng.choices((1, 2, 5), weights=(7, 2, 1))[0]):
+                    requested = round(rng.uniform(300, 5000), 2)
+                    lines.append({
+                        "order_id": order_id,
+                        "product_id": rng.randint(1, products),
+                        "quantity": rng.randint(1, 40),
+                        "requested_price": requested,
+                        "final_price": round(requested * rng.uniform(0.9, 1.1), 2) if status == "approved" else None,
+                    })
+                single = lines[0] if len(lines) == 1 else {}
+                rows.append({
+                    "id": order_id,
+                    "product_id": single.get("product_id"),
+                    "quantity": single.get("quantity"),
+                    "requested_price": single.get("requested_price"),
+                    "final_price": single.get("final_price"),
+                    "status": status,
+                    "user_id": rng.randint(1, users),
+                    "created_at": created_at,
+                    "approved_at": created_at + timedelta(hours=rng.randint(1, 72)) if status == "approved" else None,
+                })
+                items.extend(lines)
+            conn.execute(insert(Order), rows)
+            conn.execute(insert(OrderItem), items)
+        print(f"  {orders:,} pedidos en {time.perf_counter() - started:.1f}s")
+
+        # Un año de observaciones diarias por fuente para el escenario "history"
+        start_ts = int(now.timestamp()) - 365 * 24 * 3600
+        source_rows = [{"id": i + 1, "name": name} for i, name in enumerate(profile.name for profile in DEFAULT_SOURCES)]
+        conn.execute(insert(PriceSource), source_rows)
+        for product_id in range(1, min(products, HISTORY_PRODUCTS) + 1):
+            base = rng.uniform(300, 5000)
+            conn.execute(insert(PriceObservation), [
+                {
+                    "product_id": product_id,
+                    "source_id": source["id"],
+                    "price": round(base * (1 + day / 730) * rng.uniform(0.85, 1.2), 2),
+                    "observed_at": start_ts + day * 24 * 3600 + rng.randint(0, 24 * 3600 - 1),
+                }
+                for day in range(365)
+                for source in source_rows
+            ])
+        print(f"  historial de precios en {time.perf_counter() - started:.1f}s")
+
+    db = SessionLocal()
+    try:
+        rebuild_categories(db)
+        rebuild_rollups(db)
+        margins.rebuild_rollups(db)
+    finally:
+        db.close()
+
+
+def database_matches(products: int, orders: int) -> bool:
+    """Indicar si la base ya sembrada tiene la escala pedida"""
+    from sqlalchemy import func, inspect
+    from database import SessionLocal, engine
+    from models import Product, Order
+
+    # Una base sembrada con un esquema anterior se vuelve a sembrar
+    if not inspect(engine).has_table("margin_rollups"):
+        return False
+    db = SessionLocal()
+    try:
+        return db.query(func.count(Product.id)).scalar() == products and \
+            db.query(func.count(Order.id)).scalar() == orders
+    except Exception:
+        return False
+    finally:
+        db.close()
+
+
+# ==================== SERVIDOR ====================
+
+def start_server(port: int, scraper_latency: float, seed: int):
+    """
+    Levantar la app real en un hilo, con el scraper simulado: sin errores ni
+    cola lenta y, con scraper_latency, esa espera fija por producto repartida
+    entre las fuentes
+    """
+    import uvicorn
+    from scraper_sim import DEFAULT_SOURCES, SimulatedScraper, with_overrides
+    # Las pruebas de carga usan pocos usuarios a propósito: sin límites de peticiones
+    os.environ.setdefault("MOBICORP_RATE_LIMITING", "0")
+    import main
+
+    sources = with_overrides(DEFAULT_SOURCES, latency_ms=scraper_latency * 1000 / len(DEFAULT_SOURCES), jitter=0.0)
+    main.price_scraper.override(SimulatedScraper(seed, sources, time_scale=1.0 if scraper_latency else 0.0))
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("El servidor no inició a tiempo")
+        time.sleep(0.05)
+    return server, thread
+
+
+# ==================== ESCENARIOS ====================
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def build_scenarios(products: int, orders: int) -> Dict[str, Callable]:
+    """Cada escenario recibe (session, base_url, rng) y devuelve la respuesta HTTP"""
+    now = datetime.now(timezone.utc)
+
+    def login(session, url, rng):
+        user = rng.randint(0, 4)
+        return session.post(f"{url}/api/auth/login", data={
+            "username": f"user{user}@loadtest.mobicorp.com", "password": LOADTEST_PASSWORD,
+        })
+
+    def products_list(session, url, rng):
+        return session.get(f"{url}/api/products", params={
+            "skip": rng.randint(0, max(0, products - 50)), "limit": 50,
+        })
+
+    def orders_list(session, url, rng):
+        return session.get(f"{url}/api/orders", params={"limit": 50})
+
+    def suggest(session, url, rng):
+        return session.post(f"{url}/api/prices/suggest", params={"product_id": rng.randint(1, products)})
+
+    def chat(session, url, rng):
+        return session.post(f"{url}/api/chat", json={"message": rng.choice(CHAT_MESSAGES)})
+
+    def reports(session, url, rng):
+        day = now - timedelta(days=rng.randint(1, 360))
+        return session.get(f"{url}/api/reports/orders", params={
+            "start_date": day.replace(tzinfo=None).isoformat(),
+            "end_date": (day + timedelta(days=1)).replace(tzinfo=None).isoformat(),
+        })
+
+    def dashboard(session, url, rng):
+        return session.get(f"{url}/api/dashboard/stats")
+
+    def margins(session, url, rng):
+        return session.get(f"{url}/api/reports/margins/product", params={
+            "order": rng.choice(("top", "bottom")), "limit": 10,
+        })
+
+    def lookup(session, url, rng):
+        # Búsqueda incremental: las primeras letras de un producto existente
+        name = PRODUCT_TEMPLATES[rng.randrange(len(PRODUCT_TEMPLATES))][0]
+        return session.get(f"{url}/api/products/lookup", params={"q": name[:rng.randint(2, 8)]})
+
+    def history(session, url, rng):
+        return session.get(f"{url}/api/prices/history/{rng.randint(1, min(products, HISTORY_PRODUCTS))}",
+                           params={"days": 365})
+
+    return {
+        "login": login,
+        "products": products_list,
+        "orders": orders_list,
+        "suggest": suggest,
+        "chat": chat,
+        "reports": reports,
+        "history": history,
+        "dashboard": dashboard,
+        "lookup": lookup,
+        "margins": margins,
+    }
+
+
+def run_scenario(name: str, scenario: Callable, url: str, tokens: List[str],
+                 requests_count: int, concurrency: int, seed: int) -> Dict:
+    """Ejecutar un escenario con `concurrency` workers y medir latencias"""
+    import requests
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    per_worker = [requests_count // concurrency + (1 if i < requests_count % concurrency else 0)
+                  for i in range(concurrency)]
+
+    def worker(index: int):
+        rng = random.Random(f"{seed}-{name}-{index}")
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {tokens[index % len(tokens)]}"
+        local_latencies, local_errors = [], {}
+        for _ in range(per_worker[index]):
+            start = time.perf_counter()
+            try:
+                response = scenario(session, url, rng)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                local_errors[str(status)] = local_errors.get(str(status), 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for key, count in local_errors.items():
+                errors[key] = errors.get(key, 0) + count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_comparison(results: Dict, baseline_path: str) -> None:
+    """Mostrar la variación de p95 y RPS contra una corrida anterior"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparación contra {baseline_path} (commit {baseline.get('meta', {}).get('commit')}):")
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        p95_delta = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100 if previous["p95_ms"] else 0
+        rps_delta = (current["rps"] - previous["rps"]) / previous["rps"] * 100 if previous["rps"] else 0
+        flag = "  <-- regresión" if p95_delta > 20 or rps_delta < -20 else ""
+        print(f"  {name:<10} p95 {previous['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms ({p95_delta:+.1f}%)"
+              f"   RPS {previous['rps']:>8.2f} -> {current['rps']:>8.2f} ({rps_delta:+.1f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la API de MobiCorp")
+    parser.add_argument("--db", default=DEFAULT_DB_URL, help="URL de la base sintética")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reseed", action="store_true", help="Volver a sembrar aunque la base ya exista")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers concurrentes")
+    parser.add_argument("--scenarios", default="login,products,orders,suggest,chat,reports,history,dashboard,lookup,margins")
+    parser.add_argument("--scraper-latency", type=float, default=0.0, help="Latencia simulada del scraper (s)")
+    parser.add_argument("--url", help="Servidor externo (omite el servidor en proceso y el scraper simulado)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    os.environ["MOBICORP_DATABASE_URL"] = args.db
+
+    if args.reseed or not database_matches(args.products, args.orders):
+        print(f"Sembrando {args.db} ({args.products:,} productos, {args.orders:,} pedidos)...")
+        seed_database(args.products, args.orders, args.users, args.seed)
+
+    url = args.url
+    server = None
+    if not url:
+        server, _ = start_server(args.port, args.scraper_latency, args.seed)
+        url = f"http://127.0.0.1:{args.port}"
+
+    import requests
+    tokens = []
+    for i in range(min(args.users, args.concurrency)):
+        response = requests.post(f"{url}/api/auth/login", data={
+            "username": f"user{i}@loadtest.mobicorp.com", "password": LOADTEST_PASSWORD,
+        })
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+
+    scenarios = build_scenarios(args.products, args.orders)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "products": args.products,
+            "orders": args.orders,
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "scraper": "external" if args.url else f"simulated (seed={args.seed}, latency={args.scraper_latency}s)",
+        },
+        "endpoints": {},
+    }
+
+    print(f"\n{'escenario':<10} {'req':>6} {'err':>5} {'RPS':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if name not in scenarios:
+            print(f"Escenario desconocido: {name}")
+            continue
+        stats = run_scenario(name, scenarios[name], url, tokens, args.requests, args.concurrency, args.seed)
+        results["endpoints"][name] = stats
+        print(f"{name:<10} {stats['requests']:>6} {sum(stats['errors'].values()):>5} {stats['rps']:>9.2f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    if server is not None:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,58 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query, UploadFile, File, Form
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, status, Query, Request, UploadFile, File, Form, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy import update, case, func
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
-import uvicorn
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
 import os
-import shutil
-from pathlib import Path
+import json
+import math
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 from database import SessionLocal, engine, Base
-from models import User, Product, Order, PriceComparison, PriceAlert
+from models import User, Product, Category, Order, OrderItem, PriceComparison, PriceAlert, AlertRule, Job, AuditEvent
 from schemas import (
-    UserCreate, UserResponse, Token, OrderCreate, OrderResponse,
-    ProductCreate, ProductResponse, PriceComparisonResponse,
-    PriceSuggestion, ChatMessage, ChatResponse
+    UserCreate, UserResponse, Token, RefreshRequest, LogoutRequest, OrderCreate, OrderResponse, OrderItemCreate,
+    OrderItemApproval, OrderApproval, OrderBatchRequest, OrderBatchResponse, OrderDecisionResult,
+    ProductCreate, ProductResponse, ProductLookup, CategoryNode, PriceComparisonResponse,
+    PriceSuggestion, PriceHistoryResponse, RepriceRequest, RepriceResponse, AlertRuleCreate, AlertRuleResponse,
+    DashboardStats, JobResponse, AuditEventResponse,
+    ChatMessage, ChatResponse
 )
-from auth import get_current_user, create_access_token, verify_password, get_password_hash
-from price_scraper import PriceScraper
-from chatbot import ChatbotAssistant
+from auth import get_current_user, authenticate_token, oauth2_scheme, token_service, verify_password, get_password_hash
+from tokens import REFRESH, TokenError
+from alerts import AlertEngine, AlertHub, alert_event
+from price_history import RESOLUTIONS, maybe_prune, price_history, record_observations
+from archive import alerts_page, archive_old_rows, archive_stats, comparisons_page, maybe_archive
+from profiling import ProfilingMiddleware, ProfiledRoute, install_sql_instrumentation, metrics, metrics_allowed, phase
+from chat_context import ChatSessionStore, PRODUCTS, ORDERS, COMPARISONS
+from categories import CategoryTreeCache, assign_product_category, descendant_ids
+from dashboard import DashboardStatsCache
+from catalog import LOOKUP_LIMIT, MAX_LOOKUP_LIMIT, CatalogSnapshot
+from jobs import JobError, JobQueue, RunningJob, job_payload
+import margins
+from audit import AuditLog, event_payload
+from reporting import ReportingDatabase
+from images import ImageError, ImageStore
+from inventory import InsufficientStockError, reserve_stock, release_order_reservations
+from services import LazyService
+from shared_state import create_backend
+from rate_limit import RATE_LIMITING, AdmissionController, AdmissionMiddleware, client_identity, rejection_detail
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
+if TYPE_CHECKING:
+    from pricing import PriceStats
 
-app = FastAPI(
-    title="MobiCorp - Sistema de Gestión de Muebles y Mobiliario",
-    description="Sistema especializado en la gestión de ventas de muebles y mobiliario de oficina (sillas ejecutivas, escritorios, mesas, etc.)",
-    version="1.0.0"
-)
+# Las rutas se declaran en un router y create_app() arma la app; importar
+# este módulo no toca la base ni el disco y no carga el scraper, NumPy ni
+# uvicorn (ver bench_startup.py)
+# Medir la fase "handler" de cada endpoint
+router = APIRouter(route_class=ProfiledRoute)
 
 # CORS
 # Dominios permitidos: localhost para desarrollo y Vercel para producción
@@ -41,18 +65,6 @@ allowed_origins = [
     "https://innova-hack-mobi-corp-pw2iimr8e-jorge-penas-projects-e24e6692.vercel.app",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origin_regex=r"https://.*\.vercel\.app",
-    allow_origins=allowed_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"],
-)
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
-
 # Dependencia para obtener DB
 def get_db():
     db = SessionLocal()
@@ -61,20 +73,81 @@ def get_db():
     finally:
         db.close()
 
+# Dependencia para los reportes: copia o réplica de solo lectura (ver reporting.py)
+@contextmanager
+def reporting_session(response: Response):
+    """Sesión de reportes; informa la antigüedad de los datos en X-Data-Age"""
+    with reporting.session() as db:
+        response.headers["X-Data-Age"] = f"{db.info['data_age']:.1f}"
+        yield db
+
+def get_reporting_db(response: Response):
+    with reporting_session(response) as db:
+        yield db
+
+# Servicios pesados: se construyen en su primer uso (o en la precarga del lifespan)
+def _build_price_scraper():
+    if SCRAPER == "sim":
+        # Fuentes simuladas deterministas, sin red (ver scraper_sim.py)
+        from scraper_sim import SimulatedScraper
+        return SimulatedScraper.from_env()
+    from price_scraper import PriceScraper
+    return PriceScraper()
+
+def _build_pricing_engine():
+    from pricing import PricingEngine
+    return PricingEngine()
+
+def _build_chatbot():
+    from chatbot import ChatbotAssistant
+    return ChatbotAssistant(sessions=chat_sessions, categories=category_cache, reporting=reporting)
+
 # Inicializar servicios
-price_scraper = PriceScraper()
-chatbot = ChatbotAssistant()
+# Estado compartido entre workers (versiones de cachés, difusión de alertas,
+# contexto del chatbot): en memoria o Redis según MOBICORP_STATE_URL
+shared_state = create_backend()
+price_scraper = LazyService(_build_price_scraper, "price_scraper")
+pricing_engine = LazyService(_build_pricing_engine, "pricing_engine")
+alert_engine = AlertEngine(state=shared_state)
+alert_hub = AlertHub(state=shared_state)
+chat_sessions = ChatSessionStore(state=shared_state)
+# Revocaciones de tokens visibles en todos los workers
+token_service.bind_state(shared_state)
+category_cache = CategoryTreeCache(state=shared_state)
+dashboard_cache = DashboardStatsCache(state=shared_state)
+catalog = CatalogSnapshot(state=shared_state)
+# Límites de peticiones por usuario y clase de endpoint (ver rate_limit.py)
+admission = AdmissionController(shared_state)
+chatbot = LazyService(_build_chatbot, "chatbot")
+# Operaciones largas en segundo plano (?background=true, ver jobs.py); los
+# HTTPException de un handler son errores definitivos, no se reintentan
+job_queue = JobQueue(SessionLocal, permanent_errors=(HTTPException,))
+# Los reportes leen de una copia periódica o réplica, no de la base de los pedidos
+reporting = ReportingDatabase(engine, SessionLocal)
+# Auditoría: eventos en memoria volcados por lotes a audit_events (ver audit.py)
+audit_log = AuditLog(SessionLocal)
 
-# Configurar directorio para imágenes
-UPLOAD_DIR = Path("uploads/images")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# Precargar los servicios diferidos en segundo plano al arrancar ("0" = solo en su primer uso)
+PRELOAD_SERVICES = os.getenv("MOBICORP_PRELOAD_SERVICES", "1") != "0"
+# Scraper de precios: "live" (PriceScraper) o "sim" (fuentes simuladas, MOBICORP_SCRAPER_*)
+SCRAPER = os.getenv("MOBICORP_SCRAPER", "live")
 
-# Montar directorio estático para servir imágenes (después de crear las rutas)
-# Se montará después de definir todas las rutas
+# Máximo de decisiones por lote en /api/orders/batch
+MAX_ORDER_BATCH = 500
+# Máximo de productos por repricing y consultas de scraping en paralelo
+MAX_REPRICE_BATCH = 200
+SCRAPING_WORKERS = 8
+# Meses de los reportes de márgenes ("YYYY-MM")
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+# Segundos entre comentarios keep-alive en el stream de alertas
+ALERT_HEARTBEAT_SECONDS = 15
+
+# Imágenes de productos por contenido (el directorio se crea al arrancar la app)
+image_store = ImageStore()
 
 # ==================== AUTENTICACIÓN ====================
 
-@app.post("/api/auth/register", response_model=UserResponse)
+@router.post("/api/auth/register", response_model=UserResponse)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     """Registrar nuevo usuario"""
     db_user = db.query(User).filter(User.email == user.email).first()
@@ -93,7 +166,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     return db_user
 
-@app.post("/api/auth/login", response_model=Token)
+@router.post("/api/auth/login", response_model=Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Iniciar sesión"""
     user = db.query(User).filter(User.email == form_data.username).first()
@@ -103,32 +176,82 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             detail="Credenciales incorrectas",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuario inactivo")
+    return token_service.issue_pair(user)
 
-@app.get("/api/auth/me", response_model=UserResponse)
+@router.post("/api/auth/refresh", response_model=Token)
+def refresh_token(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Canjear el token de refresco por un par nuevo (sin contraseña ni bcrypt)
+    El token usado queda revocado; si se presenta de nuevo se cierran todas
+    las sesiones del usuario
+    """
+    try:
+        return token_service.refresh(db, request.refresh_token)
+    except TokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@router.post("/api/auth/logout")
+def logout(
+    request: Optional[LogoutRequest] = None,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Revocar el token de acceso (y el de refresco enviado) o, con all_sessions, todos los del usuario"""
+    if request and request.all_sessions:
+        token_service.revoke_user(db, current_user.email)
+        return {"message": "Se cerraron todas las sesiones"}
+    token_service.revoke(db, token_service.verify(token))
+    if request and request.refresh_token:
+        try:
+            claims = token_service.decode(request.refresh_token)
+        except TokenError:
+            claims = None
+        if claims and claims.get("type") == REFRESH and claims.get("sub") == current_user.email:
+            token_service.revoke(db, claims)
+    return {"message": "Sesión cerrada"}
+
+@router.get("/api/auth/me", response_model=UserResponse)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Obtener información del usuario actual"""
     return current_user
 
 # ==================== PRODUCTOS ====================
 
-@app.get("/api/products", response_model=List[ProductResponse])
+@router.get("/api/products", response_model=List[ProductResponse])
 def get_products(
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
+    category_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener lista de productos"""
+    """Obtener lista de productos (el filtro de categoría incluye subcategorías)"""
     query = db.query(Product)
-    if category:
-        query = query.filter(Product.category == category)
+    if category_id is not None:
+        category_path = db.query(Category.path).filter(Category.id == category_id).scalar()
+        query = query.filter(Product.category_id.in_(descendant_ids(db, category_path) if category_path else []))
+    elif category:
+        query = query.filter(Product.category_id.in_(descendant_ids(db, category)))
     products = query.offset(skip).limit(limit).all()
     return products
 
-@app.post("/api/products", response_model=ProductResponse)
+@router.get("/api/categories", response_model=List[CategoryNode])
+def get_categories(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Árbol de categorías con cantidad de productos por nodo (cacheado)"""
+    return category_cache.tree(db)
+
+@router.post("/api/products", response_model=ProductResponse)
 async def create_product(
     name: str = Form(...),
     category: str = Form(...),
@@ -144,21 +267,13 @@ async def create_product(
     try:
         image_url = None
         
-        # Guardar imagen si se proporciona
+        # Guardar imagen si se proporciona (nombre por contenido: una imagen
+        # ya subida no se vuelve a escribir); en un hilo para no bloquear el loop
         if image and image.filename:
-            # Generar nombre único para la imagen
-            file_extension = os.path.splitext(image.filename)[1] if image.filename else ".jpg"
-            # Sanitizar nombre del producto para el nombre del archivo
-            safe_name = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in name)[:50]
-            unique_filename = f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{safe_name}{file_extension}"
-            file_path = UPLOAD_DIR / unique_filename
-            
-            # Guardar archivo
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
-            
-            # Guardar URL relativa
-            image_url = f"/uploads/images/{unique_filename}"
+            try:
+                image_url, _ = await run_in_threadpool(image_store.save, image.file)
+            except ImageError as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
         
         # Validar campos requeridos
         if not name or not name.strip():
@@ -195,8 +310,14 @@ async def create_product(
             image_url=image_url
         )
         db.add(db_product)
+        assign_product_category(db, db_product)
         db.commit()
         db.refresh(db_product)
+        category_cache.invalidate()
+        catalog.invalidate()
+        chat_sessions.invalidate(PRODUCTS)
+        audit_log.record("create_product", current_user.id, "product", db_product.id,
+                         name=db_product.name, sku=db_product.sku, price=db_product.price, stock=db_product.stock)
         return db_product
     except HTTPException:
         db.rollback()
@@ -208,7 +329,42 @@ async def create_product(
         traceback.print_exc()
         raise HTTPException(status_code=400, detail=f"Error al crear producto: {str(e)}")
 
-@app.get("/api/products/{product_id}", response_model=ProductResponse)
+@router.api_route("/uploads/images/{name}", methods=["GET", "HEAD"], include_in_schema=False)
+def product_image(name: str, request: Request):
+    """
+    Imagen de producto: las de nombre por contenido con caché immutable,
+    ETag/304, rangos y variante precomprimida según Accept-Encoding
+    """
+    return image_store.response(request, name)
+
+@router.get("/api/products/lookup", response_model=List[ProductLookup])
+def lookup_products(
+    q: str = "",
+    limit: int = Query(LOOKUP_LIMIT, ge=1, le=MAX_LOOKUP_LIMIT),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Búsqueda incremental por nombre o SKU (id, nombre, SKU, precio y stock actual)"""
+    return catalog.lookup(db, q, limit)
+
+@router.get("/api/products/catalog")
+def get_product_catalog(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Catálogo compacto completo (id, nombre, SKU y precio, sin stock) con
+    ETag: 304 si el cliente ya tiene esta versión
+    """
+    snapshot = catalog.get(db)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    known = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if snapshot.etag in known or "*" in known:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+@router.get("/api/products/{product_id}", response_model=ProductResponse)
 def get_product(
     product_id: int,
     db: Session = Depends(get_db),
@@ -222,7 +378,7 @@ def get_product(
 
 # ==================== PEDIDOS ====================
 
-@app.get("/api/orders", response_model=List[OrderResponse])
+@router.get("/api/orders", response_model=List[OrderResponse])
 def get_orders(
     skip: int = 0,
     limit: int = 100,
@@ -230,78 +386,386 @@ def get_orders(
     current_user: User = Depends(get_current_user)
 ):
     """Obtener lista de pedidos"""
-    orders = db.query(Order).offset(skip).limit(limit).order_by(Order.created_at.desc()).all()
+    orders = db.query(Order).options(*_order_load_options()).order_by(
+        Order.created_at.desc()
+    ).offset(skip).limit(limit).all()
     return orders
 
-@app.post("/api/orders", response_model=OrderResponse)
+@router.post("/api/orders", response_model=OrderResponse)
 def create_order(
     order: OrderCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Crear nuevo pedido"""
-    # Verificar que el producto existe
-    product = db.query(Product).filter(Product.id == order.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
-    db_order = Order(
+    """Crear nuevo pedido reservando el stock del producto"""
+    return _create_orders([order], db, current_user)[0]
+
+@router.post("/api/orders/bulk", response_model=List[OrderResponse])
+def create_orders_bulk(
+    orders: List[OrderCreate],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Crear varios pedidos en una sola transacción: se reservan todos o ninguno"""
+    if not orders:
+        raise HTTPException(status_code=400, detail="Debe enviar al menos un pedido")
+    return _create_orders(orders, db, current_user)
+
+def _order_load_options():
+    """Cargar líneas y productos en consultas aparte (evita N+1 al serializar)"""
+    return (
+        selectinload(Order.product),
+        selectinload(Order.items).selectinload(OrderItem.product),
+    )
+
+def _order_lines(order: OrderCreate) -> List[OrderItemCreate]:
+    """Líneas del pedido: items, o la línea única del formato original"""
+    if order.items:
+        return order.items
+    if order.product_id is None or order.quantity is None or order.requested_price is None:
+        raise HTTPException(status_code=400, detail="El pedido debe tener al menos un ítem")
+    return [OrderItemCreate(
         product_id=order.product_id,
         quantity=order.quantity,
-        requested_price=order.requested_price,
-        user_id=current_user.id,
-        status="pending"
-    )
-    db.add(db_order)
+        requested_price=order.requested_price
+    )]
+
+def _single_line_summary(lines: List[OrderItemCreate]) -> dict:
+    """Campos de compatibilidad de Order: solo se llenan si el pedido tiene una línea"""
+    if len(lines) != 1:
+        return {}
+    return {
+        "product_id": lines[0].product_id,
+        "quantity": lines[0].quantity,
+        "requested_price": lines[0].requested_price,
+    }
+
+def _create_orders(orders: List[OrderCreate], db: Session, current_user: User) -> List[Order]:
+    """Validar, reservar stock e insertar pedidos con sus líneas en una única transacción"""
+    lines_per_order = [_order_lines(order) for order in orders]
+    all_lines = [line for lines in lines_per_order for line in lines]
+    if any(line.quantity <= 0 for line in all_lines):
+        raise HTTPException(status_code=400, detail="La cantidad debe ser mayor a cero")
+
+    # Verificar que los productos existen
+    product_ids = {line.product_id for line in all_lines}
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()}
+    if len(products) != len(product_ids):
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    
+    try:
+        reserve_stock(db, [(line.product_id, line.quantity) for line in all_lines])
+    except InsufficientStockError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail=f"Stock insuficiente para '{products[e.product_id].name}': "
+                   f"solicitado {e.requested}, disponible {e.available}"
+        )
+
+    db_orders = [
+        Order(
+            **_single_line_summary(lines),
+            user_id=current_user.id,
+            status="pending",
+            stock_reserved=True,
+            items=[
+                OrderItem(
+                    product_id=line.product_id,
+                    quantity=line.quantity,
+                    requested_price=line.requested_price
+                )
+                for line in lines
+            ]
+        )
+        for lines in lines_per_order
+    ]
+    db.add_all(db_orders)
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    for db_order in db_orders:
+        db.refresh(db_order)
+    chat_sessions.invalidate(ORDERS, PRODUCTS)
+    for db_order, lines in zip(db_orders, lines_per_order):
+        audit_log.record(
+            "create_order", current_user.id, "order", db_order.id,
+            items=[{"product_id": line.product_id, "quantity": line.quantity,
+                    "requested_price": line.requested_price} for line in lines],
+        )
+    return db_orders
 
-@app.get("/api/orders/{order_id}", response_model=OrderResponse)
+def _resolve_item_prices(
+    item_ids: List[int],
+    final_price: Optional[float],
+    items: List[OrderItemApproval]
+) -> Dict[int, float]:
+    """
+    Precio final de cada línea de un pedido
+    final_price solo se aplica a pedidos de una línea; los de varias líneas
+    deben traer el precio de cada ítem. Lanza ValueError con el motivo.
+    """
+    if not item_ids:
+        raise ValueError("El pedido no tiene ítems")
+    explicit = {item.item_id: item.final_price for item in items}
+    unknown = set(explicit) - set(item_ids)
+    if unknown:
+        raise ValueError(f"El ítem {min(unknown)} no pertenece al pedido")
+    prices = {}
+    for item_id in item_ids:
+        price = explicit.get(item_id, final_price if len(item_ids) == 1 else None)
+        if price is None:
+            raise ValueError(f"Falta el precio final del ítem {item_id}")
+        if price < 0:
+            raise ValueError("El precio final no puede ser negativo")
+        prices[item_id] = price
+    return prices
+
+@router.get("/api/orders/{order_id}", response_model=OrderResponse)
 def get_order(
     order_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener pedido por ID"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = db.query(Order).options(*_order_load_options()).filter(Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     return order
 
-@app.post("/api/orders/{order_id}/approve")
+@router.post("/api/orders/{order_id}/approve")
 def approve_order(
     order_id: int,
-    final_price: float = Query(...),
+    final_price: Optional[float] = Query(None),
+    approval: Optional[OrderApproval] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Aprobar pedido con precio final"""
+    """
+    Aprobar pedido con precio final
+    Pedidos de una línea: ?final_price=...; varios ítems: cuerpo OrderApproval
+    """
     order = db.query(Order).filter(Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    if order.status == "rejected":
+        raise HTTPException(status_code=409, detail="No se puede aprobar un pedido rechazado")
     
-    order.final_price = final_price
+    if approval and approval.final_price is not None:
+        final_price = approval.final_price
+    try:
+        prices = _resolve_item_prices(
+            [item.id for item in order.items], final_price, approval.items if approval else []
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Reaprobación: se quita el aporte anterior a los márgenes antes de cambiar precios
+    if order.status == "approved":
+        margins.retract_orders(db, [order.id])
+    for item in order.items:
+        item.final_price = prices[item.id]
+    order.final_price = order.items[0].final_price if len(order.items) == 1 else None
     order.status = "approved"
     order.approved_at = datetime.now(timezone.utc)
+    db.flush()
+    margins.record_orders(db, [order.id])
     db.commit()
+    chat_sessions.invalidate(ORDERS)
+    audit_log.record("approve_order", current_user.id, "order", order_id, final_prices=prices)
     return {"message": "Pedido aprobado exitosamente"}
 
+@router.post("/api/orders/{order_id}/reject")
+def reject_order(
+    order_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rechazar pedido y devolver al inventario el stock reservado"""
+    exists = db.query(Order.id).filter(Order.id == order_id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    
+    # Si estaba aprobado, deja de contar en los márgenes
+    margins.retract_orders(db, [order_id])
+    # UPDATE condicional: solo un rechazo concurrente puede cambiar el estado
+    result = db.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status != "rejected")
+        .values(status="rejected")
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El pedido ya fue rechazado")
+    release_order_reservations(db, [order_id])
+    db.commit()
+    chat_sessions.invalidate(ORDERS, PRODUCTS)
+    audit_log.record("reject_order", current_user.id, "order", order_id)
+    return {"message": "Pedido rechazado y stock liberado"}
+
+@router.post("/api/orders/batch", response_model=OrderBatchResponse)
+def decide_orders_batch(
+    batch: OrderBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Aprobar y/o rechazar varios pedidos en una sola transacción
+    Las aprobaciones se aplican con un UPDATE sobre orders y otro sobre
+    order_items (precio final por CASE), los rechazos con otro; el resultado
+    se informa pedido por pedido
+    """
+    decisions = batch.decisions
+    if not decisions:
+        raise HTTPException(status_code=400, detail="Debe enviar al menos una decisión")
+    if len(decisions) > MAX_ORDER_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote no puede superar {MAX_ORDER_BATCH} pedidos"
+        )
+
+    results = [
+        OrderDecisionResult(order_id=d.order_id, action=d.action, success=False)
+        for d in decisions
+    ]
+    current = dict(
+        db.query(Order.id, Order.status)
+        .filter(Order.id.in_({d.order_id for d in decisions}))
+        .all()
+    )
+    item_ids: Dict[int, List[int]] = {}
+    for item_id, order_id in db.query(OrderItem.id, OrderItem.order_id).filter(
+        OrderItem.order_id.in_(current.keys())
+    ).order_by(OrderItem.id):
+        item_ids.setdefault(order_id, []).append(item_id)
+
+    approvals: Dict[int, Dict[int, float]] = {}
+    rejections: List[int] = []
+    positions: Dict[int, int] = {}
+    for i, decision in enumerate(decisions):
+        result = results[i]
+        if decision.order_id in positions:
+            result.detail = "Pedido repetido en el lote"
+        elif decision.action not in ("approve", "reject"):
+            result.detail = "Acción inválida (use 'approve' o 'reject')"
+        elif decision.order_id not in current:
+            result.detail = "Pedido no encontrado"
+        elif current[decision.order_id] == "rejected":
+            result.status = "rejected"
+            result.detail = (
+                "El pedido ya fue rechazado" if decision.action == "reject"
+                else "No se puede aprobar un pedido rechazado"
+            )
+        elif decision.action == "approve":
+            try:
+                approvals[decision.order_id] = _resolve_item_prices(
+                    item_ids.get(decision.order_id, []), decision.final_price, decision.items
+                )
+            except ValueError as e:
+                result.detail = str(e)
+        else:
+            rejections.append(decision.order_id)
+        positions.setdefault(decision.order_id, i)
+
+    # Los pedidos ya aprobados que se reaprueban o rechazan dejan de contar en los márgenes
+    margins.retract_orders(db, list(approvals) + rejections)
+
+    approved_ids = set()
+    if approvals:
+        # Resumen de compatibilidad: precio final en la cabecera de pedidos de una línea
+        header_prices = {
+            order_id: next(iter(prices.values()))
+            for order_id, prices in approvals.items() if len(prices) == 1
+        }
+        approved_ids = set(db.execute(
+            update(Order)
+            .where(Order.id.in_(approvals.keys()), Order.status != "rejected")
+            .values(
+                final_price=case(header_prices, value=Order.id, else_=None) if header_prices else None,
+                status="approved",
+                approved_at=datetime.now(timezone.utc)
+            )
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        item_prices = {
+            item_id: price
+            for order_id in approved_ids
+            for item_id, price in approvals[order_id].items()
+        }
+        if item_prices:
+            db.execute(
+                update(OrderItem)
+                .where(OrderItem.id.in_(item_prices.keys()))
+                .values(final_price=case(item_prices, value=OrderItem.id))
+                .execution_options(synchronize_session=False)
+            )
+        margins.record_orders(db, approved_ids)
+
+    rejected_ids = set()
+    if rejections:
+        # Mismo UPDATE condicional que /reject: un rechazo concurrente no se cuenta dos veces
+        rejected_ids = set(db.execute(
+            update(Order)
+            .where(Order.id.in_(rejections), Order.status != "rejected")
+            .values(status="rejected")
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        release_order_reservations(db, list(rejected_ids))
+    db.commit()
+
+    for order_id in approvals:
+        result = results[positions[order_id]]
+        result.success = order_id in approved_ids
+        result.status = "approved" if result.success else "rejected"
+        if not result.success:
+            result.detail = "No se puede aprobar un pedido rechazado"
+    for order_id in rejections:
+        result = results[positions[order_id]]
+        result.success = order_id in rejected_ids
+        result.status = "rejected"
+        if not result.success:
+            result.detail = "El pedido ya fue rechazado"
+
+    # Una sola invalidación por lote
+    if rejected_ids:
+        chat_sessions.invalidate(ORDERS, PRODUCTS)
+    elif approved_ids:
+        chat_sessions.invalidate(ORDERS)
+    for order_id in approved_ids:
+        audit_log.record("approve_order", current_user.id, "order", order_id,
+                         final_prices=approvals[order_id], batch=True)
+    for order_id in rejected_ids:
+        audit_log.record("reject_order", current_user.id, "order", order_id, batch=True)
+
+    return OrderBatchResponse(
+        approved=len(approved_ids),
+        rejected=len(rejected_ids),
+        failed=sum(1 for result in results if not result.success),
+        results=results
+    )
+
 # ==================== COMPARACIÓN DE PRECIOS ====================
 
-@app.post("/api/prices/suggest", response_model=PriceSuggestion)
+@router.post("/api/prices/suggest", response_model=PriceSuggestion)
 def suggest_price(
     product_id: int,
+    background: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener precio sugerido basado en comparación de mercado"""
+    """Obtener precio sugerido basado en comparación de mercado (background=true: 202 con la tarea)"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
+    if background:
+        return _job_accepted(job_queue.submit(db, "suggest", {"product_id": product_id}, current_user.id))
+    return _suggest_price(db, product, current_user)
+
+def _suggest_price(db: Session, product: Product, current_user: User) -> dict:
+    """Consultar el mercado, calcular el precio sugerido y registrar la comparación"""
     # Realizar web scraping para obtener precios del mercado
-    market_prices = price_scraper.scrape_prices(product.name, product.category)
+    with phase("scraping"):
+        market_prices = price_scraper.scrape_prices(product.name, product.category)
     
     if not market_prices:
         raise HTTPException(
@@ -309,86 +773,370 @@ def suggest_price(
             detail="No se encontraron precios en el mercado para este producto"
         )
     
-    # Calcular estadísticas
-    prices = [p["price"] for p in market_prices]
-    min_price = min(prices)
-    max_price = max(prices)
-    avg_price = sum(prices) / len(prices)
+    # Mediana, IQR, media recortada y promedio ponderado por fuente
+    stats = pricing_engine.price(market_prices)
+    comparison, _ = _record_price_stats(db, [product], [market_prices], [stats], current_user)[0]
+    audit_log.record("suggest_price", current_user.id, "product", product.id,
+                     suggested_price=stats.suggested_price, comparison_id=comparison.id)
     
-    # Precio sugerido basado en promedio de mercado
-    suggested_price = avg_price
+    return {
+        "suggested_price": stats.suggested_price,
+        "min_price": stats.min_price,
+        "max_price": stats.max_price,
+        "avg_price": stats.avg_price,
+        "median_price": stats.median_price,
+        "trimmed_mean": stats.trimmed_mean,
+        "outlier_sources": stats.outlier_sources,
+        "market_sources": market_prices,
+        "comparison_id": comparison.id
+    }
+
+@router.post("/api/prices/reprice", response_model=RepriceResponse)
+def reprice_products(
+    request: RepriceRequest,
+    background: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recalcular el precio sugerido de varios productos a la vez
+    Las consultas de mercado se hacen en paralelo y las estadísticas de todos
+    los productos se calculan juntas (una pasada vectorizada).
+    Con background=true responde 202 con la tarea y el avance se consulta en /api/jobs/{id}
+    """
+    products = _reprice_selection(db, request)
+    if background:
+        params = {"product_ids": [product.id for product in products]}
+        return _job_accepted(job_queue.submit(db, "reprice", params, current_user.id))
+    return _reprice(db, products, current_user)
+
+def _reprice_selection(db: Session, request: RepriceRequest) -> List[Product]:
+    """Productos a recalcular (por IDs y/o categoría), como mucho MAX_REPRICE_BATCH"""
+    query = db.query(Product)
+    if request.category:
+        query = query.filter(Product.category_id.in_(descendant_ids(db, request.category)))
+    if request.product_ids:
+        query = query.filter(Product.id.in_(request.product_ids))
+    elif not request.category:
+        raise HTTPException(status_code=400, detail="Indique productos o una categoría")
+    products = query.order_by(Product.id).limit(MAX_REPRICE_BATCH + 1).all()
+    if len(products) > MAX_REPRICE_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El repricing no puede superar {MAX_REPRICE_BATCH} productos"
+        )
+    return products
+
+def _reprice(db: Session, products: List[Product], current_user: User, job: Optional[RunningJob] = None) -> dict:
+    """Consultar el mercado de todos los productos en paralelo y registrar sus comparaciones"""
+    with phase("scraping"):
+        with ThreadPoolExecutor(max_workers=SCRAPING_WORKERS) as pool:
+            futures = [
+                pool.submit(price_scraper.scrape_prices, product.name, product.category)
+                for product in products
+            ]
+            markets = []
+            for future in futures:
+                markets.append(future.result())
+                if job is not None:
+                    job.report(len(markets), len(products), "Consultando precios de mercado")
     
-    # Guardar comparación en BD
-    comparison = PriceComparison(
-        product_id=product_id,
-        min_price=min_price,
-        max_price=max_price,
-        avg_price=avg_price,
-        suggested_price=suggested_price,
-        source_count=len(market_prices),
-        user_id=current_user.id
+    priced = [
+        (product, market, stats)
+        for product, market, stats in zip(products, markets, pricing_engine.price_many(markets)) if stats
+    ]
+    recorded = _record_price_stats(
+        db,
+        [product for product, _, _ in priced],
+        [market for _, market, _ in priced],
+        [stats for _, _, stats in priced],
+        current_user
     )
-    db.add(comparison)
-    db.commit()
-    
-    # Verificar alertas de precio
-    if product.price and abs(product.price - avg_price) / product.price > 0.1:  # 10% de variación
-        alert = PriceAlert(
-            product_id=product_id,
-            old_price=product.price,
-            new_price=avg_price,
-            variation_percent=((avg_price - product.price) / product.price) * 100
-        )
-        db.add(alert)
-        db.commit()
     
+    results = [
+        {
+            "product_id": product.id,
+            "product_name": product.name,
+            "current_price": product.price,
+            "suggested_price": stats.suggested_price,
+            "median_price": stats.median_price,
+            "outlier_sources": stats.outlier_sources,
+            "comparison_id": comparison.id,
+            "alert": alerted,
+        }
+        for (product, _, stats), (comparison, alerted) in zip(priced, recorded)
+    ]
+    audit_log.record("reprice", current_user.id, None, None,
+                     product_ids=[result["product_id"] for result in results],
+                     alerts=[result["product_id"] for result in results if result["alert"]])
     return {
-        "suggested_price": suggested_price,
-        "min_price": min_price,
-        "max_price": max_price,
-        "avg_price": avg_price,
-        "market_sources": market_prices,
-        "comparison_id": comparison.id
+        "repriced": len(results),
+        "alerts": sum(1 for result in results if result["alert"]),
+        "results": results
     }
 
-@app.get("/api/prices/comparisons", response_model=List[PriceComparisonResponse])
+def _record_price_stats(
+    db: Session,
+    products: List[Product],
+    markets: List[List[dict]],
+    stats: List["PriceStats"],
+    current_user: User
+) -> List[tuple]:
+    """
+    Guardar una comparación por producto, las observaciones por fuente del
+    historial y las alertas de variación en un solo commit; devuelve
+    (comparación, hubo_alerta) por producto
+    """
+    comparisons = [
+        PriceComparison(
+            product_id=product.id,
+            min_price=item.min_price,
+            max_price=item.max_price,
+            avg_price=item.avg_price,
+            suggested_price=item.suggested_price,
+            source_count=item.source_count,
+            user_id=current_user.id
+        )
+        for product, item in zip(products, stats)
+    ]
+    db.add_all(comparisons)
+    record_observations(db, [(product.id, market) for product, market in zip(products, markets)])
+    
+    # Evaluar alertas: precio sugerido contra el precio base, con el umbral de cada producto
+    alerts = alert_engine.evaluate(db, products, [item.suggested_price for item in stats])
+    db.commit()
+    if comparisons:
+        chat_sessions.invalidate(COMPARISONS)
+    names = {product.id: product.name for product in products}
+    alert_hub.publish([alert_event(alert, names[alert.product_id]) for alert in alerts])
+    maybe_prune(SessionLocal)
+    maybe_archive(SessionLocal)
+    alerted = {alert.product_id for alert in alerts}
+    return [(comparison, product.id in alerted) for product, comparison in zip(products, comparisons)]
+
+@router.get("/api/prices/history/{product_id}", response_model=PriceHistoryResponse)
+def get_price_history(
+    product_id: int,
+    days: int = Query(365, ge=1, le=3650),
+    resolution: Optional[str] = None,
+    by_source: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Tendencia de precios de mercado de un producto
+    Sin resolution se elige según el rango: hour (<= 7 días), day (<= 180), week
+    """
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Resolución inválida (use hour, day o week)")
+    if not db.query(Product.id).filter(Product.id == product_id).first():
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return price_history(db, product_id, days, resolution, by_source)
+
+@router.get("/api/prices/comparisons", response_model=List[PriceComparisonResponse])
 def get_price_comparisons(
     product_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
+    include_archived: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener historial de comparaciones de precios"""
-    query = db.query(PriceComparison)
+    """Obtener historial de comparaciones de precios (include_archived=true suma las archivadas)"""
+    if include_archived:
+        return comparisons_page(db, product_id, skip, limit)
+    query = db.query(PriceComparison).options(selectinload(PriceComparison.product))
     if product_id:
         query = query.filter(PriceComparison.product_id == product_id)
-    comparisons = query.offset(skip).limit(limit).order_by(PriceComparison.created_at.desc()).all()
+    comparisons = query.order_by(PriceComparison.created_at.desc()).offset(skip).limit(limit).all()
     return comparisons
 
-@app.get("/api/prices/alerts")
+@router.get("/api/prices/alerts")
 def get_price_alerts(
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    include_archived: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener alertas de variación de precios"""
-    alerts = db.query(PriceAlert).order_by(PriceAlert.created_at.desc()).limit(50).all()
-    return [
-        {
-            "id": alert.id,
-            "product_id": alert.product_id,
-            "product_name": alert.product.name if alert.product else "N/A",
-            "old_price": alert.old_price,
-            "new_price": alert.new_price,
-            "variation_percent": alert.variation_percent,
-            "created_at": alert.created_at
-        }
-        for alert in alerts
-    ]
+    """
+    Obtener alertas de variación de precios (las 50 más recientes)
+    Con after_id devuelve solo las posteriores a esa alerta; para recibirlas
+    en vivo use /api/prices/alerts/stream o /api/prices/alerts/ws. Las
+    anteriores se paginan con before_id; include_archived=true suma las archivadas
+    """
+    if include_archived:
+        return alerts_page(db, after_id, before_id)
+    return [alert_event(alert) for alert in _alerts_after(db, after_id, before_id=before_id)]
+
+def _alerts_after(db: Session, after_id: Optional[int], limit: int = 50,
+                  before_id: Optional[int] = None) -> List[PriceAlert]:
+    """Alertas más recientes, opcionalmente solo las posteriores a after_id (más nuevas primero)"""
+    query = db.query(PriceAlert).options(selectinload(PriceAlert.product))
+    if after_id is not None:
+        query = query.filter(PriceAlert.id > after_id)
+    if before_id is not None:
+        query = query.filter(PriceAlert.id < before_id)
+    return query.order_by(PriceAlert.id.desc()).limit(limit).all()
+
+@router.post("/api/prices/archive")
+def archive_price_history(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Archivar ya las comparaciones y alertas viejas (solo administradores;
+    también se hace solo, como mucho una vez por hora). Responde 202 con la tarea
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Solo los administradores pueden archivar")
+    return _job_accepted(job_queue.submit(db, "archive", {}, current_user.id))
+
+@router.get("/api/prices/archive/status")
+def get_archive_status(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Filas recientes y archivadas de comparaciones y alertas"""
+    return archive_stats(db)
+
+def _missed_alerts(token: str, last_event_id: Optional[int]) -> List[dict]:
+    """
+    Autenticar la conexión y obtener las alertas perdidas desde last_event_id
+    (bloqueante: los endpoints async la llaman con run_in_threadpool)
+    """
+    db = SessionLocal()
+    try:
+        authenticate_token(token, db)
+        if last_event_id is None:
+            return []
+        return [alert_event(alert) for alert in reversed(_alerts_after(db, last_event_id))]
+    finally:
+        db.close()
+
+@router.get("/api/prices/alerts/stream")
+async def price_alerts_stream(
+    request: Request,
+    token: str = Query(...),
+    last_event_id: Optional[int] = None
+):
+    """
+    Alertas de precio en vivo vía Server-Sent Events
+    El token va en la URL porque EventSource no permite cabeceras; al
+    reconectar, el navegador envía Last-Event-ID y se reenvían las perdidas
+    """
+    header_id = request.headers.get("last-event-id")
+    if header_id and header_id.isdigit():
+        last_event_id = int(header_id)
+    queue = alert_hub.subscribe()
+    try:
+        missed = await run_in_threadpool(_missed_alerts, token, last_event_id)
+    except HTTPException:
+        alert_hub.unsubscribe(queue)
+        raise
+
+    async def events():
+        sent = last_event_id or 0
+        try:
+            yield "retry: 3000\n\n"
+            for event in missed:
+                sent = max(sent, event["id"])
+                yield _sse_event(event, event="alert", event_id=event["id"])
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=ALERT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event["id"] > sent:
+                    sent = event["id"]
+                    yield _sse_event(event, event="alert", event_id=event["id"])
+        finally:
+            alert_hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/api/prices/alerts/ws")
+async def price_alerts_websocket(websocket: WebSocket, token: str = Query(...), last_event_id: Optional[int] = None):
+    """
+    Alertas de precio en vivo sobre WebSocket
+    servidor -> {"type": "alert", "alert": {...}}
+    """
+    queue = alert_hub.subscribe()
+    try:
+        try:
+            missed = await run_in_threadpool(_missed_alerts, token, last_event_id)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.accept()
+        for event in missed:
+            await websocket.send_json({"type": "alert", "alert": event})
+        while True:
+            event = await queue.get()
+            await websocket.send_json({"type": "alert", "alert": event})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        alert_hub.unsubscribe(queue)
+
+@router.get("/api/prices/alert-rules", response_model=List[AlertRuleResponse])
+def get_alert_rules(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Umbrales de alerta configurados (por producto y por categoría)"""
+    return db.query(AlertRule).order_by(AlertRule.id).all()
+
+@router.put("/api/prices/alert-rules", response_model=AlertRuleResponse)
+def put_alert_rule(
+    rule: AlertRuleCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Crear o actualizar el umbral de un producto o de una categoría"""
+    if (rule.product_id is None) == (not rule.category):
+        raise HTTPException(status_code=400, detail="Indique un producto o una categoría (solo uno)")
+    if rule.threshold_percent <= 0:
+        raise HTTPException(status_code=400, detail="El umbral debe ser mayor a cero")
+    if rule.product_id is not None:
+        if not db.query(Product.id).filter(Product.id == rule.product_id).first():
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        db_rule = db.query(AlertRule).filter(AlertRule.product_id == rule.product_id).first()
+    else:
+        if not descendant_ids(db, rule.category):
+            raise HTTPException(status_code=404, detail="Categoría no encontrada")
+        db_rule = db.query(AlertRule).filter(AlertRule.category == rule.category).first()
+    if db_rule is None:
+        db_rule = AlertRule(product_id=rule.product_id, category=rule.category or None)
+        db.add(db_rule)
+    db_rule.threshold_percent = rule.threshold_percent
+    db.commit()
+    db.refresh(db_rule)
+    alert_engine.invalidate_rules()
+    return db_rule
+
+@router.delete("/api/prices/alert-rules/{rule_id}")
+def delete_alert_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Eliminar un umbral (vuelve a aplicar el de la categoría o el por defecto)"""
+    deleted = db.query(AlertRule).filter(AlertRule.id == rule_id).delete()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    db.commit()
+    alert_engine.invalidate_rules()
+    return {"message": "Regla eliminada"}
 
 # ==================== CHATBOT ====================
 
-@app.post("/api/chat", response_model=ChatResponse)
+@router.post("/api/chat", response_model=ChatResponse)
 def chat(
     message: ChatMessage,
     db: Session = Depends(get_db),
@@ -398,74 +1146,441 @@ def chat(
     response = chatbot.process_message(message.message, db, current_user)
     return {"response": response}
 
+def _chat_fragments(message: str, user: User):
+    """
+    Generar los fragmentos de respuesta del chatbot con una sesión propia
+    La sesión vive mientras dura el streaming, no solo mientras dura el handler
+    """
+    db = SessionLocal()
+    try:
+        yield from chatbot.stream_message(message, db, user)
+    finally:
+        db.close()
+
+def _sse_event(data: dict, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Serializar un evento Server-Sent Events"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    prefix += f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/api/chat/stream")
+def chat_stream(
+    message: ChatMessage,
+    current_user: User = Depends(get_current_user)
+):
+    """Chatbot con respuesta incremental vía Server-Sent Events"""
+    def events():
+        try:
+            for fragment in _chat_fragments(message.message, current_user):
+                yield _sse_event({"delta": fragment})
+        except Exception as e:
+            print(f"Error en streaming del chatbot: {type(e).__name__}: {e}")
+            yield _sse_event({"detail": "Error al procesar el mensaje"}, event="error")
+        yield _sse_event({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _authenticate_socket(token: str) -> User:
+    """Usuario del token de una conexión WebSocket (con su propia sesión)"""
+    db = SessionLocal()
+    try:
+        return authenticate_token(token, db)
+    finally:
+        db.close()
+
+@router.websocket("/api/chat/ws")
+async def chat_websocket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Chatbot sobre WebSocket: se autentica una vez al conectar y la misma
+    conexión atiende muchos mensajes. Protocolo (JSON):
+      cliente -> {"message": "..."}
+      servidor -> {"type": "delta", "text": "..."} ... {"type": "done"}
+    Cada mensaje se cobra a la clase "chat" del control de admisión, como
+    una petición a /api/chat (el middleware no ve los mensajes del socket)
+    """
+    try:
+        # Puede consultar la base (usuario fuera de caché): en un hilo
+        current_user = await run_in_threadpool(_authenticate_socket, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    client = client_identity(websocket.scope)
+    await websocket.accept()
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            text = str(payload.get("message", "")).strip() if isinstance(payload, dict) else ""
+            if not text:
+                await websocket.send_json({"type": "error", "detail": "Mensaje vacío"})
+                continue
+            if RATE_LIMITING:
+                rejected = await admission.admit("chat", client)
+                if rejected is not None:
+                    wait, reason = rejected
+                    await websocket.send_json({"type": "error", "detail": rejection_detail(reason),
+                                               "retry_after": max(1, math.ceil(wait))})
+                    await websocket.send_json({"type": "done"})
+                    continue
+            try:
+                async for fragment in iterate_in_threadpool(_chat_fragments(text, current_user)):
+                    await websocket.send_json({"type": "delta", "text": fragment})
+            except Exception as e:
+                print(f"Error en WebSocket del chatbot: {type(e).__name__}: {e}")
+                await websocket.send_json({"type": "error", "detail": "Error al procesar el mensaje"})
+            finally:
+                if RATE_LIMITING:
+                    admission.release("chat")
+            await websocket.send_json({"type": "done"})
+    except WebSocketDisconnect:
+        pass
+
 # ==================== REPORTES ====================
 
-@app.get("/api/reports/orders")
+@router.get("/api/dashboard/stats", response_model=DashboardStats)
+def get_dashboard_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Estadísticas del dashboard en una sola respuesta (consultas agregadas, cacheadas unos segundos)"""
+    return dashboard_cache.get(db)
+
+@router.get("/api/reports/orders")
 def get_orders_report(
+    response: Response,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    background: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Generar reporte de pedidos"""
-    query = db.query(Order)
-    
+    """
+    Generar reporte de pedidos (background=true: 202 con la tarea)
+    La sesión de reportes se abre solo si se responde aquí: encolar la tarea
+    no lee la copia ni dispara su refresco
+    """
+    for value in (start_date, end_date):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Fecha inválida: {value}")
+    if background:
+        params = {"start_date": start_date, "end_date": end_date}
+        return _job_accepted(job_queue.submit(db, "orders_report", params, current_user.id))
+    with reporting_session(response) as report_db:
+        return _orders_report(report_db, start_date, end_date)
+
+def _orders_report(db: Session, start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """Reporte de pedidos agregado sobre las líneas de cada pedido"""
+    filters = []
     if start_date:
-        query = query.filter(Order.created_at >= datetime.fromisoformat(start_date))
+        filters.append(Order.created_at >= datetime.fromisoformat(start_date))
     if end_date:
-        query = query.filter(Order.created_at <= datetime.fromisoformat(end_date))
+        filters.append(Order.created_at <= datetime.fromisoformat(end_date))
     
-    orders = query.all()
+    line_total = OrderItem.final_price * OrderItem.quantity
+    rows = db.query(
+        Order.id,
+        Order.status,
+        Order.final_price,
+        Order.created_at,
+        func.count(OrderItem.id).label("items"),
+        func.min(Product.name).label("product_name"),
+        func.coalesce(func.sum(OrderItem.quantity), 0).label("quantity"),
+        func.sum(OrderItem.requested_price * OrderItem.quantity).label("total_requested"),
+        # NULL si alguna línea aún no tiene precio final
+        func.sum(line_total).label("total_final"),
+    ).outerjoin(OrderItem, OrderItem.order_id == Order.id).outerjoin(
+        Product, Product.id == OrderItem.product_id
+    ).filter(*filters).group_by(Order.id).order_by(Order.created_at).all()
     
     return {
-        "total_orders": len(orders),
-        "total_revenue": sum(o.final_price or 0 for o in orders),
-        "pending_orders": len([o for o in orders if o.status == "pending"]),
-        "approved_orders": len([o for o in orders if o.status == "approved"]),
+        "total_orders": len(rows),
+        "total_revenue": sum(row.total_final or 0 for row in rows if row.status == "approved"),
+        "pending_orders": len([row for row in rows if row.status == "pending"]),
+        "approved_orders": len([row for row in rows if row.status == "approved"]),
         "orders": [
             {
-                "id": o.id,
-                "product_name": o.product.name,
-                "quantity": o.quantity,
-                "final_price": o.final_price,
-                "status": o.status,
-                "created_at": o.created_at
+                "id": row.id,
+                "product_name": row.product_name if row.items == 1 else f"{row.items} productos",
+                "items": row.items,
+                "quantity": row.quantity,
+                "final_price": row.final_price,
+                "total_requested": row.total_requested,
+                "total_final": row.total_final,
+                "status": row.status,
+                "created_at": row.created_at
             }
-            for o in orders
+            for row in rows
         ]
     }
 
-@app.get("/api/reports/margins")
+@router.get("/api/reports/margins")
 def get_margins_report(
+    response: Response,
+    start_month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    end_month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    top: int = Query(5, ge=1, le=50),
+    background: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Generar reporte de márgenes"""
-    orders = db.query(Order).filter(Order.status == "approved").all()
-    
-    margins = []
-    for order in orders:
-        if order.final_price and order.product.price:
-            cost = order.product.price * order.quantity
-            revenue = order.final_price * order.quantity
-            margin = ((revenue - cost) / revenue) * 100 if revenue > 0 else 0
-            margins.append({
-                "order_id": order.id,
-                "product_name": order.product.name,
-                "cost": cost,
-                "revenue": revenue,
-                "margin_percent": margin
-            })
-    
-    return {
-        "total_margin": sum(m["revenue"] - m["cost"] for m in margins),
-        "avg_margin_percent": sum(m["margin_percent"] for m in margins) / len(margins) if margins else 0,
-        "margins": margins
-    }
+    """
+    Márgenes de los pedidos aprobados (meses "YYYY-MM", inclusive): totales,
+    serie mensual y los `top` productos de mayor y menor margen.
+    Se leen de los agregados que se actualizan al aprobar (background=true: 202 con la tarea)
+    """
+    if background:
+        params = {"start_month": start_month, "end_month": end_month, "top": top}
+        return _job_accepted(job_queue.submit(db, "margins_report", params, current_user.id))
+    with reporting_session(response) as report_db:
+        return margins.summary(report_db, start_month, end_month, top)
+
+@router.get("/api/reports/margins/{dimension}")
+def get_margins_ranking(
+    dimension: str,
+    order: str = Query("top", pattern="^(top|bottom)$"),
+    by: str = Query("percent", pattern="^(percent|amount)$"),
+    limit: int = Query(10, ge=1, le=100),
+    start_month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    end_month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    db: Session = Depends(get_reporting_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Mejores (top) o peores (bottom) por margen: product, category, salesperson o month"""
+    if dimension not in margins.DIMENSIONS + ("month",):
+        raise HTTPException(status_code=404, detail="Dimensión inválida (use product, category, salesperson o month)")
+    return margins.ranking(db, dimension, worst=order == "bottom", by=by, limit=limit,
+                           start_month=start_month, end_month=end_month)
+
+@router.get("/api/reports/status")
+def get_reporting_status(current_user: User = Depends(get_current_user)):
+    """Origen de los datos de los reportes y antigüedad de la copia vigente"""
+    return reporting.stats()
+
+# ==================== TAREAS EN SEGUNDO PLANO ====================
+
+def _job_accepted(job: Job) -> JSONResponse:
+    """Respuesta 202 de una operación encolada; el estado se consulta en Location"""
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(job_payload(job)),
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
+
+def _job_user(db: Session, job: RunningJob) -> User:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    if user is None:
+        raise JobError("El usuario que encoló la tarea ya no existe")
+    return user
+
+@job_queue.handler("suggest")
+def _run_suggest_job(db: Session, job: RunningJob) -> dict:
+    product = db.query(Product).filter(Product.id == job.params["product_id"]).first()
+    if product is None:
+        raise JobError("Producto no encontrado")
+    job.report(0, 1, "Consultando precios de mercado", force=True)
+    return _suggest_price(db, product, _job_user(db, job))
+
+@job_queue.handler("reprice")
+def _run_reprice_job(db: Session, job: RunningJob) -> dict:
+    product_ids = job.params["product_ids"]
+    products = db.query(Product).filter(Product.id.in_(product_ids)).order_by(Product.id).all()
+    return _reprice(db, products, _job_user(db, job), job)
+
+@job_queue.handler("archive")
+def _run_archive_job(db: Session, job: RunningJob) -> dict:
+    job.report(0, 1, "Archivando comparaciones y alertas", force=True)
+    return archive_old_rows(db)
+
+@job_queue.handler("orders_report")
+def _run_orders_report_job(db: Session, job: RunningJob) -> dict:
+    with reporting.session() as report_db:
+        return _orders_report(report_db, job.params.get("start_date"), job.params.get("end_date"))
+
+@job_queue.handler("margins_report")
+def _run_margins_report_job(db: Session, job: RunningJob) -> dict:
+    with reporting.session() as report_db:
+        return margins.summary(report_db, job.params.get("start_month"), job.params.get("end_month"),
+                               job.params.get("top", 5))
 
-# Montar directorio estático para servir imágenes (al final, después de todas las rutas)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+def _get_own_job(db: Session, job_id: int, current_user: User) -> Job:
+    """Tarea del usuario (los administradores ven todas)"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if job is None or (job.user_id != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
+    return job
+
+@router.get("/api/jobs", response_model=List[JobResponse])
+def get_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Tareas del usuario, las más recientes primero"""
+    query = db.query(Job).filter(Job.user_id == current_user.id)
+    if status:
+        query = query.filter(Job.status == status)
+    return [job_payload(job) for job in query.order_by(Job.id.desc()).limit(limit).all()]
+
+@router.get("/api/jobs/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Estado, avance y (al terminar) resultado de una tarea"""
+    return job_payload(_get_own_job(db, job_id, current_user))
+
+@router.post("/api/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cancelar una tarea que todavía no empezó (409 si ya está en curso o terminó)"""
+    job = _get_own_job(db, job_id, current_user)
+    if not job_queue.cancel(db, job.id):
+        raise HTTPException(status_code=409, detail="La tarea ya empezó o terminó")
+    db.refresh(job)
+    return job_payload(job)
+
+# ==================== AUDITORÍA ====================
+
+@router.get("/api/audit", response_model=List[AuditEventResponse])
+def get_audit_events(
+    action: Optional[str] = None,
+    entity: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Eventos de auditoría, los más recientes primero (solo administradores)
+    Los eventos llegan a la tabla en lotes: pueden tardar hasta
+    MOBICORP_AUDIT_FLUSH_SECONDS en aparecer. Paginación con before_id
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Solo los administradores pueden ver la auditoría")
+    query = db.query(AuditEvent)
+    if action:
+        query = query.filter(AuditEvent.action == action)
+    if entity:
+        query = query.filter(AuditEvent.entity == entity)
+    if entity_id is not None:
+        query = query.filter(AuditEvent.entity_id == entity_id)
+    if user_id is not None:
+        query = query.filter(AuditEvent.user_id == user_id)
+    if before_id is not None:
+        query = query.filter(AuditEvent.id < before_id)
+    return [event_payload(audit_event) for audit_event in query.order_by(AuditEvent.id.desc()).limit(limit)]
+
+@router.get("/api/audit/status")
+def get_audit_status(current_user: User = Depends(get_current_user)):
+    """Eventos pendientes, escritos, descartados y recuperados del diario"""
+    return audit_log.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics(request: Request):
+    """Métricas de peticiones y SQL en formato de texto Prometheus"""
+    client_host = request.client.host if request.client else None
+    if not metrics_allowed(client_host, request.headers.get("authorization")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No autorizado para ver las métricas")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/metrics/slow-queries")
+def get_slow_queries(current_user: User = Depends(get_current_user)):
+    """Últimas consultas SQL que superaron el umbral de lentitud"""
+    return list(metrics.slow_queries)
+
+# ==================== APLICACIÓN ====================
+
+def _preload_services() -> None:
+    """Construir los servicios diferidos (hilo aparte, el worker ya atiende)"""
+    try:
+        for service in (pricing_engine, price_scraper, chatbot):
+            service.get()
+    except Exception as e:
+        print(f"Error al precargar servicios: {type(e).__name__}: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque: tablas, directorio de imágenes, escucha del estado compartido,
+    copia para reportes, auditoría y workers de tareas; cierre: lo mismo en orden inverso
+    """
+    Base.metadata.create_all(bind=engine)
+    image_store.directory.mkdir(parents=True, exist_ok=True)
+    shared_state.start()
+    reporting.start()
+    audit_log.start()
+    job_queue.start()
+    if PRELOAD_SERVICES:
+        asyncio.get_running_loop().run_in_executor(None, _preload_services)
+    yield
+    job_queue.close()
+    audit_log.close()
+    reporting.close()
+    shared_state.close()
+    engine.dispose()
+
+def create_app() -> FastAPI:
+    """Crear la app con sus middlewares y rutas"""
+    app = FastAPI(
+        title="MobiCorp - Sistema de Gestión de Muebles y Mobiliario",
+        description="Sistema especializado en la gestión de ventas de muebles y mobiliario de oficina (sillas ejecutivas, escritorios, mesas, etc.)",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+    # Control de admisión (429 + Retry-After); dentro de CORS para que el
+    # navegador pueda leer las respuestas rechazadas
+    if RATE_LIMITING:
+        app.add_middleware(AdmissionMiddleware, controller=admission)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origin_regex=r"https://.*\.vercel\.app",
+        allow_origins=allowed_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # Con credenciales "*" no cubre estos encabezados: se nombran explícitamente
+        expose_headers=["*", "ETag", "Retry-After"],
+    )
+
+    # Perfilado por petición (tiempos por fase, conteo de SQL, cabecera Server-Timing)
+    app.add_middleware(ProfilingMiddleware)
+    install_sql_instrumentation(engine)
+
+    app.include_router(router)
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import uvicorn
+
+    # Workers: MOBICORP_WORKERS=4 (o "auto" = uno por núcleo)
+    workers_setting = os.getenv("MOBICORP_WORKERS", "1")
+    workers = (os.cpu_count() or 1) if workers_setting == "auto" else int(workers_setting)
+    if workers <= 1:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
+    else:
+        if not shared_state.shared:
+            raise SystemExit(
+                "MOBICORP_WORKERS > 1 requiere estado compartido (MOBICORP_STATE_URL=redis://...): "
+                "con el backend en memoria cada worker tendría sus propias cachés y alertas"
+            )
+        # Crear las tablas una vez antes de lanzar los workers (evita que compitan en el DDL)
+        Base.metadata.create_all(bind=engine)
+        print(f"Iniciando {workers} workers (estado compartido: {shared_state.name})")
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
 
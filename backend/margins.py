@@ -0,0 +1,235 @@
+"""
+Análisis de márgenes precalculado
+
+Al aprobar un pedido se congela el costo unitario de cada línea
+(order_items.unit_cost = precio base del producto en ese momento) y se suman
+su costo e ingreso a margin_rollups, por mes de aprobación y por producto,
+categoría, vendedor (quien creó el pedido) y total. Los reportes leen esos
+agregados (productos x meses filas como mucho) sin recorrer los pedidos.
+
+- Ingreso = precio final x cantidad; costo = costo unitario x cantidad;
+  margen % = (ingreso - costo) / ingreso, ponderado por ingreso al agrupar.
+- Las líneas de productos sin precio base no tienen costo: su ingreso se
+  acumula aparte (uncosted_revenue) y no entra en el margen.
+- Reaprobar (con otro precio) o rechazar un pedido aprobado resta primero
+  su aporte anterior (retract_orders) y, si corresponde, suma el nuevo
+  (record_orders). Todo en la transacción del llamador: ninguna función
+  hace commit salvo rebuild_rollups.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import String, case, cast, func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import MarginRollup, Order, OrderItem, Product, User
+
+TOTAL = "total"
+DIMENSIONS = ("product", "category", "salesperson")
+UNCATEGORIZED = "Sin categoría"
+MEASURES = ("lines", "quantity", "revenue", "cost", "uncosted_revenue")
+
+
+def _month(column):
+    return func.strftime("%Y-%m", column)
+
+
+def _aggregate(db: Session, order_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """Aportes de los pedidos aprobados indicados (todos si order_ids es None), por dimensión y mes"""
+    line_revenue = OrderItem.final_price * OrderItem.quantity
+    costed = OrderItem.unit_cost.isnot(None)
+    keys = {
+        "product": cast(OrderItem.product_id, String),
+        "category": func.coalesce(Product.category, UNCATEGORIZED),
+        "salesperson": cast(Order.user_id, String),
+        TOTAL: literal(""),
+    }
+    month = _month(Order.approved_at)
+    rows = []
+    for dimension, key in keys.items():
+        query = (
+            select(
+                key.label("key"),
+                month.label("month"),
+                func.count(OrderItem.id).label("lines"),
+                func.coalesce(func.sum(OrderItem.quantity), 0).label("quantity"),
+                func.coalesce(func.sum(case((costed, line_revenue), else_=0.0)), 0.0).label("revenue"),
+                func.coalesce(func.sum(OrderItem.unit_cost * OrderItem.quantity), 0.0).label("cost"),
+                func.coalesce(func.sum(case((costed, 0.0), else_=line_revenue)), 0.0).label("uncosted_revenue"),
+            )
+            .select_from(OrderItem)
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(Order.status == "approved", OrderItem.final_price.isnot(None))
+            .group_by(key, month)
+        )
+        if order_ids is not None:
+            query = query.where(Order.id.in_(list(order_ids)))
+        rows.extend({"dimension": dimension, **row._mapping} for row in db.execute(query))
+    return rows
+
+
+def _apply(db: Session, rows: List[Dict], sign: int) -> None:
+    """Sumar (sign=1) o restar (sign=-1) aportes a los agregados"""
+    if not rows:
+        return
+    statement = insert(MarginRollup)
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["dimension", "key", "month"],
+            set_={measure: getattr(MarginRollup, measure) + getattr(excluded, measure) for measure in MEASURES},
+        ),
+        [{**row, **{measure: row[measure] * sign for measure in MEASURES}} for row in rows],
+    )
+
+
+def record_orders(db: Session, order_ids: Iterable[int]) -> None:
+    """
+    Congelar el costo unitario de las líneas y sumar los pedidos a los
+    agregados. Llamar después de marcarlos aprobados
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    db.execute(
+        update(OrderItem)
+        .where(OrderItem.order_id.in_(order_ids))
+        .values(unit_cost=select(Product.price).where(Product.id == OrderItem.product_id).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+    _apply(db, _aggregate(db, order_ids), 1)
+
+
+def retract_orders(db: Session, order_ids: Iterable[int]) -> None:
+    """
+    Restar de los agregados los pedidos que estén aprobados. Llamar antes de
+    cambiarles el estado o el precio (los que no estén aprobados se ignoran)
+    """
+    order_ids = list(order_ids)
+    if order_ids:
+        _apply(db, _aggregate(db, order_ids), -1)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recalcular todos los agregados desde los pedidos aprobados (siembra de
+    datos, migración o reparación). Las líneas aprobadas sin costo congelado
+    toman el precio base actual del producto. Hace commit
+    """
+    db.execute(
+        update(OrderItem)
+        .where(
+            OrderItem.unit_cost.is_(None),
+            OrderItem.final_price.isnot(None),
+            OrderItem.order_id.in_(select(Order.id).where(Order.status == "approved")),
+        )
+        .values(unit_cost=select(Product.price).where(Product.id == OrderItem.product_id).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+    db.query(MarginRollup).delete(synchronize_session=False)
+    rows = _aggregate(db)
+    _apply(db, rows, 1)
+    db.commit()
+    return len(rows)
+
+
+# ==================== CONSULTAS ====================
+
+def _margin(revenue: float, cost: float) -> Tuple[float, float]:
+    margin = revenue - cost
+    return round(margin, 2), round(margin / revenue * 100, 2) if revenue else 0.0
+
+
+def _range(query, start_month: Optional[str], end_month: Optional[str]):
+    if start_month:
+        query = query.where(MarginRollup.month >= start_month)
+    if end_month:
+        query = query.where(MarginRollup.month <= end_month)
+    return query
+
+
+def _sums():
+    return (
+        func.sum(MarginRollup.lines).label("lines"),
+        func.sum(MarginRollup.quantity).label("quantity"),
+        func.sum(MarginRollup.revenue).label("revenue"),
+        func.sum(MarginRollup.cost).label("cost"),
+        func.sum(MarginRollup.uncosted_revenue).label("uncosted_revenue"),
+    )
+
+
+def _entry(row, **extra) -> Dict:
+    margin, margin_percent = _margin(row.revenue or 0.0, row.cost or 0.0)
+    return {
+        **extra,
+        "lines": row.lines or 0,
+        "quantity": row.quantity or 0,
+        "revenue": round(row.revenue or 0.0, 2),
+        "cost": round(row.cost or 0.0, 2),
+        "margin": margin,
+        "margin_percent": margin_percent,
+        "uncosted_revenue": round(row.uncosted_revenue or 0.0, 2),
+    }
+
+
+def _labels(db: Session, dimension: str, keys: List[str]) -> Dict[str, str]:
+    """Nombres legibles de las claves (productos y vendedores se guardan por ID)"""
+    ids = [int(key) for key in keys if key.isdigit()]
+    if dimension == "product" and ids:
+        return {str(id_): name for id_, name in db.query(Product.id, Product.name).filter(Product.id.in_(ids))}
+    if dimension == "salesperson" and ids:
+        return {
+            str(id_): full_name or email
+            for id_, full_name, email in db.query(User.id, User.full_name, User.email).filter(User.id.in_(ids))
+        }
+    return {key: key for key in keys}
+
+
+def ranking(db: Session, dimension: str, worst: bool = False, by: str = "percent", limit: int = 10,
+            start_month: Optional[str] = None, end_month: Optional[str] = None) -> List[Dict]:
+    """
+    Los `limit` mejores (o peores) por margen porcentual o absoluto. La
+    dimensión "month" ordena los meses; las demás agrupan sus claves en el rango
+    """
+    column = MarginRollup.month if dimension == "month" else MarginRollup.key
+    stored = TOTAL if dimension == "month" else dimension
+    revenue, cost = func.sum(MarginRollup.revenue), func.sum(MarginRollup.cost)
+    score = (revenue - cost) / revenue if by == "percent" else revenue - cost
+    query = _range(
+        select(column.label("key"), *_sums()).where(MarginRollup.dimension == stored),
+        start_month, end_month,
+    ).group_by(column).having(revenue > 0).order_by(score if worst else score.desc(), column).limit(limit)
+    rows = db.execute(query).all()
+    labels = _labels(db, dimension, [row.key for row in rows])
+    return [_entry(row, key=row.key, name=labels.get(row.key, row.key)) for row in rows]
+
+
+def summary(db: Session, start_month: Optional[str] = None, end_month: Optional[str] = None,
+            top: int = 5) -> Dict:
+    """Totales, serie mensual y mejores/peores productos del rango"""
+    months = db.execute(
+        _range(select(MarginRollup.month, *_sums()).where(MarginRollup.dimension == TOTAL), start_month, end_month)
+        .group_by(MarginRollup.month)
+        .order_by(MarginRollup.month)
+    ).all()
+    totals = defaultdict(float)
+    for row in months:
+        for measure in MEASURES:
+            totals[measure] += getattr(row, measure) or 0
+    margin, margin_percent = _margin(totals["revenue"], totals["cost"])
+    return {
+        "total_revenue": round(totals["revenue"] + totals["uncosted_revenue"], 2),
+        "costed_revenue": round(totals["revenue"], 2),
+        "total_cost": round(totals["cost"], 2),
+        "total_margin": margin,
+        # Ponderado por ingreso (no el promedio simple de los porcentajes por línea)
+        "avg_margin_percent": margin_percent,
+        "uncosted_revenue": round(totals["uncosted_revenue"], 2),
+        "lines": int(totals["lines"]),
+        "by_month": [_entry(row, month=row.month) for row in months],
+        "top_products": ranking(db, "product", limit=top, start_month=start_month, end_month=end_month),
+        "bottom_products": ranking(db, "product", worst=True, limit=top, start_month=start_month,
+                                   end_month=end_month),
+    }
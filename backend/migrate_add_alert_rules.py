@@ -0,0 +1,50 @@
+"""
+Script de migración para el motor de alertas de precio
+
+- Crea la tabla alert_rules (umbrales por producto o categoría)
+- Agrega la columna threshold_percent a price_alerts
+- Indexa price_alerts por producto y fecha (deduplicación de alertas)
+"""
+import sqlite3
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+# Conectar a la base de datos
+conn = sqlite3.connect(str(db_path))
+cursor = conn.cursor()
+
+try:
+    cursor.execute("PRAGMA table_info(price_alerts)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'threshold_percent' in columns:
+        print("La columna 'threshold_percent' ya existe en la tabla 'price_alerts'.")
+    else:
+        print("Agregando columna 'threshold_percent' a la tabla 'price_alerts'...")
+        cursor.execute("ALTER TABLE price_alerts ADD COLUMN threshold_percent FLOAT")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_price_alerts_product_id ON price_alerts (product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_price_alerts_created_at ON price_alerts (created_at)")
+    conn.commit()
+    print("[OK] Columnas e índices de 'price_alerts' actualizados.")
+except sqlite3.Error as e:
+    print(f"Error al migrar la base de datos: {e}")
+    conn.rollback()
+    conn.close()
+    exit(1)
+finally:
+    conn.close()
+
+# Crear la tabla alert_rules
+from database import engine, Base
+import models  # noqa: F401 - registra los modelos en Base.metadata
+
+Base.metadata.create_all(bind=engine)
+
+print("\nMigración completada!")
@@ -0,0 +1,35 @@
+"""
+Script de migración para el archivo de comparaciones y alertas
+
+- Crea las tablas price_comparisons_archive y price_alerts_archive
+- Crea el índice (product_id, created_at) de price_comparisons
+- Las filas viejas se archivan por lotes después de la siguiente consulta
+  de mercado (ver archive.py); con --now se archivan aquí mismo
+"""
+import sys
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+from database import SessionLocal, engine, Base
+from models import PriceComparison, PriceComparisonArchive, PriceAlertArchive
+from archive import archive_old_rows
+
+Base.metadata.create_all(bind=engine, tables=[PriceComparisonArchive.__table__, PriceAlertArchive.__table__])
+for index in PriceComparison.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+print("[OK] Tablas de archivo e índices listos.")
+
+if "--now" in sys.argv:
+    db = SessionLocal()
+    try:
+        print(f"[OK] Filas archivadas: {archive_old_rows(db)}")
+    finally:
+        db.close()
+
+print("\nMigración completada!")
@@ -0,0 +1,22 @@
+"""
+Script de migración para el registro de auditoría
+
+- Crea la tabla audit_events y, en SQLite, los triggers que rechazan
+  UPDATE y DELETE (ver models.py)
+"""
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+from database import engine, Base
+from models import AuditEvent
+
+Base.metadata.create_all(bind=engine, tables=[AuditEvent.__table__])
+print("[OK] Tabla 'audit_events' lista.")
+
+print("\nMigración completada!")
@@ -0,0 +1,58 @@
+"""
+Script de migración para normalizar categorías de productos
+
+- Crea la tabla categories
+- Agrega la columna category_id a products e indexa category/category_id
+- Reconstruye el árbol de categorías y sus contadores de productos
+"""
+import sqlite3
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+# Conectar a la base de datos
+conn = sqlite3.connect(str(db_path))
+cursor = conn.cursor()
+
+try:
+    cursor.execute("PRAGMA table_info(products)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'category_id' in columns:
+        print("La columna 'category_id' ya existe en la tabla 'products'.")
+    else:
+        print("Agregando columna 'category_id' a la tabla 'products'...")
+        cursor.execute("ALTER TABLE products ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_products_category ON products (category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)")
+    conn.commit()
+    print("[OK] Columnas e índices de 'products' actualizados.")
+except sqlite3.Error as e:
+    print(f"Error al migrar la base de datos: {e}")
+    conn.rollback()
+    conn.close()
+    exit(1)
+finally:
+    conn.close()
+
+# Crear la tabla categories y poblarla desde products.category
+from database import SessionLocal, engine, Base
+import models  # noqa: F401 - registra los modelos en Base.metadata
+from categories import rebuild_categories
+
+Base.metadata.create_all(bind=engine)
+
+db = SessionLocal()
+try:
+    total = rebuild_categories(db)
+    print(f"[OK] {total} categorías normalizadas.")
+finally:
+    db.close()
+
+print("\nMigración completada!")
@@ -0,0 +1,56 @@
+"""
+Script de migración para el análisis de márgenes precalculado
+
+- Agrega la columna unit_cost a order_items (costo congelado al aprobar)
+- Crea la tabla margin_rollups
+- Completa el costo de las líneas ya aprobadas con el precio base actual
+  del producto y calcula los agregados desde los pedidos aprobados
+"""
+import sqlite3
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+# Conectar a la base de datos
+conn = sqlite3.connect(str(db_path))
+cursor = conn.cursor()
+
+try:
+    cursor.execute("PRAGMA table_info(order_items)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'unit_cost' in columns:
+        print("La columna 'unit_cost' ya existe en la tabla 'order_items'.")
+    else:
+        print("Agregando columna 'unit_cost' a la tabla 'order_items'...")
+        cursor.execute("ALTER TABLE order_items ADD COLUMN unit_cost FLOAT")
+        conn.commit()
+        print("[OK] Columna 'unit_cost' agregada.")
+except sqlite3.Error as e:
+    print(f"Error al migrar la base de datos: {e}")
+    conn.rollback()
+    conn.close()
+    exit(1)
+finally:
+    conn.close()
+
+# Crear la tabla margin_rollups y calcular los agregados
+from database import SessionLocal, engine, Base
+import models  # noqa: F401 - registra los modelos en Base.metadata
+from margins import rebuild_rollups
+
+Base.metadata.create_all(bind=engine)
+
+db = SessionLocal()
+try:
+    rows = rebuild_rollups(db)
+    print(f"[OK] {rows} agregados de márgenes calculados.")
+finally:
+    db.close()
+
+print("\nMigración completada!")
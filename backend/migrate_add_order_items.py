@@ -0,0 +1,46 @@
+"""
+Script de migración para pedidos con varias líneas
+
+- Crea la tabla order_items
+- Copia cada pedido existente (product_id/quantity/precios) como su única línea
+"""
+import sqlite3
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+# Crear la tabla order_items
+from database import engine, Base
+import models  # noqa: F401 - registra los modelos en Base.metadata
+
+Base.metadata.create_all(bind=engine)
+
+# Conectar a la base de datos
+conn = sqlite3.connect(str(db_path))
+cursor = conn.cursor()
+
+try:
+    print("Copiando pedidos existentes a 'order_items'...")
+    cursor.execute("""
+        INSERT INTO order_items (order_id, product_id, quantity, requested_price, final_price)
+        SELECT o.id, o.product_id, o.quantity, o.requested_price, o.final_price
+        FROM orders o
+        WHERE o.product_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM order_items i WHERE i.order_id = o.id)
+    """)
+    conn.commit()
+    print(f"[OK] {cursor.rowcount} pedidos migrados a líneas de pedido.")
+except sqlite3.Error as e:
+    print(f"Error al migrar la base de datos: {e}")
+    conn.rollback()
+    conn.close()
+    exit(1)
+finally:
+    conn.close()
+
+print("\nMigración completada!")
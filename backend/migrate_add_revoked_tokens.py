@@ -0,0 +1,23 @@
+"""
+Script de migración para la revocación de tokens
+
+- Crea la tabla revoked_tokens (ver tokens.py)
+- Los tokens emitidos antes de actualizar no tienen ID de clave y dejan de
+  valer: los usuarios deben iniciar sesión otra vez
+"""
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+from database import engine, Base
+from models import RevokedToken
+
+Base.metadata.create_all(bind=engine, tables=[RevokedToken.__table__])
+print("[OK] Tabla 'revoked_tokens' lista.")
+
+print("\nMigración completada!")
@@ -0,0 +1,38 @@
+"""
+Script de migración para agregar la columna stock_reserved a la tabla orders
+Los pedidos existentes quedan con stock_reserved = 0: se crearon antes de la
+reserva de inventario y rechazarlos no debe devolver stock que nunca se descontó.
+"""
+import sqlite3
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+# Conectar a la base de datos
+conn = sqlite3.connect(str(db_path))
+cursor = conn.cursor()
+
+try:
+    cursor.execute("PRAGMA table_info(orders)")
+    columns = [column[1] for column in cursor.fetchall()]
+    
+    if 'stock_reserved' in columns:
+        print("La columna 'stock_reserved' ya existe en la tabla 'orders'.")
+    else:
+        print("Agregando columna 'stock_reserved' a la tabla 'orders'...")
+        cursor.execute("ALTER TABLE orders ADD COLUMN stock_reserved BOOLEAN DEFAULT 0")
+        conn.commit()
+        print("[OK] Columna 'stock_reserved' agregada exitosamente.")
+    
+except sqlite3.Error as e:
+    print(f"Error al migrar la base de datos: {e}")
+    conn.rollback()
+finally:
+    conn.close()
+
+print("\nMigración completada!")
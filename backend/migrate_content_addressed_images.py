@@ -0,0 +1,59 @@
+"""
+Script de migración de imágenes a nombres por contenido
+
+- Copia cada imagen con nombre anterior (fecha_producto.ext) a
+  <hash>.<ext> (ver images.py) y actualiza products.image_url
+- Las imágenes repetidas quedan en un solo archivo
+- Borra los archivos anteriores una vez actualizados los productos
+- Los archivos que no son una imagen admitida se dejan como están (se
+  listan; ya no se sirven)
+
+Correr con el servidor detenido (las cachés de productos no se enteran).
+"""
+from pathlib import Path
+
+# Ruta a la base de datos
+db_path = Path("mobicorp.db")
+
+if not db_path.exists():
+    print("La base de datos no existe. Se creará automáticamente al iniciar el servidor.")
+    exit(0)
+
+from database import SessionLocal
+from images import HASHED_NAME, IMAGE_URL_PREFIX, ImageError, ImageStore
+from models import Product
+
+store = ImageStore()
+db = SessionLocal()
+migrated = {}  # nombre anterior -> URL nueva
+try:
+    products = db.query(Product).filter(Product.image_url.like(f"{IMAGE_URL_PREFIX}%")).all()
+    updated = 0
+    for product in products:
+        name = product.image_url[len(IMAGE_URL_PREFIX):]
+        if HASHED_NAME.match(name):
+            continue
+        if name not in migrated:
+            path = store.directory / name
+            if not path.is_file():
+                print(f"[!] Producto {product.id}: no existe {path}")
+                continue
+            try:
+                with open(path, "rb") as source:
+                    migrated[name], _ = store.save(source)
+            except ImageError as e:
+                print(f"[!] Producto {product.id}: {path} no se migra ({e.detail})")
+                continue
+        product.image_url = migrated[name]
+        updated += 1
+    db.commit()
+    print(f"[OK] Productos actualizados: {updated}")
+finally:
+    db.close()
+
+for name in migrated:
+    (store.directory / name).unlink(missing_ok=True)
+files = len(set(migrated.values()))
+print(f"[OK] Imágenes migradas: {len(migrated)} (quedan {files} archivos; {len(migrated) - files} repetidas)")
+
+print("\nMigración completada!")
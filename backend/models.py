@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index, UniqueConstraint
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from database import Base
@@ -17,12 +18,27 @@ class User(Base):
     orders = relationship("Order", back_populates="user")
     price_comparisons = relationship("PriceComparison", back_populates="user")
 
+class Category(Base):
+    __tablename__ = "categories"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)  # Último nivel, ej. "Ejecutiva"
+    path = Column(String, unique=True, index=True)  # Ruta completa, ej. "Asientos - Ejecutiva"
+    parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
+    depth = Column(Integer, default=0)
+    product_count = Column(Integer, default=0)  # Productos en esta categoría y sus subcategorías
+    
+    parent = relationship("Category", remote_side=[id], back_populates="children")
+    children = relationship("Category", back_populates="parent")
+    products = relationship("Product", back_populates="category_ref")
+
 class Product(Base):
     __tablename__ = "products"
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    category = Column(String)
+    category = Column(String, index=True)  # Ruta de categoría en texto (compatibilidad)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=True)  # Precio base/costo (opcional)
     stock = Column(Integer, default=0)
@@ -30,7 +46,9 @@ class Product(Base):
     image_url = Column(String, nullable=True)  # URL o ruta de la imagen
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
+    category_ref = relationship("Category", back_populates="products")
     orders = relationship("Order", back_populates="product")
+    order_items = relationship("OrderItem", back_populates="product")
     price_comparisons = relationship("PriceComparison", back_populates="product")
     price_alerts = relationship("PriceAlert", back_populates="product")
 
@@ -38,20 +56,56 @@ class Order(Base):
     __tablename__ = "orders"
     
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
-    quantity = Column(Integer)
-    requested_price = Column(Float)  # Precio solicitado por el cliente
-    final_price = Column(Float, nullable=True)  # Precio final aprobado
+    # Resumen de compatibilidad: solo se llenan en pedidos de una línea (las
+    # líneas reales están en order_items)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    quantity = Column(Integer, nullable=True)
+    requested_price = Column(Float, nullable=True)  # Precio unitario solicitado por el cliente
+    final_price = Column(Float, nullable=True)  # Precio unitario final aprobado
     status = Column(String, default="pending")  # pending, approved, rejected
+    stock_reserved = Column(Boolean, default=False)  # True mientras el pedido retiene stock
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     approved_at = Column(DateTime, nullable=True)
     
     product = relationship("Product", back_populates="orders")
     user = relationship("User", back_populates="orders")
+    items = relationship(
+        "OrderItem", back_populates="order", cascade="all, delete-orphan", order_by="OrderItem.id"
+    )
+    
+    @property
+    def total_requested(self) -> float:
+        """Monto solicitado del pedido (suma de sus líneas)"""
+        return sum(item.requested_price * item.quantity for item in self.items)
+    
+    @property
+    def total_final(self):
+        """Monto final aprobado; None mientras alguna línea no tenga precio final"""
+        if not self.items or any(item.final_price is None for item in self.items):
+            return None
+        return sum(item.final_price * item.quantity for item in self.items)
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+    quantity = Column(Integer)
+    requested_price = Column(Float)  # Precio unitario solicitado
+    final_price = Column(Float, nullable=True)  # Precio unitario aprobado
+    unit_cost = Column(Float, nullable=True)  # Costo unitario congelado al aprobar (precio base del producto)
+    
+    order = relationship("Order", back_populates="items")
+    product = relationship("Product", back_populates="order_items")
 
 class PriceComparison(Base):
     __tablename__ = "price_comparisons"
+    __table_args__ = (
+        # Última comparación de un producto sin ordenar la tabla
+        Index("ix_price_comparisons_product_created", "product_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
@@ -70,11 +124,176 @@ class PriceAlert(Base):
     __tablename__ = "price_alerts"
     
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     old_price = Column(Float)
     new_price = Column(Float)
     variation_percent = Column(Float)  # Porcentaje de variación
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    threshold_percent = Column(Float, nullable=True)  # Umbral que disparó la alerta
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     
     product = relationship("Product", back_populates="price_alerts")
 
+class PriceComparisonArchive(Base):
+    """Comparación archivada: mismas columnas e ID que en price_comparisons (ver archive.py)"""
+    __tablename__ = "price_comparisons_archive"
+    __table_args__ = (
+        Index("ix_price_comparisons_archive_product_created", "product_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    min_price = Column(Float)
+    max_price = Column(Float)
+    avg_price = Column(Float)
+    suggested_price = Column(Float)
+    source_count = Column(Integer)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, index=True)
+    archived_at = Column(DateTime)
+    
+    product = relationship("Product")
+
+class PriceAlertArchive(Base):
+    """Alerta archivada: mismas columnas e ID que en price_alerts (ver archive.py)"""
+    __tablename__ = "price_alerts_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+    old_price = Column(Float)
+    new_price = Column(Float)
+    variation_percent = Column(Float)
+    threshold_percent = Column(Float, nullable=True)
+    created_at = Column(DateTime, index=True)
+    archived_at = Column(DateTime)
+    
+    product = relationship("Product")
+
+class AlertRule(Base):
+    """Umbral de alerta de precio para un producto o una categoría (incluye subcategorías)"""
+    __tablename__ = "alert_rules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True, unique=True)
+    category = Column(String, nullable=True, unique=True)  # Ruta de categoría, ej. "Asientos"
+    threshold_percent = Column(Float)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    product = relationship("Product")
+
+
+class PriceSource(Base):
+    __tablename__ = "price_sources"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True)  # Tienda o marketplace, ej. "Agimex"
+
+class PriceObservation(Base):
+    """Precio observado en una fuente (solo se agrega, nunca se modifica)"""
+    __tablename__ = "price_observations"
+    __table_args__ = (
+        Index("ix_price_observations_product_time", "product_id", "observed_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    source_id = Column(Integer, ForeignKey("price_sources.id"))
+    price = Column(Float)
+    observed_at = Column(Integer, index=True)  # Epoch en segundos (UTC)
+
+class PriceRollup(Base):
+    """Agregado de observaciones por intervalo (hour, day, week)"""
+    __tablename__ = "price_rollups"
+    __table_args__ = (
+        UniqueConstraint("product_id", "resolution", "source_id", "bucket_start", name="uq_price_rollups_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    resolution = Column(String)  # hour, day, week
+    source_id = Column(Integer, default=0)  # 0 = todas las fuentes
+    bucket_start = Column(Integer, index=True)  # Epoch en segundos del inicio del intervalo
+    observations = Column(Integer)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    sum_price = Column(Float)
+
+class MarginRollup(Base):
+    """Costo e ingreso de los pedidos aprobados por dimensión y mes (ver margins.py)"""
+    __tablename__ = "margin_rollups"
+    __table_args__ = (
+        UniqueConstraint("dimension", "key", "month", name="uq_margin_rollups_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    dimension = Column(String)  # product, category, salesperson, total
+    key = Column(String)  # ID de producto o vendedor, ruta de categoría ("" en total)
+    month = Column(String, index=True)  # Mes de aprobación, "YYYY-MM"
+    lines = Column(Integer, default=0)
+    quantity = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)  # Ingreso de las líneas con costo
+    cost = Column(Float, default=0.0)
+    uncosted_revenue = Column(Float, default=0.0)  # Ingreso de líneas sin costo conocido
+
+class AuditEvent(Base):
+    """Evento de auditoría (solo se agrega; ver audit.py)"""
+    __tablename__ = "audit_events"
+    __table_args__ = (
+        Index("ix_audit_events_entity", "entity", "entity_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String, unique=True)  # UUID: reaplicar el diario no duplica eventos
+    action = Column(String, index=True)  # create_order, approve_order, create_product, suggest_price...
+    user_id = Column(Integer, nullable=True, index=True)
+    entity = Column(String, nullable=True)  # order, product
+    entity_id = Column(Integer, nullable=True)
+    details = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, index=True)  # Momento de la acción (no el de la escritura)
+
+# Solo inserciones: corregir un evento es registrar otro
+for _operation in ("UPDATE", "DELETE"):
+    event.listen(
+        AuditEvent.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS audit_events_no_{_operation.lower()} "
+            f"BEFORE {_operation} ON audit_events "
+            f"BEGIN SELECT RAISE(ABORT, 'audit_events solo admite inserciones'); END"
+        ).execute_if(dialect="sqlite"),
+    )
+
+class RevokedToken(Base):
+    """Token revocado (jti) o todos los de un usuario emitidos hasta revoked_before (ver tokens.py)"""
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, unique=True, nullable=True)
+    email = Column(String, nullable=True)  # Solo al revocar todos los tokens del usuario
+    revoked_before = Column(Float, nullable=True)  # Epoch: se revocan los emitidos hasta este momento
+    expires_at = Column(Float, index=True)  # Epoch: después ya no hace falta recordarlo
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class Job(Base):
+    """Tarea en segundo plano (cola persistente, ver jobs.py)"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # suggest, reprice, orders_report, margins_report
+    status = Column(String, default="queued")  # queued, running, succeeded, failed, cancelled
+    params = Column(Text)  # JSON
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    progress = Column(Float, default=0.0)  # 0 a 1
+    message = Column(String, nullable=True)  # Descripción del avance
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(Float, default=0.0)  # Epoch: no se ejecuta antes (reintentos con espera)
+    lease_until = Column(Float, nullable=True)  # Epoch: vencido, otro worker puede retomarla
+    worker = Column(String, nullable=True)  # Proceso/hilo que la ejecuta
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
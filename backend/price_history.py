@@ -0,0 +1,345 @@
+"""
+Historial de precios por fuente
+
+Cada consulta de mercado agrega una fila por fuente a price_observations
+(producto, fuente, precio, epoch en segundos: filas angostas, sin texto
+repetido). En la misma transacción se actualizan los agregados de
+price_rollups por hora, día y semana (lunes), por fuente y para todas las
+fuentes juntas (source_id = 0), con INSERT ... ON CONFLICT: el historial
+de un año se lee de ~52 filas semanales sin recorrer las observaciones.
+
+Retención (días; 0 = sin límite):
+- MOBICORP_HISTORY_RAW_DAYS (30): observaciones individuales
+- MOBICORP_HISTORY_HOURLY_DAYS (90), MOBICORP_HISTORY_DAILY_DAYS (730),
+  MOBICORP_HISTORY_WEEKLY_DAYS (0): agregados por resolución
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import PriceObservation, PriceRollup, PriceSource
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+WEEK_OFFSET = 4 * DAY  # El epoch (1970-01-01) fue jueves; las semanas empiezan el lunes
+
+RESOLUTIONS = {"hour": HOUR, "day": DAY, "week": WEEK}
+ALL_SOURCES = 0
+
+RETENTION_DAYS = {
+    "raw": int(os.getenv("MOBICORP_HISTORY_RAW_DAYS", "30")),
+    "hour": int(os.getenv("MOBICORP_HISTORY_HOURLY_DAYS", "90")),
+    "day": int(os.getenv("MOBICORP_HISTORY_DAILY_DAYS", "730")),
+    "week": int(os.getenv("MOBICORP_HISTORY_WEEKLY_DAYS", "0")),
+}
+PRUNE_INTERVAL = HOUR  # Como máximo una limpieza por hora y proceso
+PRUNE_BATCH = 2000  # Filas por transacción al podar
+PRUNE_PAUSE = 0.05  # Segundos entre lotes, para que entren las escrituras de las peticiones
+
+_source_ids: Dict[str, int] = {}  # Solo fuentes ya confirmadas (commit)
+_PENDING_SOURCES = "price_history.pending_sources"  # Clave en Session.info: fuentes insertadas sin commit
+_lock = threading.Lock()
+_last_prune: Optional[float] = None
+
+
+def bucket_start(timestamp: int, resolution: str) -> int:
+    """Inicio del intervalo que contiene al timestamp"""
+    if resolution == "week":
+        return (timestamp - WEEK_OFFSET) // WEEK * WEEK + WEEK_OFFSET
+    size = RESOLUTIONS[resolution]
+    return timestamp // size * size
+
+
+def auto_resolution(days: int) -> str:
+    """Resolución adecuada para el rango pedido (~50-200 puntos)"""
+    if days <= 7:
+        return "hour"
+    if days <= 180:
+        return "day"
+    return "week"
+
+
+def source_ids(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    """
+    IDs de las fuentes, creando las nuevas. Las ya confirmadas se cachean
+    en memoria; las que se insertan en la transacción de `db` recién pasan
+    a la caché con su commit (si se deshace, no quedan IDs inexistentes)
+    """
+    names = set(names)
+    with _lock:
+        ids = {name: _source_ids[name] for name in names if name in _source_ids}
+    missing = names - ids.keys()
+    if not missing:
+        return ids
+    # Leer antes de insertar: las fuentes casi siempre existen ya y así
+    # no se toma el bloqueo de escritura de SQLite
+    found = dict(db.query(PriceSource.name, PriceSource.id).filter(PriceSource.name.in_(missing)).all())
+    new = missing - found.keys()
+    if new:
+        db.execute(insert(PriceSource).on_conflict_do_nothing(), [{"name": name} for name in new])
+        found = dict(db.query(PriceSource.name, PriceSource.id).filter(PriceSource.name.in_(missing)).all())
+    pending = _pending_sources(db)
+    pending.update({name: found[name] for name in new if name in found})
+    with _lock:
+        _source_ids.update({name: source_id for name, source_id in found.items() if name not in pending})
+    return {**ids, **found}
+
+
+def _pending_sources(db: Session) -> Dict[str, int]:
+    """Fuentes insertadas en la transacción en curso de `db` (se cachean en after_commit)"""
+    if _PENDING_SOURCES not in db.info:
+        db.info[_PENDING_SOURCES] = {}
+        if not event.contains(db, "after_commit", _cache_committed_sources):
+            event.listen(db, "after_commit", _cache_committed_sources)
+            event.listen(db, "after_rollback", _forget_pending_sources)
+    return db.info[_PENDING_SOURCES]
+
+
+def _cache_committed_sources(db: Session) -> None:
+    pending = db.info.pop(_PENDING_SOURCES, None)
+    if pending:
+        with _lock:
+            _source_ids.update(pending)
+
+
+def _forget_pending_sources(db: Session) -> None:
+    db.info.pop(_PENDING_SOURCES, None)
+
+
+def record_observations(
+    db: Session,
+    markets: List[Tuple[int, List[Dict]]],
+    observed_at: Optional[int] = None
+) -> int:
+    """
+    Agregar las observaciones de mercado [(product_id, [{"source", "price"}])]
+    y actualizar los agregados. No hace commit; devuelve la cantidad de filas.
+    """
+    observed_at = int(time.time()) if observed_at is None else observed_at
+    ids = source_ids(db, {source["source"] for _, market in markets for source in market})
+    rows = [
+        {
+            "product_id": product_id,
+            "source_id": ids[source["source"]],
+            "price": float(source["price"]),
+            "observed_at": observed_at,
+        }
+        for product_id, market in markets
+        for source in market
+    ]
+    if not rows:
+        return 0
+    db.execute(insert(PriceObservation), rows)
+
+    # Agregados del lote en memoria: un upsert por intervalo, no por observación
+    rollups: Dict[Tuple[int, str, int, int], List[float]] = {}
+    for row in rows:
+        for resolution in RESOLUTIONS:
+            start = bucket_start(row["observed_at"], resolution)
+            for source_id in (row["source_id"], ALL_SOURCES):
+                key = (row["product_id"], resolution, source_id, start)
+                bucket = rollups.get(key)
+                if bucket is None:
+                    rollups[key] = [1, row["price"], row["price"], row["price"]]
+                else:
+                    bucket[0] += 1
+                    bucket[1] = min(bucket[1], row["price"])
+                    bucket[2] = max(bucket[2], row["price"])
+                    bucket[3] += row["price"]
+    _upsert_rollups(db, [
+        {
+            "product_id": product_id,
+            "resolution": resolution,
+            "source_id": source_id,
+            "bucket_start": start,
+            "observations": count,
+            "min_price": low,
+            "max_price": high,
+            "sum_price": total,
+        }
+        for (product_id, resolution, source_id, start), (count, low, high, total) in rollups.items()
+    ])
+    return len(rows)
+
+
+def _upsert_rollups(db: Session, rows: List[Dict]) -> None:
+    """Sumar los agregados a los intervalos existentes (o crearlos)"""
+    if not rows:
+        return
+    statement = insert(PriceRollup)
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["product_id", "resolution", "source_id", "bucket_start"],
+            set_={
+                "observations": PriceRollup.observations + excluded.observations,
+                "min_price": func.min(PriceRollup.min_price, excluded.min_price),
+                "max_price": func.max(PriceRollup.max_price, excluded.max_price),
+                "sum_price": PriceRollup.sum_price + excluded.sum_price,
+            },
+        ),
+        rows,
+    )
+
+
+def rebuild_rollups(db: Session, since: Optional[int] = None) -> int:
+    """
+    Recalcular los agregados desde las observaciones guardadas (siembra de
+    datos o reparación). Solo se reemplazan los intervalos desde `since`
+    (por defecto, la observación más antigua): los agregados de periodos
+    anteriores, cuyas observaciones ya se podaron, se conservan; el
+    intervalo que contiene a `since` queda con lo que aún esté guardado.
+    Hace commit.
+    """
+    if since is None:
+        since = db.query(func.min(PriceObservation.observed_at)).scalar()
+        if since is None:
+            return 0
+    total = 0
+    for resolution, size in RESOLUTIONS.items():
+        start = bucket_start(since, resolution)
+        db.query(PriceRollup).filter(
+            PriceRollup.resolution == resolution, PriceRollup.bucket_start >= start
+        ).delete(synchronize_session=False)
+        offset = WEEK_OFFSET if resolution == "week" else 0
+        bucket = (PriceObservation.observed_at - offset) // size * size + offset
+        for per_source in (True, False):
+            source = PriceObservation.source_id if per_source else literal(ALL_SOURCES)
+            group = [PriceObservation.product_id, bucket] + ([PriceObservation.source_id] if per_source else [])
+            query = select(
+                PriceObservation.product_id,
+                literal(resolution),
+                source,
+                bucket,
+                func.count(),
+                func.min(PriceObservation.price),
+                func.max(PriceObservation.price),
+                func.sum(PriceObservation.price),
+            ).where(PriceObservation.observed_at >= start).group_by(*group)
+            result = db.execute(insert(PriceRollup).from_select(
+                ["product_id", "resolution", "source_id", "bucket_start", "observations",
+                 "min_price", "max_price", "sum_price"],
+                query,
+            ))
+            total += result.rowcount
+    db.commit()
+    return total
+
+
+def prune_history(db: Session, now: Optional[int] = None, batch_size: int = PRUNE_BATCH) -> Dict[str, int]:
+    """
+    Aplicar la política de retención; devuelve filas borradas. Borra en
+    lotes de batch_size con un commit y una pausa por lote: SQLite tiene un
+    solo escritor y una poda grande (cientos de miles de filas la primera
+    vez) haría fallar por "database is locked" a las peticiones que guardan
+    precios mientras tanto.
+    """
+    now = int(time.time()) if now is None else now
+    deleted = {}
+    for level, days in RETENTION_DAYS.items():
+        if days <= 0:
+            continue
+        cutoff = now - days * DAY
+        if level == "raw":
+            model = PriceObservation
+            condition = PriceObservation.observed_at < cutoff
+        else:
+            model = PriceRollup
+            condition = (PriceRollup.resolution == level) & (PriceRollup.bucket_start < bucket_start(cutoff, level))
+        deleted[level] = 0
+        while True:
+            batch = select(model.id).where(condition).limit(batch_size)
+            count = db.query(model).filter(model.id.in_(batch)).delete(synchronize_session=False)
+            db.commit()
+            deleted[level] += count
+            if count < batch_size:
+                break
+            time.sleep(PRUNE_PAUSE)
+    return deleted
+
+
+def maybe_prune(session_factory: Callable[[], Session]) -> bool:
+    """
+    Podar el historial en un hilo aparte si pasó PRUNE_INTERVAL desde la
+    última vez (la petición que lo dispara no espera el borrado)
+    """
+    global _last_prune
+    with _lock:
+        now = time.monotonic()
+        if _last_prune is not None and now - _last_prune < PRUNE_INTERVAL:
+            return False
+        _last_prune = now
+
+    def run():
+        db = session_factory()
+        try:
+            deleted = prune_history(db)
+            if any(deleted.values()):
+                print(f"[Historial de precios] Retención aplicada: {deleted}")
+        except Exception as e:
+            print(f"Error al podar el historial de precios: {type(e).__name__}: {e}")
+        finally:
+            db.close()
+
+    threading.Thread(target=run, name="price-history-prune", daemon=True).start()
+    return True
+
+
+def price_history(
+    db: Session,
+    product_id: int,
+    days: int,
+    resolution: Optional[str] = None,
+    by_source: bool = False,
+    now: Optional[int] = None
+) -> Dict:
+    """Serie de precios de un producto leída de los agregados"""
+    resolution = resolution or auto_resolution(days)
+    now = int(time.time()) if now is None else now
+    since = bucket_start(now - days * DAY, resolution)
+    query = db.query(
+        PriceRollup.source_id,
+        PriceRollup.bucket_start,
+        PriceRollup.observations,
+        PriceRollup.min_price,
+        PriceRollup.max_price,
+        PriceRollup.sum_price,
+    ).filter(
+        PriceRollup.product_id == product_id,
+        PriceRollup.resolution == resolution,
+        PriceRollup.bucket_start >= since,
+    )
+    if not by_source:
+        query = query.filter(PriceRollup.source_id == ALL_SOURCES)
+    rows = query.order_by(PriceRollup.source_id, PriceRollup.bucket_start).all()
+
+    names = {}
+    if by_source:
+        names = dict(db.query(PriceSource.id, PriceSource.name).all())
+    points: List[Dict] = []
+    sources: Dict[str, List[Dict]] = {}
+    for row in rows:
+        point = {
+            "bucket_start": datetime.fromtimestamp(row.bucket_start, tz=timezone.utc),
+            "observations": row.observations,
+            "min_price": row.min_price,
+            "max_price": row.max_price,
+            "avg_price": round(row.sum_price / row.observations, 2),
+        }
+        if row.source_id == ALL_SOURCES:
+            points.append(point)
+        else:
+            sources.setdefault(names.get(row.source_id, str(row.source_id)), []).append(point)
+    return {
+        "product_id": product_id,
+        "resolution": resolution,
+        "points": points,
+        "sources": sources,
+    }
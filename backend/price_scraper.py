@@ -1,16 +1,65 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Optional
+import re
 import time
 import random
 
+
+@dataclass
+class FetchedPage:
+    """Respuesta HTTP de una página (lo que se graba y reproduce en scraper_sim)"""
+    url: str
+    status: int
+    content: bytes
+    content_type: str = "text/html"
+    elapsed_ms: float = 0.0
+
+
+# fetcher(url, headers, timeout) -> FetchedPage
+Fetcher = Callable[[str, Dict[str, str], float], FetchedPage]
+
+
+def http_fetch(url: str, headers: Dict[str, str], timeout: float) -> FetchedPage:
+    """Descargar una página (requests se importa aquí: retrasa el arranque de la app)"""
+    import requests
+
+    started = time.perf_counter()
+    response = requests.get(url, headers=headers, timeout=timeout)
+    return FetchedPage(
+        url=url,
+        status=response.status_code,
+        content=response.content,
+        content_type=response.headers.get("Content-Type", "text/html"),
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def parse_price(text: str) -> Optional[float]:
+    """
+    Primer número de un texto de precio ("Bs 1.234,50", "$1,234.50", "850"):
+    el último punto o coma es decimal solo si lo siguen uno o dos dígitos
+    """
+    match = re.search(r"\d[\d.,]*", text)
+    if not match:
+        return None
+    number = match.group().rstrip(".,")
+    last = max(number.rfind("."), number.rfind(","))
+    if last != -1 and len(number) - last - 1 in (1, 2):
+        integer, decimals = number[:last], number[last + 1:]
+    else:
+        integer, decimals = number, "0"
+    return float(f"{re.sub(r'[.,]', '', integer)}.{decimals}")
+
+
 class PriceScraper:
     """
     Clase para realizar web scraping de precios de productos
     Simula la búsqueda en múltiples fuentes del mercado
     """
     
-    def __init__(self):
+    def __init__(self, fetcher: Optional[Fetcher] = None):
+        # Descarga de páginas de scrape_real_price (scraper_sim graba y reproduce respuestas)
+        self.fetcher = fetcher or http_fetch
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
@@ -98,6 +147,10 @@ class PriceScraper:
         """
         Método para scraping real (requiere configuración específica)
         """
+        # Importado aquí: solo el scraping real lo necesita y cargarlo
+        # retrasa el arranque de la app
+        from bs4 import BeautifulSoup
+
         try:
             headers = {
                 "User-Agent": random.choice(self.user_agents),
@@ -105,21 +158,28 @@ class PriceScraper:
                 "Accept-Language": "es-ES,es;q=0.9",
             }
             
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            page = self.fetcher(url, headers, 10)
+            if page.status >= 400:
+                raise RuntimeError(f"HTTP {page.status}")
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(page.content, 'html.parser')
             
             # Aquí se implementaría la lógica específica para extraer el precio
             # de cada sitio web (selectores CSS, XPath, etc.)
             
-            # Ejemplo genérico:
-            price_elements = soup.find_all(class_=["price", "precio", "cost"])
-            # ... lógica de extracción ...
+            # Ejemplo genérico: el primer elemento de precio con un número
+            price = None
+            for element in soup.find_all(class_=["price", "precio", "cost"]):
+                price = parse_price(element.get_text(" ", strip=True))
+                if price is not None:
+                    break
+            if price is None:
+                print(f"No se encontró un precio en {url}")
+                return None
             
             return {
                 "source": url,
-                "price": 0.0,  # Extraído del HTML
+                "price": price,
                 "url": url
             }
         except Exception as e:
@@ -0,0 +1,178 @@
+"""
+Motor de precios sugeridos
+
+Calcula las estadísticas de mercado de muchos productos a la vez con NumPy:
+mínimo, máximo, promedio, mediana, rechazo de atípicos por rango
+intercuartílico (IQR), media recortada y promedio ponderado por fuente.
+El precio sugerido es el promedio ponderado de las fuentes que no son
+atípicas, así una sola tienda con un precio desorbitado no lo arrastra.
+
+Los productos se agrupan por cantidad de fuentes y cada grupo se calcula
+como una matriz sin relleno: el resultado de un producto no depende de qué
+otros productos se calculen junto a él (un producto o el catálogo completo
+dan exactamente los mismos números).
+
+Pesos por fuente: MOBICORP_SOURCE_WEIGHTS="Agimex=1.2,Blau=0.8" (por defecto 1.0).
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+IQR_FACTOR = 1.5  # Atípico: fuera de [Q1 - 1.5·IQR, Q3 + 1.5·IQR]
+MIN_SOURCES_FOR_IQR = 4  # Con menos fuentes los cuartiles no son confiables
+TRIM_FRACTION = 0.1  # Proporción descartada en cada extremo para la media recortada
+ALERT_THRESHOLD = 0.10  # Variación relativa que genera una alerta de precio
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    """Leer "Fuente=peso,Fuente=peso" (entradas mal formadas se ignoran)"""
+    weights = {}
+    for entry in raw.split(","):
+        name, _, value = entry.partition("=")
+        try:
+            weights[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return weights
+
+
+SOURCE_WEIGHTS = _parse_weights(os.getenv("MOBICORP_SOURCE_WEIGHTS", ""))
+
+
+@dataclass
+class PriceStats:
+    """Estadísticas de mercado de un producto"""
+    suggested_price: float
+    min_price: float
+    max_price: float
+    avg_price: float
+    median_price: float
+    trimmed_mean: float
+    weighted_price: float
+    source_count: int
+    outlier_sources: List[str] = field(default_factory=list)
+
+
+class PricingEngine:
+    """Estadísticas vectorizadas sobre listas de precios de mercado"""
+
+    def __init__(
+        self,
+        source_weights: Optional[Dict[str, float]] = None,
+        iqr_factor: float = IQR_FACTOR,
+        trim_fraction: float = TRIM_FRACTION,
+    ):
+        self.source_weights = SOURCE_WEIGHTS if source_weights is None else source_weights
+        self.iqr_factor = iqr_factor
+        self.trim_fraction = trim_fraction
+
+    def price(self, market_prices: List[Dict]) -> Optional[PriceStats]:
+        """Estadísticas de un producto (None si no hay precios)"""
+        return self.price_many([market_prices])[0]
+
+    def price_many(self, markets: Sequence[List[Dict]]) -> List[Optional[PriceStats]]:
+        """
+        Estadísticas de varios productos; markets[i] es la lista de fuentes
+        ({"source", "price"}) del producto i. Devuelve None donde no hay precios.
+        """
+        results: List[Optional[PriceStats]] = [None] * len(markets)
+        groups: Dict[int, List[int]] = {}
+        for index, market in enumerate(markets):
+            if market:
+                groups.setdefault(len(market), []).append(index)
+
+        for indexes in groups.values():
+            prices = np.array(
+                [[float(source["price"]) for source in markets[i]] for i in indexes],
+                dtype=np.float64,
+            )
+            weights = np.array(
+                [[self.source_weights.get(source["source"], 1.0) for source in markets[i]] for i in indexes],
+                dtype=np.float64,
+            )
+            for row, stats in zip(indexes, self._price_matrix(prices, weights, markets, indexes)):
+                results[row] = stats
+        return results
+
+    def _price_matrix(
+        self,
+        prices: np.ndarray,
+        weights: np.ndarray,
+        markets: Sequence[List[Dict]],
+        indexes: List[int],
+    ) -> List[PriceStats]:
+        """Calcular un grupo de productos con la misma cantidad de fuentes (filas)"""
+        width = prices.shape[1]
+
+        # Rechazo de atípicos por IQR
+        if width >= MIN_SOURCES_FOR_IQR:
+            q1, q3 = np.percentile(prices, [25, 75], axis=1)
+            spread = (q3 - q1) * self.iqr_factor
+            inliers = (prices >= (q1 - spread)[:, None]) & (prices <= (q3 + spread)[:, None])
+        else:
+            inliers = np.ones_like(prices, dtype=bool)
+        inlier_count = inliers.sum(axis=1)
+
+        # Media recortada sobre las fuentes no atípicas: se ordena con los
+        # atípicos al final (inf) y se promedian las posiciones centrales
+        ordered = np.sort(np.where(inliers, prices, np.inf), axis=1)
+        trim = np.floor(inlier_count * self.trim_fraction).astype(np.int64)
+        positions = np.arange(width)[None, :]
+        kept = (positions >= trim[:, None]) & (positions < (inlier_count - trim)[:, None])
+        trimmed_mean = np.where(kept, ordered, 0.0).sum(axis=1) / kept.sum(axis=1)
+
+        # Promedio ponderado por fuente sobre las fuentes no atípicas
+        inlier_weights = np.where(inliers, weights, 0.0)
+        weight_total = inlier_weights.sum(axis=1)
+        weighted = np.divide(
+            (inlier_weights * prices).sum(axis=1),
+            weight_total,
+            out=trimmed_mean.copy(),
+            where=weight_total > 0,
+        )
+
+        minimum = prices.min(axis=1)
+        maximum = prices.max(axis=1)
+        average = prices.mean(axis=1)
+        median = np.median(prices, axis=1)
+
+        stats = []
+        for row, index in enumerate(indexes):
+            stats.append(PriceStats(
+                suggested_price=round(float(weighted[row]), 2),
+                min_price=float(minimum[row]),
+                max_price=float(maximum[row]),
+                avg_price=round(float(average[row]), 2),
+                median_price=round(float(median[row]), 2),
+                trimmed_mean=round(float(trimmed_mean[row]), 2),
+                weighted_price=round(float(weighted[row]), 2),
+                source_count=width,
+                outlier_sources=[
+                    source["source"]
+                    for source, inlier in zip(markets[index], inliers[row])
+                    if not inlier
+                ],
+            ))
+        return stats
+
+
+def price_variations(current: Sequence[Optional[float]], reference: Sequence[float]) -> np.ndarray:
+    """
+    Variación porcentual de reference respecto de current, producto a
+    producto; NaN donde no hay precio actual (o es 0)
+    """
+    base = np.array([value if value else np.nan for value in current], dtype=np.float64)
+    return (np.asarray(reference, dtype=np.float64) - base) / base * 100
+
+
+def alert_indexes(current: Sequence[Optional[float]], reference: Sequence[float],
+                  threshold: Union[float, Sequence[float]] = ALERT_THRESHOLD) -> List[int]:
+    """
+    Posiciones cuya variación supera el umbral en valor absoluto; threshold
+    (fracción, 0.1 = 10%) puede ser uno solo o uno por producto
+    """
+    variations = price_variations(current, reference)
+    limits = np.asarray(threshold, dtype=np.float64) * 100
+    return [int(i) for i in np.flatnonzero(np.abs(variations) > limits)]
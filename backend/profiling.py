@@ -0,0 +1,440 @@
+"""
+Perfilado por petición e instrumentación de SQL
+
+- ProfilingMiddleware (ASGI) mide cada petición y reparte su tiempo en fases:
+  auth, db, scraping, handler y serialization. Devuelve el desglose en la
+  cabecera Server-Timing y lo acumula en métricas estilo Prometheus.
+- install_sql_instrumentation() cuenta y cronometra cada sentencia SQL con
+  eventos de SQLAlchemy y registra las consultas lentas.
+- ProfiledRoute marca el momento en que termina el endpoint, para separar
+  el tiempo de serialización de la respuesta.
+- metrics_allowed() protege /metrics: solo lo ven las direcciones de
+  MOBICORP_METRICS_ALLOW (por defecto, la propia máquina) o quien envíe
+  MOBICORP_METRICS_TOKEN como token Bearer.
+- Con MOBICORP_PROFILE_SAMPLING=1 un hilo muestrea las pilas de las
+  peticiones en curso y, si una petición resulta lenta, vuelca sus pilas en
+  formato "collapsed" (flamegraph.pl / speedscope) en MOBICORP_PROFILE_DIR.
+  Solo se muestrea el trabajo síncrono de la petición (endpoints def y
+  fases que corren en hilos del pool), y solo mientras el hilo la atiende.
+  El hilo del event loop lo comparten todas las peticiones: sus pilas no se
+  pueden atribuir a ninguna.
+
+Las peticiones que no llegan a una ruta (404, 429 del control de admisión)
+se cuentan bajo la ruta "unmatched": la ruta cruda haría crecer las series
+sin límite.
+
+Nota: la fase "db" incluye el SQL ejecutado dentro de otras fases (por
+ejemplo la consulta del usuario durante "auth").
+"""
+import asyncio
+import contextvars
+import functools
+import hmac
+import ipaddress
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi.routing import APIRoute
+
+SLOW_QUERY_MS = float(os.getenv("MOBICORP_SLOW_QUERY_MS", "200"))
+SLOW_REQUEST_MS = float(os.getenv("MOBICORP_SLOW_REQUEST_MS", "1000"))
+PROFILE_SAMPLING = os.getenv("MOBICORP_PROFILE_SAMPLING", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("MOBICORP_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.getenv("MOBICORP_PROFILE_DIR", "profiles"))
+METRICS_TOKEN = os.getenv("MOBICORP_METRICS_TOKEN", "")
+METRICS_ALLOW = os.getenv("MOBICORP_METRICS_ALLOW", "127.0.0.1,::1")
+
+UNMATCHED_ROUTE = "unmatched"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestProfile:
+    """Tiempos acumulados de una petición en curso"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = path
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.handler_done: Optional[float] = None
+        self.threads: Counter = Counter()  # hilo -> bloques de la petición que corren en él
+        self.samples: Counter = Counter()
+        self._threads_lock = threading.Lock()
+
+    def add(self, phase_name: str, seconds: float) -> None:
+        self.phases[phase_name] = self.phases.get(phase_name, 0.0) + seconds
+
+    @contextmanager
+    def running_here(self):
+        """
+        Muestrear el hilo actual mientras corre este bloque (sin muestreo o
+        en el hilo del event loop no hace nada)
+        """
+        if sampler is None or _on_event_loop():
+            yield
+            return
+        ident = threading.get_ident()
+        with self._threads_lock:
+            self.threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._threads_lock:
+                self.threads[ident] -= 1
+                if not self.threads[ident]:
+                    del self.threads[ident]
+
+    def thread_ids(self) -> List[int]:
+        with self._threads_lock:
+            return list(self.threads)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "mobicorp_request_profile", default=None
+)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def phase(name: str):
+    """Cronometrar un bloque como una fase de la petición actual (no-op fuera de peticiones)"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        with profile.running_here():
+            yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+# ==================== MÉTRICAS ====================
+
+class MetricsRegistry:
+    """Contadores e histogramas en memoria, exportados en formato de texto Prometheus"""
+
+    def __init__(self, max_slow_queries: int = 100):
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()  # (method, route, status) -> n
+        self.durations: Dict[str, List[int]] = {}  # route -> conteo por bucket
+        self.duration_sum: Counter = Counter()
+        self.duration_count: Counter = Counter()
+        self.phase_seconds: Counter = Counter()  # (route, phase) -> s
+        self.sql_statements: Counter = Counter()  # route -> n
+        self.sql_seconds: Counter = Counter()
+        self.slow_queries_total = 0
+        self.slow_requests_total = 0
+        self.slow_queries: Deque[Dict] = deque(maxlen=max_slow_queries)
+
+    def observe_request(self, profile: RequestProfile, status: int, duration: float) -> None:
+        with self._lock:
+            route = profile.route
+            self.requests[(profile.method, route, str(status))] += 1
+            buckets = self.durations.setdefault(route, [0] * len(DURATION_BUCKETS))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+            self.duration_sum[route] += duration
+            self.duration_count[route] += 1
+            for name, seconds in profile.phases.items():
+                self.phase_seconds[(route, name)] += seconds
+            self.sql_statements[route] += profile.sql_count
+            self.sql_seconds[route] += profile.sql_time
+            if duration * 1000 >= SLOW_REQUEST_MS:
+                self.slow_requests_total += 1
+
+    def observe_query(self, route: str, statement: str, duration: float) -> None:
+        if duration * 1000 < SLOW_QUERY_MS:
+            return
+        with self._lock:
+            self.slow_queries_total += 1
+            self.slow_queries.append({
+                "route": route,
+                "duration_ms": round(duration * 1000, 2),
+                "statement": " ".join(statement.split())[:500],
+                "at": datetime.now().isoformat(timespec="seconds"),
+            })
+
+    def render(self) -> str:
+        """Serializar en el formato de exposición de texto de Prometheus"""
+        def labels(**values) -> str:
+            escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                       for k, v in values.items())
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self._lock:
+            lines += ["# HELP mobicorp_http_requests_total Peticiones HTTP atendidas",
+                      "# TYPE mobicorp_http_requests_total counter"]
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f"mobicorp_http_requests_total{labels(method=method, route=route, status=status)} {n}")
+
+            lines += ["# HELP mobicorp_http_request_duration_seconds Duración de las peticiones",
+                      "# TYPE mobicorp_http_request_duration_seconds histogram"]
+            for route, buckets in sorted(self.durations.items()):
+                for bound, n in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"mobicorp_http_request_duration_seconds_bucket{labels(route=route, le=bound)} {n}")
+                lines.append(f"mobicorp_http_request_duration_seconds_bucket"
+                             f"{labels(route=route, le='+Inf')} {self.duration_count[route]}")
+                lines.append(f"mobicorp_http_request_duration_seconds_sum{labels(route=route)} "
+                             f"{self.duration_sum[route]:.6f}")
+                lines.append(f"mobicorp_http_request_duration_seconds_count{labels(route=route)} "
+                             f"{self.duration_count[route]}")
+
+            lines += ["# HELP mobicorp_request_phase_seconds_total Tiempo acumulado por fase de la petición",
+                      "# TYPE mobicorp_request_phase_seconds_total counter"]
+            for (route, name), seconds in sorted(self.phase_seconds.items()):
+                lines.append(f"mobicorp_request_phase_seconds_total{labels(route=route, phase=name)} {seconds:.6f}")
+
+            lines += ["# HELP mobicorp_sql_statements_total Sentencias SQL ejecutadas",
+                      "# TYPE mobicorp_sql_statements_total counter"]
+            for route, n in sorted(self.sql_statements.items()):
+                lines.append(f"mobicorp_sql_statements_total{labels(route=route)} {n}")
+
+            lines += ["# HELP mobicorp_sql_duration_seconds_total Tiempo acumulado en SQL",
+                      "# TYPE mobicorp_sql_duration_seconds_total counter"]
+            for route, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f"mobicorp_sql_duration_seconds_total{labels(route=route)} {seconds:.6f}")
+
+            lines += ["# HELP mobicorp_slow_queries_total Consultas SQL por encima del umbral",
+                      "# TYPE mobicorp_slow_queries_total counter",
+                      f"mobicorp_slow_queries_total {self.slow_queries_total}",
+                      "# HELP mobicorp_slow_requests_total Peticiones por encima del umbral",
+                      "# TYPE mobicorp_slow_requests_total counter",
+                      f"mobicorp_slow_requests_total {self.slow_requests_total}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+_allowed_networks = [ipaddress.ip_network(entry.strip(), strict=False)
+                     for entry in METRICS_ALLOW.split(",") if entry.strip()]
+
+
+def metrics_allowed(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    """Si la petición puede leer /metrics (dirección permitida o token)"""
+    if METRICS_TOKEN and authorization:
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(credentials.strip(), METRICS_TOKEN):
+            return True
+    try:
+        address = ipaddress.ip_address(client_host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in _allowed_networks)
+
+
+# ==================== SQL ====================
+
+def install_sql_instrumentation(engine) -> None:
+    """
+    Registrar eventos de SQLAlchemy que cuentan y cronometran cada sentencia
+    (una sola vez por engine, aunque se creen varias apps)
+    """
+    from sqlalchemy import event
+
+    if getattr(engine, "_mobicorp_instrumented", False):
+        return
+    engine._mobicorp_instrumented = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("mobicorp_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("mobicorp_query_start")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.sql_count += 1
+            profile.sql_time += duration
+        metrics.observe_query(profile.route if profile else "-", statement, duration)
+        if duration * 1000 >= SLOW_QUERY_MS:
+            print(f"[SQL lenta] {duration * 1000:.1f} ms: {' '.join(statement.split())[:200]}")
+
+
+# ==================== MUESTREO DE PILAS ====================
+
+class StackSampler:
+    """Hilo que muestrea periódicamente las pilas de los hilos de cada petición activa"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Set[RequestProfile] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mobicorp-sampler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.discard(profile)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                for thread_id in profile.thread_ids():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.samples[self._collapse(frame)] += 1
+
+
+sampler = StackSampler(PROFILE_INTERVAL_MS / 1000) if PROFILE_SAMPLING else None
+
+
+def dump_samples(profile: RequestProfile, duration: float) -> Optional[Path]:
+    """Guardar las pilas muestreadas de una petición lenta en formato collapsed"""
+    if not profile.samples:
+        return None
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    safe_route = "".join(c if c.isalnum() else "_" for c in profile.route).strip("_") or "root"
+    path = PROFILE_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{safe_route}_{int(duration * 1000)}ms.folded"
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in profile.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+# ==================== MIDDLEWARE Y RUTAS ====================
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila cada petición HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope.get("method", ""), scope.get("path", ""))
+        token = _current_profile.set(profile)
+        if sampler is not None:
+            sampler.register(profile)
+        status_code = 500
+        first_byte: Optional[float] = None
+        event_stream = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, first_byte, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                now = time.perf_counter()
+                first_byte = now
+                event_stream = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+                if profile.handler_done is not None:
+                    profile.add("serialization", now - profile.handler_done)
+                profile.add("db", profile.sql_time)
+                headers = list(message.get("headers", []))
+                timing = ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in profile.phases.items())
+                timing += f", total;dur={(now - profile.started) * 1000:.2f}"
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                headers.append((b"x-sql-count", str(profile.sql_count).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Los streams SSE duran lo que dure la conexión: se mide hasta el primer byte
+            end = first_byte if event_stream and first_byte is not None else time.perf_counter()
+            duration = end - profile.started
+            route = scope.get("route")
+            profile.route = getattr(route, "path", None) or UNMATCHED_ROUTE
+            if "db" not in profile.phases:
+                profile.add("db", profile.sql_time)
+            metrics.observe_request(profile, status_code, duration)
+            if sampler is not None:
+                sampler.unregister(profile)
+            if duration * 1000 >= SLOW_REQUEST_MS:
+                phases = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in profile.phases.items())
+                dumped = dump_samples(profile, duration) if sampler is not None else None
+                print(f"[Petición lenta] {profile.method} {profile.path} {duration * 1000:.1f} ms "
+                      f"sql={profile.sql_count} {phases}" + (f" pilas={dumped}" if dumped else ""))
+            _current_profile.reset(token)
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Ruta que envuelve el endpoint para medir la fase "handler" y marcar cuándo
+    termina, de modo que el middleware pueda aislar el tiempo de serialización
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapped(*args, **kw):
+                profile = _current_profile.get()
+                start = time.perf_counter()
+                try:
+                    return await endpoint(*args, **kw)
+                finally:
+                    if profile is not None:
+                        profile.handler_done = time.perf_counter()
+                        profile.add("handler", profile.handler_done - start)
+        else:
+            @functools.wraps(endpoint)
+            def wrapped(*args, **kw):
+                profile = _current_profile.get()
+                start = time.perf_counter()
+                try:
+                    if profile is None:
+                        return endpoint(*args, **kw)
+                    with profile.running_here():
+                        return endpoint(*args, **kw)
+                finally:
+                    if profile is not None:
+                        profile.handler_done = time.perf_counter()
+                        profile.add("handler", profile.handler_done - start)
+        super().__init__(path, wrapped, **kwargs)
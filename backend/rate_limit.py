@@ -0,0 +1,232 @@
+"""
+Control de admisión: límites de peticiones por usuario y por clase de endpoint
+
+Cada petición HTTP se asigna a una clase según su ruta:
+
+- auth: login y registro (bcrypt, costoso en CPU) y refresco de tokens; se
+  limita por IP.
+- scraping: /api/prices/suggest (consulta el mercado en cada llamada).
+- reprice: /api/prices/reprice (hasta cientos de consultas de mercado).
+- reports: /api/reports/* (agregan la tabla de pedidos).
+- chat: /api/chat y /api/chat/stream. El WebSocket /api/chat/ws no pasa
+  por el middleware (una conexión atiende muchos mensajes): el endpoint
+  cobra cada mensaje con AdmissionController.admit("chat", ...).
+- default: todo lo demás.
+
+Las imágenes (/uploads/) no pasan por el control: son archivos estáticos
+con caché larga, los <img> no mandan token (se limitarían por IP) y un
+catálogo con cientos de fotos agotaría la ráfaga en la primera vista.
+
+Dos controles por clase:
+
+1. Token bucket por usuario (o por IP si no hay token válido): N
+   peticiones por minuto con una ráfaga máxima. Vive en el estado
+   compartido, así el límite es el mismo sin importar cuántos workers haya.
+2. Límite de concurrencia por worker: cuántas peticiones de la clase pueden
+   ejecutarse a la vez. Los endpoints síncronos comparten el pool de hilos
+   del worker; sin este tope, unas cuantas pestañas pidiendo sugerencias
+   ocuparían todos los hilos y hasta /api/products quedaría esperando.
+
+Si se supera cualquiera de los dos se responde 429 con Retry-After, sin
+llegar al endpoint. Con el estado en Redis, tomar la ficha es una consulta
+de red: admit() la hace en el pool de hilos para no frenar el event loop.
+
+Configuración:
+- MOBICORP_RATE_LIMITING=0 desactiva el control (pruebas de carga).
+- MOBICORP_RATE_LIMITS="scraping=30/10,reports=20/5": por clase,
+  peticiones por minuto / ráfaga.
+- MOBICORP_CONCURRENCY_LIMITS="scraping=8,reports=4": peticiones en curso
+  por clase y worker (0 = sin tope).
+"""
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from auth import token_subject
+from shared_state import StateBackend
+
+RATE_LIMITING = os.getenv("MOBICORP_RATE_LIMITING", "1") != "0"
+
+
+@dataclass
+class EndpointClass:
+    """Límites de una clase de endpoints"""
+    name: str
+    per_minute: float  # Peticiones por minuto y usuario (0 = sin límite)
+    burst: float  # Capacidad del bucket
+    concurrency: int  # Peticiones en curso por worker (0 = sin tope)
+
+
+DEFAULT_CLASSES = {
+    "auth": EndpointClass("auth", per_minute=20, burst=10, concurrency=8),
+    "scraping": EndpointClass("scraping", per_minute=30, burst=10, concurrency=8),
+    "reprice": EndpointClass("reprice", per_minute=4, burst=2, concurrency=2),
+    "reports": EndpointClass("reports", per_minute=30, burst=10, concurrency=4),
+    "chat": EndpointClass("chat", per_minute=60, burst=20, concurrency=8),
+    "default": EndpointClass("default", per_minute=600, burst=100, concurrency=0),
+}
+
+# (método, prefijo de la ruta, clase); gana la primera coincidencia
+ROUTE_CLASSES: List[Tuple[str, str, str]] = [
+    ("POST", "/api/auth/login", "auth"),
+    ("POST", "/api/auth/register", "auth"),
+    ("POST", "/api/auth/refresh", "auth"),
+    ("POST", "/api/prices/suggest", "scraping"),
+    ("POST", "/api/prices/reprice", "reprice"),
+    ("GET", "/api/reports/", "reports"),
+    ("POST", "/api/chat", "chat"),
+]
+
+# Prefijos que no pasan por el control de admisión
+EXEMPT_PREFIXES: Tuple[str, ...] = ("/uploads/",)
+
+
+def _parse_overrides(raw: str) -> Dict[str, str]:
+    """Leer "clase=valor,clase=valor" (entradas mal formadas se ignoran)"""
+    overrides = {}
+    for entry in raw.split(","):
+        name, _, value = entry.partition("=")
+        if name.strip() and value.strip():
+            overrides[name.strip()] = value.strip()
+    return overrides
+
+
+def load_classes() -> Dict[str, EndpointClass]:
+    """Clases por defecto con los ajustes de las variables de entorno"""
+    classes = {name: EndpointClass(**vars(cls)) for name, cls in DEFAULT_CLASSES.items()}
+    for name, value in _parse_overrides(os.getenv("MOBICORP_RATE_LIMITS", "")).items():
+        if name not in classes:
+            continue
+        per_minute, _, burst = value.partition("/")
+        try:
+            classes[name].per_minute = float(per_minute)
+            classes[name].burst = float(burst) if burst else max(float(per_minute), 1.0)
+        except ValueError:
+            continue
+    for name, value in _parse_overrides(os.getenv("MOBICORP_CONCURRENCY_LIMITS", "")).items():
+        if name in classes and value.isdigit():
+            classes[name].concurrency = int(value)
+    return classes
+
+
+def classify(method: str, path: str) -> str:
+    """Clase de endpoint de una petición"""
+    for route_method, prefix, name in ROUTE_CLASSES:
+        if method == route_method and path.startswith(prefix):
+            return name
+    return "default"
+
+
+class AdmissionController:
+    """Decide si una petición entra; lleva la cuenta de las que están en curso"""
+
+    def __init__(self, state: StateBackend, classes: Optional[Dict[str, EndpointClass]] = None):
+        self.state = state
+        self.classes = classes or load_classes()
+        self._in_flight: Dict[str, int] = {name: 0 for name in self.classes}
+        self._lock = threading.Lock()
+
+    def acquire(self, class_name: str, client: str) -> Optional[Tuple[float, str]]:
+        """
+        Admitir una petición de `client`. Devuelve None si entra (hay que
+        llamar a release() al terminar) o (segundos de espera, motivo).
+        """
+        endpoint = self.classes[class_name]
+        with self._lock:
+            if endpoint.concurrency and self._in_flight[class_name] >= endpoint.concurrency:
+                return 1.0, "concurrency"
+            self._in_flight[class_name] += 1
+        if endpoint.per_minute > 0:
+            wait = self.state.take_token(
+                f"{class_name}:{client}", endpoint.per_minute / 60, endpoint.burst
+            )
+            if wait > 0:
+                self.release(class_name)
+                return wait, "rate"
+        return None
+
+    async def admit(self, class_name: str, client: str) -> Optional[Tuple[float, str]]:
+        """acquire() para código async (con un backend compartido, fuera del event loop)"""
+        if self.state.shared:
+            return await run_in_threadpool(self.acquire, class_name, client)
+        return self.acquire(class_name, client)
+
+    def release(self, class_name: str) -> None:
+        with self._lock:
+            self._in_flight[class_name] -= 1
+
+    def in_flight(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._in_flight)
+
+
+def client_identity(scope) -> str:
+    """Usuario del token (cabecera Authorization o ?token=) o, si no hay, la IP"""
+    token = None
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                token = credentials.strip()
+            break
+    if token is None:
+        for pair in scope.get("query_string", b"").decode("latin-1").split("&"):
+            if pair.startswith("token="):
+                token = pair[len("token="):]
+                break
+    subject = token_subject(token) if token else None
+    if subject:
+        return f"user:{subject}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'desconocido'}"
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que aplica el control de admisión a las peticiones HTTP"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS" \
+                or scope.get("path", "").startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        class_name = classify(scope.get("method", ""), scope.get("path", ""))
+        rejected = await self.controller.admit(class_name, client_identity(scope))
+        if rejected is not None:
+            wait, reason = rejected
+            await _too_many_requests(send, wait, reason, class_name)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(class_name)
+
+
+def rejection_detail(reason: str) -> str:
+    """Mensaje para el usuario de un rechazo por `reason` (concurrency o rate)"""
+    if reason == "concurrency":
+        return "El servidor está atendiendo demasiadas solicitudes de este tipo; intente nuevamente en unos segundos"
+    return "Demasiadas solicitudes; intente nuevamente más tarde"
+
+
+async def _too_many_requests(send, wait: float, reason: str, class_name: str) -> None:
+    body = json.dumps({"detail": rejection_detail(reason), "limit": class_name, "reason": reason}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(wait))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,39 @@
+"""
+Script para grabar páginas reales de precios
+
+Descarga cada URL con PriceScraper.scrape_real_price y guarda la respuesta
+(HTML, estado, latencia) en la carpeta indicada, con un index.json. Luego
+bench_scraper.py --fixtures <carpeta> (o un ReplayFetcher de
+scraper_sim.py) las reproduce sin red. Volver a grabar una URL reemplaza
+la respuesta anterior.
+
+Uso:
+    python record_scraper_fixtures.py [--dir scraper_fixtures] URL [URL ...]
+    python record_scraper_fixtures.py --file urls.txt
+"""
+import argparse
+
+from price_scraper import PriceScraper
+from scraper_sim import FixtureStore, RecordingFetcher
+
+parser = argparse.ArgumentParser(description="Grabar páginas reales de precios para reproducirlas sin red")
+parser.add_argument("urls", nargs="*", help="URLs a grabar")
+parser.add_argument("--file", help="Archivo con una URL por línea")
+parser.add_argument("--dir", default="scraper_fixtures", help="Carpeta de la grabación")
+args = parser.parse_args()
+
+urls = list(args.urls)
+if args.file:
+    with open(args.file, encoding="utf-8") as file:
+        urls += [line.strip() for line in file if line.strip() and not line.startswith("#")]
+if not urls:
+    parser.error("Indique al menos una URL")
+
+store = FixtureStore(args.dir)
+scraper = PriceScraper(fetcher=RecordingFetcher(store))
+for url in urls:
+    result = scraper.scrape_real_price(url)
+    recorded = "grabada" if url in store.index() else "no grabada"
+    print(f"  {result['price'] if result else '-':>12}  {url} ({recorded})")
+
+print(f"\n[OK] {len(store.index())} páginas en {args.dir}")
@@ -0,0 +1,249 @@
+"""
+Lecturas de reportes aisladas de las escrituras
+
+Los reportes (/api/reports/*, el reporte del chatbot) no usan la base ni el
+pool de conexiones de los pedidos; leen de una fuente separada:
+
+- replica: si MOBICORP_REPORTING_DATABASE_URL apunta a una réplica de solo
+  lectura (ej. PostgreSQL con streaming replication), se usa su propio
+  engine; el retraso lo acota la réplica.
+- snapshot: con SQLite, una copia del archivo tomada con la API de backup
+  en línea (una sola lectura consistente; con WAL no bloquea a los que
+  escriben). Hay una sola copia por base y por máquina
+  (snapshot.<hash de la ruta de la base>.db en
+  MOBICORP_REPORTING_SNAPSHOT_DIR), compartida por todos los workers; la
+  copia guarda la ruta de su base y no se usa si no coincide. Se
+  refresca a pedido: cuando llega un reporte y la copia tiene más de
+  MOBICORP_REPORTING_MAX_STALENESS / 2 segundos, un hilo toma una nueva (sin
+  reportes no se copia nada). Entre procesos, un flock sobre snapshot.lock
+  de la copia deja que la tome uno solo; se escribe en un temporal y se publica con un
+  rename atómico. Cada reporte abre su propia conexión: los que ya estaban
+  leyendo siguen con el archivo anterior (el sistema lo conserva mientras
+  esté abierto) y los nuevos ven la copia nueva.
+- primary: MOBICORP_REPORTING_MAX_STALENESS=0 lee de la base principal.
+
+La antigüedad de los datos está acotada: si la copia supera
+MOBICORP_REPORTING_MAX_STALENESS (por ejemplo, el primer reporte después de
+un rato sin reportes, mientras se toma la copia nueva), la lectura va a la
+base principal.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (cada worker puede refrescar)
+    fcntl = None
+
+REPORTING_URL = os.getenv("MOBICORP_REPORTING_DATABASE_URL", "")
+MAX_STALENESS = float(os.getenv("MOBICORP_REPORTING_MAX_STALENESS", "60"))
+SNAPSHOT_DIR = Path(os.getenv("MOBICORP_REPORTING_SNAPSHOT_DIR", "reporting"))
+SOURCE_TABLE = "_snapshot_source"  # Ruta de la base de la que salió la copia
+
+
+class ReportingDatabase:
+    """Sesiones de lectura para reportes (réplica, copia compartida o base principal)"""
+
+    def __init__(self, primary_engine: Engine, primary_sessions: sessionmaker, url: str = REPORTING_URL,
+                 max_staleness: float = MAX_STALENESS, snapshot_dir: Path = SNAPSHOT_DIR):
+        self.primary_sessions = primary_sessions
+        self.max_staleness = max_staleness
+        self.snapshot_dir = Path(snapshot_dir)
+        self.name = "snapshot"
+        self.path = self.snapshot_dir / f"{self.name}.db"
+        self._primary_path: Optional[str] = None
+        self._checked: Optional[Tuple[Tuple[int, int], bool]] = None  # ((inodo, mtime), coincide) de la copia
+        self._replica_sessions: Optional[sessionmaker] = None
+        self._replica_engine: Optional[Engine] = None
+        self._snapshot_engine: Optional[Engine] = None
+        self._snapshot_sessions: Optional[sessionmaker] = None
+        if url:
+            self.mode = "replica"
+            self._replica_engine = create_engine(url)
+            self._replica_sessions = sessionmaker(autocommit=False, autoflush=False, bind=self._replica_engine)
+        elif primary_engine.url.get_backend_name() == "sqlite" and primary_engine.url.database \
+                and primary_engine.url.database != ":memory:" and max_staleness > 0:
+            self.mode = "snapshot"
+            self._primary_path = os.path.realpath(primary_engine.url.database)
+            # Una copia por base: dos bases en la misma carpeta no se pisan
+            digest = hashlib.sha1(self._primary_path.encode("utf-8")).hexdigest()[:12]
+            self.name = f"snapshot.{digest}"
+            self.path = self.snapshot_dir / f"{self.name}.db"
+            # Sin pool: cada sesión abre el archivo publicado en ese momento
+            self._snapshot_engine = create_engine(
+                f"sqlite:///file:{self.path}?mode=ro&uri=true", poolclass=NullPool,
+                connect_args={"check_same_thread": False},
+            )
+            self._snapshot_sessions = sessionmaker(autocommit=False, autoflush=False, bind=self._snapshot_engine)
+        else:
+            self.mode = "primary"
+        self._refresh_lock = threading.Lock()
+        self._flag_lock = threading.Lock()  # Aparte: no esperar a una copia en curso
+        self._refreshing = False
+        self.refreshes = 0
+        self.fallbacks = 0
+        self.last_refresh_ms = 0.0
+
+    # ---- ciclo de vida ----
+
+    def start(self) -> None:
+        """
+        Borrar copias que dejaron versiones anteriores: por proceso
+        (snapshot-<pid>-<n>.db) y la compartida sin base (snapshot.db)
+        """
+        if self.mode != "snapshot" or not self.snapshot_dir.is_dir():
+            return
+        for stale in [*self.snapshot_dir.glob("snapshot-*.db"), self.snapshot_dir / "snapshot.db"]:
+            stale.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Cerrar conexiones (la copia compartida queda para los otros workers)"""
+        for engine in (self._snapshot_engine, self._replica_engine):
+            if engine is not None:
+                engine.dispose()
+
+    # ---- copia ----
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Tomar una copia nueva y publicarla con un rename atómico. False si
+        otro proceso la está tomando o (sin force) ya la tomó hace menos de
+        max_staleness / 2
+        """
+        if self.mode != "snapshot":
+            return False
+        with self._refresh_lock:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.snapshot_dir / f"{self.name}.lock", "a") as lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        return False  # Otro worker la está tomando
+                age = self.age()
+                if not force and age is not None and age <= self.max_staleness / 2:
+                    return False
+                # Con el lock tomado, un temporal existente es de un proceso que murió copiando
+                for orphan in self.snapshot_dir.glob(f"{self.name}.db.tmp-*"):
+                    orphan.unlink(missing_ok=True)
+                temp = self.snapshot_dir / f"{self.name}.db.tmp-{os.getpid()}"
+                started = time.time()
+                source = sqlite3.connect(f"file:{self._primary_path}?mode=ro", uri=True)
+                target = sqlite3.connect(str(temp))
+                try:
+                    # Un solo paso: una transacción de lectura consistente
+                    source.backup(target)
+                    target.execute(f"CREATE TABLE {SOURCE_TABLE} (path TEXT NOT NULL)")
+                    target.execute(f"INSERT INTO {SOURCE_TABLE} (path) VALUES (?)", (self._primary_path,))
+                    target.commit()
+                    target.execute("PRAGMA journal_mode=DELETE")
+                finally:
+                    target.close()
+                    source.close()
+                # La fecha del archivo es la de los datos (el inicio de la copia)
+                os.utime(temp, (started, started))
+                os.replace(temp, self.path)
+        self.refreshes += 1
+        self.last_refresh_ms = (time.time() - started) * 1000
+        return True
+
+    def _refresh_in_background(self) -> None:
+        with self._flag_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error al refrescar la copia de reportes: {type(e).__name__}: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="reporting-snapshot", daemon=True).start()
+
+    # ---- lecturas ----
+
+    def age(self) -> Optional[float]:
+        """
+        Segundos desde que se tomó la copia vigente (None si no hay o si
+        salió de otra base)
+        """
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        if not self._same_source((stat.st_ino, stat.st_mtime_ns)):
+            return None
+        return max(time.time() - stat.st_mtime, 0.0)
+
+    def _same_source(self, identity: Tuple[int, int]) -> bool:
+        """Si la copia salió de esta base (se lee una vez por archivo publicado)"""
+        if self._checked is not None and self._checked[0] == identity:
+            return self._checked[1]
+        try:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                row = connection.execute(f"SELECT path FROM {SOURCE_TABLE}").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            row = None
+        matches = row is not None and row[0] == self._primary_path
+        if not matches:
+            print(f"Copia de reportes {self.path} no corresponde a {self._primary_path}: se ignora")
+        self._checked = (identity, matches)
+        return matches
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """
+        Sesión para un reporte; session.info["data_age"] indica la antigüedad
+        de los datos en segundos (0 = base principal)
+        """
+        if self.mode == "replica":
+            db = self._replica_sessions()
+            db.info["data_age"] = 0.0
+            with db:
+                yield db
+            return
+
+        if self.mode == "snapshot":
+            age = self.age()
+            if age is None or age > self.max_staleness / 2:
+                self._refresh_in_background()
+            if age is not None and age <= self.max_staleness:
+                db = self._snapshot_sessions()
+                db.info["data_age"] = age
+                with db:
+                    yield db
+                return
+            self.fallbacks += 1
+
+        db = self.primary_sessions()
+        db.info["data_age"] = 0.0
+        with db:
+            yield db
+
+    def stats(self) -> Dict:
+        age = self.age() if self.mode == "snapshot" else None
+        return {
+            "mode": self.mode,
+            "max_staleness": self.max_staleness,
+            "age_seconds": round(age, 2) if age is not None else None,
+            "refreshes": self.refreshes,
+            "fallbacks": self.fallbacks,
+            "last_refresh_ms": round(self.last_refresh_ms, 1),
+        }
@@ -0,0 +1,25 @@
+"""
+Script para rotar la clave de firma de los tokens
+
+Agrega una clave nueva al archivo de claves (MOBICORP_JWT_KEYS_FILE,
+jwt_keys.json por defecto) y la marca activa. Los workers en marcha la
+toman en unos segundos, sin reiniciar: los tokens nuevos se firman con
+ella y los ya emitidos se siguen verificando con las anteriores. Se
+conservan las --keep claves más recientes; al retirar una, los tokens
+firmados con ella dejan de valer (rotar con una frecuencia menor que
+MOBICORP_REFRESH_TOKEN_DAYS para no cerrar sesiones).
+
+Uso:
+    python rotate_jwt_key.py [--keep 3]
+"""
+import argparse
+
+from tokens import KEYS_FILE, rotate_key_file
+
+parser = argparse.ArgumentParser(description="Rotar la clave de firma de los tokens")
+parser.add_argument("--keep", type=int, default=3, help="Claves que se conservan (incluida la nueva)")
+parser.add_argument("--file", default=KEYS_FILE, help="Archivo de claves")
+args = parser.parse_args()
+
+kid = rotate_key_file(args.file, keep=args.keep)
+print(f"[OK] Clave activa: {kid} ({args.file})")
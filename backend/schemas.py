@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
 # ==================== USUARIOS ====================
@@ -22,6 +22,15 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None  # Se canjea en /api/auth/refresh por un par nuevo
+    expires_in: Optional[int] = None  # Segundos de vigencia del token de acceso
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+    all_sessions: bool = False  # Revocar todos los tokens del usuario (todos los dispositivos)
 
 # ==================== PRODUCTOS ====================
 
@@ -43,26 +52,90 @@ class ProductResponse(ProductBase):
     id: int
     created_at: datetime
 
+class ProductLookup(BaseModel):
+    """Producto en versión compacta para selectores y búsqueda incremental"""
+    id: int
+    name: str
+    sku: Optional[str] = None
+    price: Optional[float] = None
+    stock: int = 0
+
+class CategoryNode(BaseModel):
+    id: int
+    name: str
+    path: str
+    product_count: int
+    children: List["CategoryNode"] = []
+
 # ==================== PEDIDOS ====================
 
-class OrderBase(BaseModel):
+class OrderItemCreate(BaseModel):
     product_id: int
     quantity: int
     requested_price: float
 
-class OrderCreate(OrderBase):
-    pass
+class OrderItemResponse(OrderItemCreate):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    final_price: Optional[float]
+    product: ProductResponse
+
+class OrderCreate(BaseModel):
+    # Pedido de una línea (formato original) o varias líneas en items
+    product_id: Optional[int] = None
+    quantity: Optional[int] = None
+    requested_price: Optional[float] = None
+    items: List[OrderItemCreate] = []
 
-class OrderResponse(OrderBase):
+class OrderResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
     id: int
+    product_id: Optional[int]
+    quantity: Optional[int]
+    requested_price: Optional[float]
     final_price: Optional[float]
     status: str
     user_id: int
     created_at: datetime
     approved_at: Optional[datetime]
-    product: ProductResponse
+    product: Optional[ProductResponse]
+    items: List[OrderItemResponse] = []
+    total_requested: float
+    total_final: Optional[float]
+
+class OrderItemApproval(BaseModel):
+    item_id: int
+    final_price: float
+
+class OrderApproval(BaseModel):
+    # final_price sirve para pedidos de una línea; los de varias líneas
+    # indican el precio de cada ítem
+    final_price: Optional[float] = None
+    items: List[OrderItemApproval] = []
+
+class OrderDecision(BaseModel):
+    order_id: int
+    action: str = "approve"  # approve | reject
+    final_price: Optional[float] = None
+    items: List[OrderItemApproval] = []
+
+class OrderBatchRequest(BaseModel):
+    decisions: List[OrderDecision]
+
+class OrderDecisionResult(BaseModel):
+    order_id: int
+    action: str
+    success: bool
+    status: Optional[str] = None
+    detail: Optional[str] = None
+
+class OrderBatchResponse(BaseModel):
+    approved: int
+    rejected: int
+    failed: int
+    results: List[OrderDecisionResult]
 
 # ==================== COMPARACIÓN DE PRECIOS ====================
 
@@ -76,9 +149,56 @@ class PriceSuggestion(BaseModel):
     min_price: float
     max_price: float
     avg_price: float
+    median_price: float
+    trimmed_mean: float
+    outlier_sources: List[str] = []
     market_sources: List[MarketSource]
     comparison_id: int
 
+class PriceHistoryPoint(BaseModel):
+    bucket_start: datetime
+    observations: int
+    min_price: float
+    max_price: float
+    avg_price: float
+
+class PriceHistoryResponse(BaseModel):
+    product_id: int
+    resolution: str  # hour, day, week
+    points: List[PriceHistoryPoint]  # Todas las fuentes
+    sources: Dict[str, List[PriceHistoryPoint]] = {}  # Por fuente (by_source=true)
+
+class AlertRuleCreate(BaseModel):
+    # Exactamente uno de los dos: producto o ruta de categoría
+    product_id: Optional[int] = None
+    category: Optional[str] = None
+    threshold_percent: float
+
+class AlertRuleResponse(AlertRuleCreate):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    created_at: datetime
+
+class RepriceRequest(BaseModel):
+    product_ids: List[int] = []
+    category: Optional[str] = None  # Incluye subcategorías
+
+class RepriceResult(BaseModel):
+    product_id: int
+    product_name: str
+    current_price: Optional[float]
+    suggested_price: float
+    median_price: float
+    outlier_sources: List[str] = []
+    comparison_id: int
+    alert: bool
+
+class RepriceResponse(BaseModel):
+    repriced: int
+    alerts: int
+    results: List[RepriceResult]
+
 class PriceComparisonResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -91,6 +211,46 @@ class PriceComparisonResponse(BaseModel):
     source_count: int
     created_at: datetime
     product: ProductResponse
+    archived: bool = False  # Viene de price_comparisons_archive
+
+# ==================== DASHBOARD ====================
+
+class DashboardStats(BaseModel):
+    total_products: int
+    total_orders: int
+    orders_by_status: Dict[str, int]
+    pending_orders: int
+    total_revenue: float  # Pedidos aprobados: suma de precio final × cantidad
+    price_alerts: int
+    latest_alert_id: Optional[int] = None  # Para suscribirse al stream de alertas
+
+# ==================== TAREAS EN SEGUNDO PLANO ====================
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str  # queued, running, succeeded, failed, cancelled
+    progress: float = 0.0  # 0 a 1
+    message: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    error: Optional[str] = None
+    params: Dict[str, Any] = {}
+    result: Optional[Any] = None  # La misma respuesta que el endpoint síncrono
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# ==================== AUDITORÍA ====================
+
+class AuditEventResponse(BaseModel):
+    id: int
+    action: str  # create_order, approve_order, reject_order, create_product, suggest_price, reprice
+    user_id: Optional[int] = None
+    entity: Optional[str] = None
+    entity_id: Optional[int] = None
+    details: Dict[str, Any] = {}
+    created_at: datetime
 
 # ==================== CHATBOT ====================
 
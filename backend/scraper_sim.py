@@ -0,0 +1,323 @@
+"""
+Simulador de fuentes de precios y grabación/reproducción de páginas
+
+PriceScraper.scrape_prices devuelve precios al azar tras una espera fija:
+no sirve para medir ni para comparar dos corridas. Este módulo agrega:
+
+- SimulatedScraper: fuentes falsas deterministas. Cada fuente tiene un
+  perfil (SourceProfile) con su rango de precios, latencia (lognormal
+  alrededor de la mediana), tasa de errores y cola lenta (una fracción de
+  las consultas tarda slow_ms más). Todo sale de la semilla, la fuente, el
+  producto y el número de consulta de ese producto: la misma semilla da
+  los mismos precios, latencias y errores aunque las consultas lleguen en
+  paralelo y en otro orden. Las fuentes se consultan en serie (como
+  PriceScraper) o en paralelo, con un timeout opcional por fuente; con
+  time_scale < 1 las esperas se acortan y stats() sigue informando el
+  tiempo simulado.
+- FixtureStore, RecordingFetcher y ReplayFetcher: graban las respuestas
+  reales que descarga PriceScraper.scrape_real_price (HTML, estado,
+  latencia) en una carpeta con index.json y después las reproducen sin
+  red, con la latencia grabada o una fija.
+
+La app usa el simulador con MOBICORP_SCRAPER=sim (ver README_BACKEND.md);
+bench_scraper.py lo usa para medir el camino de precios sin red.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from price_scraper import FetchedPage, Fetcher, PriceScraper, http_fetch
+
+SEED = int(os.getenv("MOBICORP_SCRAPER_SEED", "0"))
+# Ajustes para todas las fuentes: "latency_ms=150,error_rate=0.02,slow_rate=0.01,slow_ms=3000"
+PROFILE_OVERRIDES = os.getenv("MOBICORP_SCRAPER_PROFILE", "")
+MODE = os.getenv("MOBICORP_SCRAPER_FANOUT", "sequential")
+TIMEOUT_MS = float(os.getenv("MOBICORP_SCRAPER_TIMEOUT_MS", "0"))
+TIME_SCALE = float(os.getenv("MOBICORP_SCRAPER_TIME_SCALE", "1"))
+
+SEQUENTIAL = "sequential"
+PARALLEL = "parallel"
+
+
+@dataclass(frozen=True)
+class SourceProfile:
+    """Comportamiento simulado de una fuente"""
+    name: str
+    url: str  # Plantilla con {product}
+    low: float  # Rango del precio respecto del precio base
+    high: float
+    latency_ms: float = 80.0  # Mediana
+    jitter: float = 0.35  # Sigma de la lognormal (0 = latencia fija)
+    error_rate: float = 0.0
+    slow_rate: float = 0.0  # Fracción de consultas en la cola lenta
+    slow_ms: float = 2000.0  # Latencia extra de la cola lenta
+
+
+# Las fuentes de PriceScraper, con sus rangos de precio
+DEFAULT_SOURCES: Tuple[SourceProfile, ...] = (
+    SourceProfile("Agimex", "https://agimex.com/productos/{product}", 0.85, 1.15),
+    SourceProfile("Corimexo", "https://corimexo.com/buscar?q={product}", 0.90, 1.20),
+    SourceProfile("Blau", "https://blau.com/productos/{product}", 0.88, 1.12),
+    SourceProfile("Living Room", "https://livingroom.com/item/{product}", 0.92, 1.18),
+    SourceProfile("Tua Casa", "https://tuacasa.com/catalogo/{product}", 0.85, 1.10),
+    SourceProfile("La cuisine", "https://lacuisine.com/productos/{product}", 0.90, 1.15),
+)
+
+
+def parse_profile_overrides(raw: str) -> Dict[str, float]:
+    """Leer "campo=valor,campo=valor" (campos desconocidos o mal formados se ignoran)"""
+    fields = {"latency_ms", "jitter", "error_rate", "slow_rate", "slow_ms"}
+    overrides = {}
+    for entry in raw.split(","):
+        name, _, value = entry.partition("=")
+        name = name.strip()
+        if name in fields:
+            try:
+                overrides[name] = float(value)
+            except ValueError:
+                continue
+    return overrides
+
+
+def with_overrides(sources, **overrides) -> Tuple[SourceProfile, ...]:
+    """Los mismos perfiles con algunos campos cambiados en todas las fuentes"""
+    return tuple(replace(profile, **overrides) for profile in sources)
+
+
+@dataclass(frozen=True)
+class SourceOutcome:
+    """Resultado simulado de consultar una fuente"""
+    source: str
+    price: float
+    url: str
+    latency_ms: float
+    error: bool
+    slow: bool
+
+
+class SimulatedScraper(PriceScraper):
+    """PriceScraper con fuentes simuladas deterministas (misma interfaz scrape_prices)"""
+
+    def __init__(self, seed: int = SEED, sources=DEFAULT_SOURCES, mode: str = SEQUENTIAL,
+                 timeout_ms: float = 0.0, time_scale: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        super().__init__()
+        if mode not in (SEQUENTIAL, PARALLEL):
+            raise ValueError(f"Modo desconocido: {mode}")
+        self.seed = seed
+        self.sources = tuple(sources)
+        self.mode = mode
+        self.timeout_ms = timeout_ms
+        self.time_scale = time_scale
+        self.sleep = sleep
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.slow = 0
+        self.simulated_ms = 0.0
+
+    @classmethod
+    def from_env(cls) -> "SimulatedScraper":
+        """Simulador configurado con las variables MOBICORP_SCRAPER_*"""
+        sources = with_overrides(DEFAULT_SOURCES, **parse_profile_overrides(PROFILE_OVERRIDES))
+        return cls(seed=SEED, sources=sources, mode=MODE, timeout_ms=TIMEOUT_MS, time_scale=TIME_SCALE)
+
+    # ---- simulación ----
+
+    def plan(self, product_name: str, category: str = None, call: int = 0) -> List[SourceOutcome]:
+        """Lo que devuelve cada fuente en la consulta número `call` del producto (sin esperar)"""
+        base = self._estimate_base_price(product_name, category)
+        outcomes = []
+        for profile in self.sources:
+            # El precio depende solo del producto (un mercado estable); la
+            # latencia y los errores cambian de una consulta a otra
+            price_rng = random.Random(f"{self.seed}|{profile.name}|{product_name}")
+            rng = random.Random(f"{self.seed}|{profile.name}|{product_name}|{call}")
+            latency = profile.latency_ms * (rng.lognormvariate(0, profile.jitter) if profile.jitter else 1.0)
+            slow = rng.random() < profile.slow_rate
+            if slow:
+                latency += profile.slow_ms
+            outcomes.append(SourceOutcome(
+                source=profile.name,
+                price=round(base * price_rng.uniform(profile.low, profile.high), 2),
+                url=profile.url.format(product=product_name.replace(" ", "-")),
+                latency_ms=latency,
+                error=rng.random() < profile.error_rate,
+                slow=slow,
+            ))
+        return outcomes
+
+    def elapsed_ms(self, outcomes: List[SourceOutcome]) -> float:
+        """Tiempo de la consulta completa: suma (en serie) o máximo (en paralelo), con el timeout"""
+        waits = [
+            min(outcome.latency_ms, self.timeout_ms) if self.timeout_ms else outcome.latency_ms
+            for outcome in outcomes
+        ]
+        if not waits:
+            return 0.0
+        return sum(waits) if self.mode == SEQUENTIAL else max(waits)
+
+    def scrape_prices(self, product_name: str, category: str = None) -> List[Dict]:
+        """Consultar las fuentes simuladas; las que fallan o superan el timeout no aparecen"""
+        with self._lock:
+            call = self._calls.get(product_name, 0)
+            self._calls[product_name] = call + 1
+        outcomes = self.plan(product_name, category, call)
+        elapsed = self.elapsed_ms(outcomes)
+        if self.time_scale > 0:
+            self.sleep(elapsed * self.time_scale / 1000)
+
+        results = []
+        errors = timeouts = 0
+        for outcome in outcomes:
+            if self.timeout_ms and outcome.latency_ms > self.timeout_ms:
+                timeouts += 1
+            elif outcome.error:
+                errors += 1
+            else:
+                results.append({"source": outcome.source, "price": outcome.price, "url": outcome.url})
+        with self._lock:
+            self.calls += 1
+            self.requests += len(outcomes)
+            self.errors += errors
+            self.timeouts += timeouts
+            self.slow += sum(1 for outcome in outcomes if outcome.slow)
+            self.simulated_ms += elapsed
+        return results
+
+    def reset(self) -> None:
+        """Volver a la primera consulta de cada producto y poner los contadores en cero"""
+        with self._lock:
+            self._calls.clear()
+            self.calls = self.requests = self.errors = self.timeouts = self.slow = 0
+            self.simulated_ms = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "seed": self.seed,
+            "mode": self.mode,
+            "timeout_ms": self.timeout_ms,
+            "calls": self.calls,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "slow": self.slow,
+            "simulated_ms": round(self.simulated_ms, 1),
+        }
+
+
+# ==================== GRABACIÓN Y REPRODUCCIÓN ====================
+
+class FixtureMissing(LookupError):
+    """La URL no está grabada"""
+
+
+class FixtureStore:
+    """
+    Carpeta de respuestas grabadas: un archivo por URL (<sha1>.html) e
+    index.json con URL, archivo, estado, tipo de contenido y latencia
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Dict]] = None
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / "index.json"
+
+    def index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            try:
+                self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                self._index = {}
+        return self._index
+
+    def save(self, page: FetchedPage) -> None:
+        """Grabar (o reemplazar) la respuesta de page.url"""
+        name = hashlib.sha1(page.url.encode("utf-8")).hexdigest() + ".html"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / name).write_bytes(page.content)
+            index = self.index()
+            index[page.url] = {
+                "file": name,
+                "status": page.status,
+                "content_type": page.content_type,
+                "elapsed_ms": round(page.elapsed_ms, 1),
+                "recorded_at": datetime.now(timezone.utc).isoformat(),
+            }
+            # Escritura atómica: un índice a medio escribir perdería toda la grabación
+            temp = self.index_path.with_suffix(".tmp")
+            temp.write_text(json.dumps(index, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+            os.replace(temp, self.index_path)
+
+    def load(self, url: str) -> Optional[FetchedPage]:
+        entry = self.index().get(url)
+        if entry is None:
+            return None
+        return FetchedPage(
+            url=url,
+            status=entry["status"],
+            content=(self.directory / entry["file"]).read_bytes(),
+            content_type=entry["content_type"],
+            elapsed_ms=entry["elapsed_ms"],
+        )
+
+    def urls(self) -> List[str]:
+        return sorted(self.index())
+
+
+class RecordingFetcher:
+    """Fetcher que descarga con `inner` y graba cada respuesta en el store"""
+
+    def __init__(self, store: FixtureStore, inner: Fetcher = http_fetch):
+        self.store = store
+        self.inner = inner
+
+    def __call__(self, url: str, headers: Dict[str, str], timeout: float) -> FetchedPage:
+        page = self.inner(url, headers, timeout)
+        self.store.save(page)
+        return page
+
+
+class ReplayFetcher:
+    """
+    Fetcher sin red: devuelve la respuesta grabada (FixtureMissing si no
+    está). latency_ms=None reproduce la latencia grabada; un número la fija
+    """
+
+    def __init__(self, store: FixtureStore, latency_ms: Optional[float] = None, time_scale: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.time_scale = time_scale
+        self.sleep = sleep
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, url: str, headers: Dict[str, str], timeout: float) -> FetchedPage:
+        page = self.store.load(url)
+        if page is None:
+            self.misses += 1
+            raise FixtureMissing(url)
+        self.hits += 1
+        latency = page.elapsed_ms if self.latency_ms is None else self.latency_ms
+        if latency > timeout * 1000:
+            self.sleep(timeout * self.time_scale)
+            raise TimeoutError(f"Sin respuesta en {timeout}s (grabada: {latency:.0f} ms)")
+        if self.time_scale > 0:
+            self.sleep(latency * self.time_scale / 1000)
+        return page
@@ -0,0 +1,54 @@
+"""
+Servicios de construcción diferida
+
+Los servicios con dependencias pesadas (scraper: requests + BeautifulSoup;
+motor de precios: NumPy) se construyen en su primer uso y no al importar
+main.py: los scripts, las pruebas y el arranque de cada worker no pagan
+por módulos que quizá no usen. El lifespan de la app puede precargarlos en
+segundo plano apenas el worker está listo (MOBICORP_PRELOAD_SERVICES).
+"""
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LazyService(Generic[T]):
+    """
+    Proxy de un servicio que se construye con factory() la primera vez que
+    se usa (una sola vez aunque lleguen varias peticiones a la vez). Los
+    atributos se delegan a la instancia: lazy.scrape_prices(...) funciona
+    igual que con el servicio real.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str = ""):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "servicio")
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def override(self, instance: T) -> None:
+        """Reemplazar el servicio (pruebas, simuladores del loadtest)"""
+        with self._lock:
+            self._instance = instance
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str):
+        # Solo se llama para atributos que el proxy no tiene
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = "cargado" if self.loaded else "sin cargar"
+        return f"<LazyService {self._name} ({state})>"
@@ -0,0 +1,343 @@
+"""
+Estado compartido entre workers
+
+Con varios procesos (uvicorn --workers) cada worker tiene sus propias
+cachés en memoria; para que sigan siendo coherentes, lo que debe verse
+igual en todos pasa por un backend intercambiable:
+
+- Versiones de temas (products, orders, categories, alert_rules, ...): cada
+  caché local guarda la versión con la que se construyó y se descarta en
+  cuanto la versión compartida cambia. bump() la incrementa tras una
+  escritura. Leer una versión nunca sale del proceso: el backend Redis
+  mantiene una copia local que actualiza por pub/sub.
+- Pub/sub: difusión de eventos (alertas de precio) a todos los workers.
+- Clave-valor JSON con TTL: contexto de conversación del chatbot.
+- Token buckets: límites de peticiones por usuario, globales a todos los
+  workers (rate_limit).
+
+Backends (MOBICORP_STATE_URL):
+- "memory" (por defecto): un solo proceso, sin dependencias.
+- "redis://host:6379/0": Redis o compatible (Valkey, KeyDB); requiere el
+  paquete `redis`.
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+STATE_URL = os.getenv("MOBICORP_STATE_URL", "memory")
+STATE_PREFIX = os.getenv("MOBICORP_STATE_PREFIX", "mobicorp")
+
+Callback = Callable[[Dict], None]
+
+
+class StateBackend(ABC):
+    """Interfaz de los backends de estado compartido (no se instancia directamente)"""
+
+    name = "base"
+    shared = False  # True si varios procesos ven el mismo estado
+
+    @abstractmethod
+    def version(self, topic: str) -> int:
+        """Versión actual del tema (0 si nunca se incrementó)"""
+
+    def versions(self, topics: Iterable[str]) -> Dict[str, int]:
+        return {topic: self.version(topic) for topic in topics}
+
+    @abstractmethod
+    def bump(self, *topics: str) -> None:
+        """Incrementar la versión de los temas (llamar después del commit)"""
+
+    @abstractmethod
+    def publish(self, channel: str, message: Dict) -> None:
+        """Entregar un mensaje a los suscriptores del canal en todos los workers"""
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        """Registrar un callback; puede ejecutarse en otro hilo"""
+
+    @abstractmethod
+    def get_json(self, key: str) -> Optional[Any]:
+        """Valor guardado en la clave (None si no existe o venció)"""
+
+    @abstractmethod
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Guardar un valor serializable a JSON, con vencimiento opcional en segundos"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Borrar la clave"""
+
+    @abstractmethod
+    def take_token(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """
+        Consumir `cost` fichas del token bucket `key` (se recarga a `rate`
+        fichas por segundo hasta `capacity`). Devuelve 0 si se consumieron o
+        los segundos que faltan para que alcancen (sin consumir nada).
+        """
+
+    def start(self) -> None:
+        """Iniciar tareas de fondo (se llama en el arranque de la app)"""
+
+    def close(self) -> None:
+        """Liberar conexiones e hilos (se llama al cerrar la app)"""
+
+
+class MemoryBackend(StateBackend):
+    """Estado en memoria del proceso (un solo worker)"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._versions: Dict[str, int] = {}
+        self._values: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # key -> [fichas, último acceso]
+        self._subscribers: Dict[str, List[Callback]] = {}
+        self._lock = threading.Lock()
+
+    def version(self, topic: str) -> int:
+        return self._versions.get(topic, 0)
+
+    def bump(self, *topics: str) -> None:
+        with self._lock:
+            for topic in topics:
+                self._versions[topic] = self._versions.get(topic, 0) + 1
+
+    def publish(self, channel: str, message: Dict) -> None:
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            _dispatch(callback, message)
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def get_json(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires, raw = entry
+            if expires is not None and time.monotonic() > expires:
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+        return json.loads(raw)
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        # Se guarda serializado, igual que en Redis: quien lee recibe una copia
+        raw = json.dumps(value)
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._values[key] = (expires, raw)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_keys:
+                self._values.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def take_token(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [capacity, now]
+                self._buckets[key] = bucket
+                # Un bucket desalojado vuelve lleno: el límite solo se relaja
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / rate
+
+
+# Token bucket atómico; usa el reloj de Redis para que todos los workers
+# midan el tiempo igual. Devuelve "0" o los segundos de espera.
+_TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(state[2])) * rate)
+end
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBackend(StateBackend):
+    """
+    Estado en Redis (o compatible), compartido por todos los workers
+
+    Las versiones viven en un hash; cada worker guarda una copia local que
+    un hilo actualiza con los mensajes de pub/sub y, por si se perdió
+    alguno (reconexión), releyendo el hash cada resync_seconds.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str = STATE_PREFIX, resync_seconds: float = 5.0):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "MOBICORP_STATE_URL apunta a Redis pero el paquete 'redis' no está instalado "
+                "(pip install redis)"
+            ) from e
+        self.url = url
+        self.prefix = prefix
+        self.resync_seconds = resync_seconds
+        self._client = redis.Redis.from_url(url)
+        self._versions_key = f"{prefix}:versions"
+        self._versions_channel = f"{prefix}:versions"
+        self._versions: Dict[str, int] = {}
+        self._subscribers: Dict[str, List[Callback]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._take_token = self._client.register_script(_TAKE_TOKEN_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def version(self, topic: str) -> int:
+        if self._listener is None:
+            # Sin hilo de escucha (scripts, pruebas): leer directo
+            value = self._client.hget(self._versions_key, topic)
+            return int(value) if value else 0
+        return self._versions.get(topic, 0)
+
+    def bump(self, *topics: str) -> None:
+        if not topics:
+            return
+        pipe = self._client.pipeline()
+        for topic in topics:
+            pipe.hincrby(self._versions_key, topic, 1)
+        values = pipe.execute()
+        changed = dict(zip(topics, values))
+        self._merge_versions(changed)
+        self._client.publish(self._versions_channel, json.dumps(changed))
+
+    def _merge_versions(self, versions: Dict[str, int]) -> None:
+        # Las versiones solo crecen: un mensaje atrasado no las hace retroceder
+        with self._lock:
+            for topic, value in versions.items():
+                if int(value) > self._versions.get(topic, 0):
+                    self._versions[topic] = int(value)
+
+    def _resync(self) -> None:
+        raw = self._client.hgetall(self._versions_key)
+        self._merge_versions({key.decode(): int(value) for key, value in raw.items()})
+
+    def publish(self, channel: str, message: Dict) -> None:
+        self._client.publish(self._key(f"channel:{channel}"), json.dumps(message, default=str))
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def get_json(self, key: str) -> Optional[Any]:
+        raw = self._client.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._client.set(self._key(key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self._key(key))
+
+    def take_token(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        return float(self._take_token(keys=[self._key(f"bucket:{key}")], args=[rate, capacity, cost]))
+
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+        self._resync()
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen, name="shared-state-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        channel_prefix = self._key("channel:")
+        while not self._stopping.is_set():
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Un solo patrón cubre versiones y canales de eventos
+                pubsub.psubscribe(f"{self.prefix}:*")
+                self._resync()  # Lo que cambió antes de suscribirse
+                last_resync = time.monotonic()
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "pmessage":
+                        channel = message["channel"].decode()
+                        payload = json.loads(message["data"])
+                        if channel == self._versions_channel:
+                            self._merge_versions(payload)
+                        elif channel.startswith(channel_prefix):
+                            with self._lock:
+                                callbacks = list(self._subscribers.get(channel[len(channel_prefix):], ()))
+                            for callback in callbacks:
+                                _dispatch(callback, payload)
+                    if time.monotonic() - last_resync >= self.resync_seconds:
+                        self._resync()
+                        last_resync = time.monotonic()
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                print(f"[Estado compartido] Conexión a Redis perdida ({type(e).__name__}: {e}); reintentando")
+                self._stopping.wait(1.0)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def close(self) -> None:
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+        self._client.close()
+
+
+def _dispatch(callback: Callback, message: Dict) -> None:
+    try:
+        callback(message)
+    except Exception as e:
+        print(f"[Estado compartido] Error en suscriptor: {type(e).__name__}: {e}")
+
+
+def create_backend(url: Optional[str] = None) -> StateBackend:
+    """Backend según MOBICORP_STATE_URL ("memory" o "redis://...")"""
+    url = url or STATE_URL
+    if url == "memory":
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"MOBICORP_STATE_URL no soportada: {url!r} (use 'memory' o 'redis://...')")
@@ -0,0 +1,142 @@
+"""
+Prueba de estrés de creación concurrente de pedidos
+
+Crea productos con poco stock, lanza muchos pedidos (individuales y en lote)
+en paralelo contra la API real y verifica que:
+- el stock nunca queda negativo,
+- stock final = stock inicial - unidades de los pedidos aceptados,
+- rechazar cada pedido aceptado (dos veces, en paralelo) devuelve exactamente
+  el stock inicial.
+
+Uso:
+    python stress_orders.py [--products 5] [--stock 10] [--orders 400] [--concurrency 16]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DB_FILE = Path("stress_orders.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrés de reserva de stock en pedidos concurrentes")
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if DB_FILE.exists():
+        DB_FILE.unlink()
+    os.environ["MOBICORP_DATABASE_URL"] = f"sqlite:///./{DB_FILE}"
+
+    import requests
+    from database import SessionLocal, engine, Base
+    from models import User, Product
+    from auth import get_password_hash
+    from loadtest import start_server
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(email="stress@mobicorp.com", full_name="Stress", hashed_password=get_password_hash("stress123")))
+    for i in range(args.products):
+        db.add(Product(name=f"Silla de prueba {i + 1}", category="Asientos - Prueba", price=100.0, stock=args.stock))
+    db.commit()
+    product_ids = [p.id for p in db.query(Product).all()]
+    db.close()
+
+    server, _ = start_server(args.port, 0.0, args.seed)
+    url = f"http://127.0.0.1:{args.port}"
+    token = requests.post(f"{url}/api/auth/login", data={
+        "username": "stress@mobicorp.com", "password": "stress123",
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    rng = random.Random(args.seed)
+    # Tres de cada cuatro envíos son un pedido individual; el resto son 2-3 líneas,
+    # enviadas como lote de pedidos (/bulk) o como un pedido con varios ítems
+    payloads = []
+    for _ in range(args.orders):
+        lines = [{"product_id": rng.choice(product_ids), "quantity": rng.randint(1, 3), "requested_price": 100.0}
+                 for _ in range(1 if rng.random() < 0.75 else rng.randint(2, 3))]
+        payloads.append((lines, rng.random() < 0.5))
+
+    accepted, rejected, failed = [], 0, []
+    lock = threading.Lock()
+
+    def submit(payload):
+        nonlocal rejected
+        lines, multi_line = payload
+        session = requests.Session()
+        if len(lines) == 1:
+            response = session.post(f"{url}/api/orders", json=lines[0], headers=headers)
+            body = [response.json()] if response.status_code == 200 else None
+        elif multi_line:
+            response = session.post(f"{url}/api/orders", json={"items": lines}, headers=headers)
+            body = [response.json()] if response.status_code == 200 else None
+        else:
+            response = session.post(f"{url}/api/orders/bulk", json=lines, headers=headers)
+            body = response.json() if response.status_code == 200 else None
+        with lock:
+            if body is not None:
+                accepted.extend(body)
+            elif response.status_code == 409:
+                rejected += 1
+            else:
+                failed.append((response.status_code, response.text[:200]))
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(submit, payloads))
+
+    def stocks():
+        db = SessionLocal()
+        try:
+            return {p.id: p.stock for p in db.query(Product).all()}
+        finally:
+            db.close()
+
+    after_orders = stocks()
+    reserved = {pid: 0 for pid in product_ids}
+    for order in accepted:
+        for item in order["items"]:
+            reserved[item["product_id"]] += item["quantity"]
+
+    ok = not failed
+    for pid in product_ids:
+        expected = args.stock - reserved[pid]
+        if after_orders[pid] < 0 or after_orders[pid] != expected:
+            ok = False
+            print(f"[ERROR] producto {pid}: stock={after_orders[pid]} esperado={expected}")
+
+    # Rechazar cada pedido aceptado dos veces en paralelo: solo un rechazo debe liberar stock
+    def reject(order_id):
+        requests.post(f"{url}/api/orders/{order_id}/reject", headers=headers)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(reject, [o["id"] for o in accepted] * 2))
+
+    after_reject = stocks()
+    for pid in product_ids:
+        if after_reject[pid] != args.stock:
+            ok = False
+            print(f"[ERROR] producto {pid}: stock tras rechazos={after_reject[pid]} esperado={args.stock}")
+
+    print(f"Envíos: {len(payloads)} | pedidos aceptados: {len(accepted)} | "
+          f"rechazados por stock: {rejected} | errores: {len(failed)}")
+    for status, text in failed[:5]:
+        print(f"  [{status}] {text}")
+    print(f"Stock tras pedidos: {after_orders}")
+    print("OK: el stock se mantuvo consistente" if ok else "FALLO: inconsistencias de stock")
+
+    server.should_exit = True
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
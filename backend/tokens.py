@@ -0,0 +1,402 @@
+"""
+Tokens de acceso y de refresco
+
+- Claves (KeyRing): los tokens se firman con HS256 y llevan el ID de la
+  clave (kid) en la cabecera. Las claves salen de MOBICORP_JWT_KEYS
+  ("kid:secreto,kid2:secreto2", la primera firma) o del archivo
+  MOBICORP_JWT_KEYS_FILE (JSON {"active": kid, "keys": {kid: secreto}}; se
+  crea con una clave aleatoria si no existe). El archivo se relee cuando
+  cambia (se revisa cada KEYS_CHECK_SECONDS): rotar es agregar una clave,
+  marcarla activa y dejar las anteriores para verificar los tokens que
+  siguen vigentes (ver rotate_jwt_key.py). Sin reiniciar.
+- Verificación en caché: decodificar un JWT cuesta ~40 µs; cada token ya
+  verificado se guarda (hasta MOBICORP_AUTH_CACHE_SIZE) con sus claims y
+  las peticiones siguientes solo comprueban la expiración y la revocación.
+  El usuario también se cachea (MOBICORP_AUTH_USER_CACHE_SECONDS, el único
+  límite de cuánto tarda en verse un cambio de rol o una baja) y se adjunta
+  a la sesión de la petición sin consultar la base.
+- Revocación: cada token tiene un jti. Cerrar sesión guarda el jti en
+  revoked_tokens hasta que el token vence; revocar a un usuario guarda
+  "todos los emitidos hasta ahora". Cada worker mantiene esas entradas en
+  memoria (dict por jti y por email: consulta O(1)) y solo relee las
+  nuevas cuando cambia la versión del tema "revocations".
+- Refresco: el login entrega un token de acceso corto y uno de refresco
+  (MOBICORP_REFRESH_TOKEN_DAYS). Cada refresco revoca el token usado y
+  entrega un par nuevo, sin bcrypt. Presentar un token de refresco ya usado
+  indica que se filtró: se revocan todos los tokens del usuario.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import RevokedToken, User
+from shared_state import MemoryBackend, StateBackend
+
+ALGORITHM = "HS256"
+ACCESS_TOKEN_MINUTES = float(os.getenv("MOBICORP_ACCESS_TOKEN_MINUTES", "30"))
+REFRESH_TOKEN_DAYS = float(os.getenv("MOBICORP_REFRESH_TOKEN_DAYS", "7"))
+INLINE_KEYS = os.getenv("MOBICORP_JWT_KEYS", "")
+KEYS_FILE = os.getenv("MOBICORP_JWT_KEYS_FILE", "jwt_keys.json")
+KEYS_CHECK_SECONDS = 5.0
+CACHE_SIZE = int(os.getenv("MOBICORP_AUTH_CACHE_SIZE", "10000"))
+USER_CACHE_SECONDS = float(os.getenv("MOBICORP_AUTH_USER_CACHE_SECONDS", "30"))
+
+# Temas del estado compartido
+REVOCATIONS = "revocations"
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+
+class TokenError(Exception):
+    """Token inválido, vencido, revocado o de otro tipo"""
+
+
+# ==================== CLAVES ====================
+
+def _new_key() -> Tuple[str, str]:
+    kid = f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(2)}"
+    return kid, secrets.token_urlsafe(48)
+
+
+def _write_keys(path: Path, active: str, keys: Dict[str, str]) -> None:
+    """Escribir el archivo de claves de forma atómica (nunca se lee a medio escribir)"""
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+        json.dump({"active": active, "keys": keys}, file, indent=2)
+    os.replace(temporary, path)
+
+
+def rotate_key_file(path: str = KEYS_FILE, keep: int = 3) -> str:
+    """
+    Agregar una clave nueva y marcarla activa; se conservan las `keep` más
+    recientes para verificar los tokens ya emitidos. Devuelve el kid nuevo
+    """
+    path = Path(path)
+    data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {"keys": {}}
+    kid, secret = _new_key()
+    keys = dict(data["keys"])
+    keys[kid] = secret
+    keys = dict(list(keys.items())[-max(keep, 1):])
+    _write_keys(path, kid, keys)
+    return kid
+
+
+class KeyRing:
+    """Claves de firma por kid; la del archivo se recarga cuando cambia"""
+
+    def __init__(self, inline: str = INLINE_KEYS, path: Optional[str] = KEYS_FILE,
+                 check_seconds: float = KEYS_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.path: Optional[Path] = None
+        self.generation = 0  # Sube con cada recarga (los verificados en caché se descartan)
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        if inline:
+            pairs = [item.split(":", 1) for item in inline.split(",") if item.strip()]
+            self.keys = {kid.strip(): secret.strip() for kid, secret in pairs}
+            self.active = pairs[0][0].strip()
+        else:
+            self.path = Path(path)
+            if not self.path.exists():
+                kid, secret = _new_key()
+                try:
+                    # O_EXCL: si varios workers arrancan juntos, uno solo crea la clave
+                    descriptor = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                    with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                        json.dump({"active": kid, "keys": {kid: secret}}, file, indent=2)
+                    print(f"Clave de firma de tokens creada en {self.path}")
+                except FileExistsError:
+                    pass
+            self.keys, self.active = {}, ""
+            self._load()
+
+    def _load(self) -> None:
+        stat = self.path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        keys, active = dict(data["keys"]), data["active"]
+        if active not in keys:
+            raise ValueError(f"La clave activa '{active}' no está en {self.path}")
+        self.keys, self.active, self._stamp = keys, active, stamp
+        self.generation += 1
+
+    def refresh(self) -> None:
+        """Releer el archivo si cambió (como mucho cada check_seconds)"""
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.check_seconds:
+            return
+        with self._lock:
+            if now - self._checked < self.check_seconds:
+                return
+            self._checked = now
+            try:
+                self._load()
+            except (OSError, ValueError, KeyError) as e:
+                # Un archivo a medio editar a mano no deja a nadie afuera: siguen las claves anteriores
+                print(f"Error al recargar las claves de tokens: {type(e).__name__}: {e}")
+
+    def signing_key(self) -> Tuple[str, str]:
+        return self.active, self.keys[self.active]
+
+    def secret(self, kid: Optional[str]) -> Optional[str]:
+        return self.keys.get(kid) if kid else None
+
+
+# ==================== REVOCACIÓN ====================
+
+class RevocationList:
+    """Tokens revocados en memoria, sincronizados desde revoked_tokens"""
+
+    def __init__(self, session_factory: sessionmaker, state: StateBackend):
+        self.session_factory = session_factory
+        self.state = state
+        self._tokens: Dict[str, float] = {}  # jti -> vencimiento (epoch)
+        self._users: Dict[str, float] = {}  # email -> revocados los emitidos hasta (epoch)
+        self._version: Optional[int] = None
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, claims: Dict) -> bool:
+        self._sync()
+        if claims.get("jti") in self._tokens:
+            return True
+        before = self._users.get(claims.get("sub"))
+        return before is not None and claims.get("iat", 0) <= before
+
+    def _sync(self) -> None:
+        version = self.state.version(REVOCATIONS)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            now = time.time()
+            with self.session_factory() as db:
+                query = db.query(RevokedToken).filter(RevokedToken.id > self._last_id)
+                if self._version is None:
+                    query = query.filter(RevokedToken.expires_at > now)
+                rows = query.order_by(RevokedToken.id).all()
+            for row in rows:
+                self._apply(row.jti, row.email, row.revoked_before, row.expires_at)
+                self._last_id = max(self._last_id, row.id)
+            self._forget_expired(now)
+            self._version = version
+
+    def _apply(self, jti: Optional[str], email: Optional[str], revoked_before: Optional[float],
+               expires_at: float) -> None:
+        if jti:
+            self._tokens[jti] = expires_at
+        elif email:
+            self._users[email] = max(self._users.get(email, 0.0), revoked_before or 0.0)
+
+    def _forget_expired(self, now: float) -> None:
+        # Un token vencido ya no pasa la verificación: no hace falta recordarlo
+        for jti in [jti for jti, expires_at in self._tokens.items() if expires_at <= now]:
+            del self._tokens[jti]
+        horizon = now - REFRESH_TOKEN_DAYS * 86400
+        for email in [email for email, before in self._users.items() if before <= horizon]:
+            del self._users[email]
+
+    def revoke(self, db: Session, jti: Optional[str] = None, email: Optional[str] = None,
+               expires_at: Optional[float] = None) -> bool:
+        """
+        Revocar un token (jti) o todos los emitidos hasta ahora para un
+        usuario (email). Hace commit; False si el jti ya estaba revocado
+        """
+        now = time.time()
+        revoked_before = now if jti is None else None
+        expires_at = expires_at if expires_at is not None else now + REFRESH_TOKEN_DAYS * 86400
+        inserted = db.execute(
+            insert(RevokedToken).on_conflict_do_nothing(index_elements=["jti"]).returning(RevokedToken.id),
+            {"jti": jti, "email": email, "revoked_before": revoked_before, "expires_at": expires_at,
+             "created_at": datetime.now(timezone.utc)},
+        ).first() is not None
+        # Las entradas vencidas ya no sirven
+        db.query(RevokedToken).filter(RevokedToken.expires_at < now - 3600).delete(synchronize_session=False)
+        db.commit()
+        self._apply(jti, email, revoked_before, expires_at)
+        self.state.bump(REVOCATIONS)
+        return inserted
+
+    def stats(self) -> Dict:
+        return {"tokens": len(self._tokens), "users": len(self._users)}
+
+
+# ==================== SERVICIO ====================
+
+class TokenService:
+    """Emisión, verificación (en caché), refresco y revocación de tokens"""
+
+    def __init__(self, session_factory: sessionmaker, state: Optional[StateBackend] = None,
+                 keys: Optional[KeyRing] = None, cache_size: int = CACHE_SIZE,
+                 user_cache_seconds: float = USER_CACHE_SECONDS):
+        self.session_factory = session_factory
+        self.state = state or MemoryBackend()
+        self._keys = keys
+        self.revocations = RevocationList(session_factory, self.state)
+        self.cache_size = cache_size
+        self.user_cache_seconds = user_cache_seconds
+        self._verified: "OrderedDict[str, Dict]" = OrderedDict()
+        self._generation = 0
+        self._users: Dict[str, Tuple[float, User]] = {}  # email -> (vence, copia)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def keys(self) -> KeyRing:
+        # El archivo de claves se lee (o crea) con el primer token, no al importar
+        if self._keys is None:
+            with self._lock:
+                if self._keys is None:
+                    self._keys = KeyRing()
+        return self._keys
+
+    def bind_state(self, state: StateBackend) -> None:
+        """Usar el estado compartido de la app (revocaciones y usuarios en todos los workers)"""
+        self.state = state
+        self.revocations.state = state
+
+    # ---- emisión ----
+
+    def issue(self, email: str, user_id: Optional[int] = None, kind: str = ACCESS,
+              lifetime: Optional[float] = None) -> str:
+        """Firmar un token; lifetime en segundos (por defecto según el tipo)"""
+        if lifetime is None:
+            lifetime = ACCESS_TOKEN_MINUTES * 60 if kind == ACCESS else REFRESH_TOKEN_DAYS * 86400
+        # iat con milisegundos: un login justo después de "revocar todos" ya no queda revocado
+        now = round(time.time(), 3)
+        claims = {"sub": email, "type": kind, "jti": secrets.token_hex(16), "iat": now, "exp": int(now + lifetime)}
+        if user_id is not None:
+            claims["uid"] = user_id
+        keys = self.keys
+        keys.refresh()
+        kid, secret = keys.signing_key()
+        return jwt.encode(claims, secret, algorithm=ALGORITHM, headers={"kid": kid})
+
+    def issue_pair(self, user: User) -> Dict:
+        """Respuesta de login y refresco: token de acceso y de refresco"""
+        return {
+            "access_token": self.issue(user.email, user.id, ACCESS),
+            "refresh_token": self.issue(user.email, user.id, REFRESH),
+            "token_type": "bearer",
+            "expires_in": int(ACCESS_TOKEN_MINUTES * 60),
+        }
+
+    # ---- verificación ----
+
+    def decode(self, token: str) -> Dict:
+        """Claims de un token con firma válida y sin vencer (sin mirar la revocación)"""
+        keys = self.keys
+        keys.refresh()
+        if keys.generation != self._generation:
+            # Cambiaron las claves: un token firmado con una clave retirada deja de valer
+            with self._lock:
+                self._verified.clear()
+                self._generation = keys.generation
+        claims = self._verified.get(token)
+        if claims is not None:
+            if claims["exp"] > time.time():
+                self.hits += 1
+                return claims
+            self._verified.pop(token, None)
+            raise TokenError("Token vencido")
+        self.misses += 1
+        try:
+            secret = keys.secret(jwt.get_unverified_header(token).get("kid"))
+            if secret is None:
+                raise TokenError("Clave de firma desconocida")
+            claims = jwt.decode(token, secret, algorithms=[ALGORITHM])
+        except JWTError as e:
+            raise TokenError(str(e))
+        if "exp" not in claims or "jti" not in claims:
+            raise TokenError("Token sin vencimiento o identificador")
+        with self._lock:
+            self._verified[token] = claims
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return claims
+
+    def verify(self, token: str, kind: str = ACCESS) -> Dict:
+        """Claims de un token válido, vigente, no revocado y del tipo pedido"""
+        claims = self.decode(token)
+        if claims.get("type") != kind:
+            raise TokenError("Tipo de token incorrecto")
+        if self.revocations.is_revoked(claims):
+            raise TokenError("Token revocado")
+        return claims
+
+    def user(self, db: Session, claims: Dict) -> Optional[User]:
+        """
+        Usuario del token adjunto a la sesión `db`. Se parte de una copia en
+        caché (db.merge sin cargar: no consulta la base). La copia solo vence
+        a los user_cache_seconds: ningún endpoint modifica usuarios, así que
+        un cambio de rol o una baja hecha en la base tarda como mucho eso en
+        verse (revoke_user cierra las sesiones al instante)
+        """
+        email = claims["sub"]
+        entry = self._users.get(email)
+        now = time.monotonic()
+        if entry is None or entry[0] <= now:
+            with self.session_factory() as own:
+                user = own.query(User).filter(User.email == email).first()
+                if user is None:
+                    self._users.pop(email, None)
+                    return None
+                own.expunge(user)
+            entry = (now + self.user_cache_seconds, user)
+            if len(self._users) >= self.cache_size:
+                self._users.clear()
+            self._users[email] = entry
+        return db.merge(entry[1], load=False)
+
+    # ---- refresco y revocación ----
+
+    def refresh(self, db: Session, refresh_token: str) -> Dict:
+        """Canjear un token de refresco por un par nuevo (el usado queda revocado)"""
+        claims = self.decode(refresh_token)
+        if claims.get("type") != REFRESH:
+            raise TokenError("Tipo de token incorrecto")
+        if self.revocations.is_revoked(claims) or not self.revocations.revoke(db, claims["jti"], expires_at=claims["exp"]):
+            # Ya se había usado (o revocado): alguien más lo tiene. Se cierran todas las sesiones del usuario
+            self.revoke_user(db, claims["sub"])
+            raise TokenError("Token de refresco ya utilizado; inicie sesión nuevamente")
+        user = db.query(User).filter(User.email == claims["sub"]).first()
+        if user is None or not user.is_active:
+            raise TokenError("Usuario inexistente o inactivo")
+        return self.issue_pair(user)
+
+    def revoke(self, db: Session, claims: Dict) -> None:
+        self.revocations.revoke(db, claims["jti"], expires_at=claims["exp"])
+
+    def revoke_user(self, db: Session, email: str) -> None:
+        """Revocar todos los tokens emitidos hasta ahora para el usuario"""
+        self.revocations.revoke(db, email=email)
+
+    def stats(self) -> Dict:
+        return {
+            "cached_tokens": len(self._verified),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cached_users": len(self._users),
+            "revoked": self.revocations.stats(),
+            "active_key": self.keys.active,
+            "keys": len(self.keys.keys),
+        }
@@ -0,0 +1,16 @@
+import api from './client'
+
+// Producto en versión compacta (GET /api/products/lookup; stock actual)
+export interface CatalogProduct {
+  id: number
+  name: string
+  sku: string | null
+  price: number | null
+  stock: number
+}
+
+// Búsqueda incremental por nombre o SKU resuelta en el servidor
+export const lookupProducts = async (q: string, limit = 20): Promise<CatalogProduct[]> => {
+  const response = await api.get('/api/products/lookup', { params: { q, limit } })
+  return response.data
+}
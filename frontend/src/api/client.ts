@@ -2,7 +2,7 @@ import axios from 'axios'
 
 // Detectar si estamos en producción o desarrollo
 const isProduction = window.location.hostname !== 'localhost' && !window.location.hostname.includes('127.0.0.1')
-const API_BASE_URL = isProduction 
+export const API_BASE_URL = isProduction 
   ? 'https://innovahack-mobicorp.onrender.com'
   : 'http://localhost:8000'
 
@@ -29,18 +29,62 @@ api.interceptors.request.use((config) => {
   return config
 })
 
+// Un solo refresco en curso aunque fallen varias peticiones a la vez: el
+// token de refresco se puede usar una sola vez
+let refreshing: Promise<string> | null = null
+
+export function refreshAccessToken(): Promise<string> {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token')
+    refreshing = (refreshToken
+      ? axios.post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token: refreshToken }).then((response) => {
+          localStorage.setItem('token', response.data.access_token)
+          localStorage.setItem('refresh_token', response.data.refresh_token)
+          axios.defaults.headers.common['Authorization'] = `Bearer ${response.data.access_token}`
+          return response.data.access_token as string
+        })
+      : Promise.reject(new Error('Sin token de refresco'))
+    ).finally(() => {
+      refreshing = null
+    })
+  }
+  return refreshing
+}
+
 // Interceptor de respuesta para manejar errores de autenticación
 api.interceptors.response.use(
   (response) => response,
   (error) => {
+    const config = error.config
+    if (error.response?.status === 401 && config && !config._refreshed && localStorage.getItem('refresh_token')) {
+      // Token de acceso vencido: pedir uno nuevo con el de refresco y reintentar una vez
+      config._refreshed = true
+      return refreshAccessToken().then(() => api(config), () => {
+        localStorage.removeItem('token')
+        localStorage.removeItem('refresh_token')
+        if (window.location.pathname !== '/login') {
+          window.location.href = '/login'
+        }
+        return Promise.reject(error)
+      })
+    }
     if (error.response?.status === 401) {
       // Token expirado o inválido
       localStorage.removeItem('token')
+      localStorage.removeItem('refresh_token')
       // Solo redirigir si no estamos ya en la página de login
       if (window.location.pathname !== '/login') {
         window.location.href = '/login'
       }
     }
+    // Límite de peticiones: reintentar una vez las lecturas si la espera es corta
+    if (error.response?.status === 429 && config && config.method === 'get' && !config._retried) {
+      const retryAfter = Number(error.response.headers['retry-after'] || 1)
+      if (retryAfter <= 5) {
+        config._retried = true
+        return new Promise((resolve) => setTimeout(resolve, retryAfter * 1000)).then(() => api(config))
+      }
+    }
     return Promise.reject(error)
   }
 )
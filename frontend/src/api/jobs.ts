@@ -0,0 +1,47 @@
+import api from './client'
+
+// Tarea en segundo plano (GET /api/jobs/{id})
+export interface Job<T = any> {
+  id: number
+  kind: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+  progress: number
+  message: string | null
+  attempts: number
+  error: string | null
+  result: T | null
+}
+
+export class JobFailedError extends Error {
+  detail: string
+
+  constructor(job: Job) {
+    const detail = job.error || (job.status === 'cancelled' ? 'Tarea cancelada' : 'La tarea falló')
+    super(detail)
+    this.detail = detail
+  }
+}
+
+const POLL_MS = 500
+
+// Encolar una operación larga (?background=true) y esperar su resultado
+// consultando el estado de la tarea; onProgress recibe el avance (0 a 1)
+export const runJob = async <T = any>(
+  method: 'get' | 'post',
+  url: string,
+  options: { params?: Record<string, any>; data?: any; onProgress?: (job: Job<T>) => void } = {},
+): Promise<T> => {
+  const params = { ...options.params, background: true }
+  const response =
+    method === 'post' ? await api.post(url, options.data, { params }) : await api.get(url, { params })
+  let job: Job<T> = response.data
+  while (job.status === 'queued' || job.status === 'running') {
+    options.onProgress?.(job)
+    await new Promise((resolve) => setTimeout(resolve, POLL_MS))
+    job = (await api.get(`/api/jobs/${job.id}`)).data
+  }
+  if (job.status !== 'succeeded') {
+    throw new JobFailedError(job)
+  }
+  return job.result as T
+}
@@ -1,20 +1,97 @@
 import { useState, useRef, useEffect } from 'react'
 import { MessageCircle, X, Send } from 'lucide-react'
-import api from '../api/client'
+import api, { API_BASE_URL } from '../api/client'
+
+type ChatEntry = { type: 'user' | 'bot', text: string }
+
+// Mensajes del servidor en /api/chat/ws
+type ChatSocketMessage =
+  | { type: 'delta', text: string }
+  | { type: 'done' }
+  | { type: 'error', detail: string; retry_after?: number }
 
 export default function Chatbot() {
   const [isOpen, setIsOpen] = useState(false)
-  const [messages, setMessages] = useState<Array<{ type: 'user' | 'bot', text: string }>>([
+  const [messages, setMessages] = useState<Array<ChatEntry>>([
     { type: 'bot', text: '¡Hola! 👋 Soy tu asistente virtual de MobiCorp. ¿En qué puedo ayudarte?' }
   ])
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
+  const [streaming, setStreaming] = useState(false)
   const messagesEndRef = useRef<HTMLDivElement>(null)
+  const socketRef = useRef<WebSocket | null>(null)
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }, [messages])
 
+  // Cerrar la conexión del chatbot al desmontar el componente
+  useEffect(() => {
+    return () => socketRef.current?.close()
+  }, [])
+
+  const appendToLastBotMessage = (fragment: string) => {
+    setMessages(prev => {
+      const last = prev[prev.length - 1]
+      return [...prev.slice(0, -1), { ...last, text: last.text + fragment }]
+    })
+  }
+
+  const showError = () => {
+    setMessages(prev => [...prev, {
+      type: 'bot',
+      text: 'Lo siento, ocurrió un error. Por favor intenta de nuevo.'
+    }])
+  }
+
+  // Una sola conexión WebSocket (autenticada al conectar) atiende todos los mensajes
+  const getSocket = (): Promise<WebSocket> => {
+    const current = socketRef.current
+    if (current && current.readyState === WebSocket.OPEN) {
+      return Promise.resolve(current)
+    }
+    return new Promise((resolve, reject) => {
+      const token = localStorage.getItem('token') || ''
+      const url = `${API_BASE_URL.replace(/^http/, 'ws')}/api/chat/ws?token=${encodeURIComponent(token)}`
+      const socket = new WebSocket(url)
+      socket.onopen = () => {
+        socketRef.current = socket
+        resolve(socket)
+      }
+      socket.onerror = () => reject(new Error('No se pudo conectar con el asistente'))
+      socket.onclose = () => {
+        if (socketRef.current === socket) socketRef.current = null
+      }
+    })
+  }
+
+  const sendOverSocket = (socket: WebSocket, text: string): Promise<void> => {
+    return new Promise((resolve, reject) => {
+      let started = false
+      socket.onmessage = (event) => {
+        const data: ChatSocketMessage = JSON.parse(event.data)
+        if (data.type === 'delta') {
+          if (!started) {
+            started = true
+            setStreaming(true)
+            setMessages(prev => [...prev, { type: 'bot', text: data.text }])
+          } else {
+            appendToLastBotMessage(data.text)
+          }
+        } else if (data.type === 'error') {
+          reject(new Error(data.detail))
+        } else if (data.type === 'done') {
+          resolve()
+        }
+      }
+      socket.onclose = () => {
+        if (socketRef.current === socket) socketRef.current = null
+        reject(new Error('Conexión cerrada'))
+      }
+      socket.send(JSON.stringify({ message: text }))
+    })
+  }
+
   const handleSend = async () => {
     if (!input.trim() || loading) return
 
@@ -23,16 +100,26 @@ export default function Chatbot() {
     setMessages(prev => [...prev, { type: 'user', text: userMessage }])
     setLoading(true)
 
+    let socket: WebSocket | null = null
+    try {
+      socket = await getSocket()
+    } catch (error) {
+      socket = null
+    }
+
     try {
-      const response = await api.post('/api/chat', { message: userMessage })
-      setMessages(prev => [...prev, { type: 'bot', text: response.data.response }])
+      if (socket) {
+        await sendOverSocket(socket, userMessage)
+      } else {
+        // Respaldo: petición HTTP tradicional si el WebSocket no está disponible
+        const response = await api.post('/api/chat', { message: userMessage })
+        setMessages(prev => [...prev, { type: 'bot', text: response.data.response }])
+      }
     } catch (error) {
-      setMessages(prev => [...prev, { 
-        type: 'bot', 
-        text: 'Lo siento, ocurrió un error. Por favor intenta de nuevo.' 
-      }])
+      showError()
     } finally {
       setLoading(false)
+      setStreaming(false)
     }
   }
 
@@ -182,7 +269,7 @@ export default function Chatbot() {
                 {msg.text}
               </div>
             ))}
-            {loading && (
+            {loading && !streaming && (
               <div
                 style={{
                   alignSelf: 'flex-start',
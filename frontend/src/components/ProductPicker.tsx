@@ -0,0 +1,92 @@
+import { useEffect, useState } from 'react'
+import { CatalogProduct, lookupProducts } from '../api/catalog'
+
+interface ProductPickerProps {
+  id: string
+  value: CatalogProduct | null
+  onChange: (product: CatalogProduct | null) => void
+  ariaLabel: string
+  required?: boolean
+  placeholder?: string
+}
+
+const fieldStyle = {
+  width: '100%',
+  padding: '0.75rem',
+  border: '1px solid var(--border-dark)',
+  backgroundColor: 'var(--bg-tertiary)',
+  color: 'var(--text-primary)',
+  borderRadius: '8px',
+  fontSize: '1rem',
+}
+
+// Selector de producto por búsqueda incremental: solo se descargan los
+// productos que coinciden (como mucho 20), nunca el catálogo completo
+export default function ProductPicker({
+  id,
+  value,
+  onChange,
+  ariaLabel,
+  required,
+  placeholder = 'Buscar por nombre o SKU',
+}: ProductPickerProps) {
+  const [search, setSearch] = useState('')
+  const [matches, setMatches] = useState<CatalogProduct[]>([])
+
+  // Búsqueda en el servidor con una pausa corta entre teclas
+  useEffect(() => {
+    const text = search.trim()
+    if (!text) {
+      setMatches([])
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(() => {
+      lookupProducts(text)
+        .then((found) => {
+          if (cancelled) return
+          setMatches(found)
+          if (found.length === 1) onChange(found[0])
+        })
+        .catch((error) => console.error('Error searching products:', error))
+    }, 250)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [search])
+
+  // El elegido sigue en la lista aunque cambie la búsqueda
+  const options = value && !matches.some((p) => p.id === value.id) ? [value, ...matches] : matches
+
+  return (
+    <div>
+      <input
+        type="search"
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        placeholder={placeholder}
+        aria-label={`Buscar: ${ariaLabel}`}
+        style={{ ...fieldStyle, marginBottom: '0.5rem' }}
+      />
+      <select
+        id={id}
+        value={value?.id ?? ''}
+        onChange={(e) => onChange(options.find((p) => p.id === parseInt(e.target.value)) ?? null)}
+        required={required}
+        aria-label={ariaLabel}
+        style={fieldStyle}
+      >
+        <option value="">{search.trim() ? 'Seleccionar producto' : 'Escriba para buscar'}</option>
+        {options.map((p) => (
+          <option key={p.id} value={p.id}>
+            {p.name}
+            {p.sku ? ` - ${p.sku}` : ''}
+            {p.price !== null && p.price !== undefined ? ` - Bs. ${p.price.toFixed(2)}` : ' (Consultar precio)'}
+            {` - stock ${p.stock}`}
+          </option>
+        ))}
+      </select>
+    </div>
+  )
+}
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useState, useEffect } from 'react'
 import axios from 'axios'
+import api from '../api/client'
 
 // Detectar si estamos en producción o desarrollo
 const isProduction = window.location.hostname !== 'localhost' && !window.location.hostname.includes('127.0.0.1')
@@ -43,15 +44,18 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
 
   const fetchUser = async (authToken: string) => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/api/auth/me`, {
+      // Con el cliente de la API: si el token de acceso venció, se renueva con el de refresco
+      const response = await api.get('/api/auth/me', {
         headers: { Authorization: `Bearer ${authToken}` }
       })
       if (response.data) {
         setUser(response.data)
+        setToken(localStorage.getItem('token'))
       }
     } catch (error) {
       console.error('Error al obtener usuario:', error)
       localStorage.removeItem('token')
+      localStorage.removeItem('refresh_token')
       setToken(null)
       setUser(null)
     } finally {
@@ -70,13 +74,16 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
           'Content-Type': 'multipart/form-data'
         }
       })
-      const { access_token } = response.data
+      const { access_token, refresh_token } = response.data
 
       if (!access_token) {
         throw new Error('No se recibió el token de acceso')
       }
 
       localStorage.setItem('token', access_token)
+      if (refresh_token) {
+        localStorage.setItem('refresh_token', refresh_token)
+      }
       setToken(access_token)
       axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`
       await fetchUser(access_token)
@@ -124,7 +131,15 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   }
 
   const logout = () => {
+    // Revocar los tokens en el servidor (si falla, igual se cierra la sesión local)
+    const accessToken = localStorage.getItem('token')
+    if (accessToken) {
+      api.post('/api/auth/logout', { refresh_token: localStorage.getItem('refresh_token') }, {
+        headers: { Authorization: `Bearer ${accessToken}` }
+      }).catch(() => undefined)
+    }
     localStorage.removeItem('token')
+    localStorage.removeItem('refresh_token')
     setToken(null)
     setUser(null)
     delete axios.defaults.headers.common['Authorization']
@@ -1,6 +1,6 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { useNavigate } from 'react-router-dom'
-import api from '../api/client'
+import api, { API_BASE_URL, refreshAccessToken } from '../api/client'
 import { Package, ShoppingCart, TrendingUp, DollarSign, AlertCircle } from 'lucide-react'
 
 interface Stats {
@@ -11,6 +11,13 @@ interface Stats {
   priceAlerts: number
 }
 
+interface PriceAlert {
+  id: number
+  product_name: string
+  variation_percent: number
+  new_price: number
+}
+
 export default function Dashboard() {
   const [stats, setStats] = useState<Stats>({
     totalProducts: 0,
@@ -20,32 +27,63 @@ export default function Dashboard() {
     priceAlerts: 0,
   })
   const [loading, setLoading] = useState(true)
+  const [latestAlert, setLatestAlert] = useState<PriceAlert | null>(null)
+  const alertStream = useRef<EventSource | null>(null)
+  const lastAlertIdRef = useRef(0)
   const navigate = useNavigate()
 
   useEffect(() => {
     fetchStats()
+    return () => {
+      alertStream.current?.close()
+      alertStream.current = null
+    }
   }, [])
 
+  // Alertas en vivo: el servidor las empuja por SSE, sin consultas periódicas.
+  // last_event_id evita perder las alertas creadas entre la carga inicial y la conexión.
+  const subscribeAlerts = (lastAlertId: number) => {
+    alertStream.current?.close()
+    lastAlertIdRef.current = lastAlertId
+    const token = localStorage.getItem('token') || ''
+    const source = new EventSource(
+      `${API_BASE_URL}/api/prices/alerts/stream?token=${encodeURIComponent(token)}&last_event_id=${lastAlertId}`
+    )
+    source.addEventListener('alert', (event) => {
+      const alert: PriceAlert = JSON.parse((event as MessageEvent).data)
+      lastAlertIdRef.current = Math.max(lastAlertIdRef.current, alert.id)
+      setStats((prev) => ({ ...prev, priceAlerts: prev.priceAlerts + 1 }))
+      setLatestAlert(alert)
+    })
+    // Los cortes de red los reintenta el navegador, con el mismo token en la URL.
+    // Si el servidor rechaza la conexión (el token de acceso venció a los pocos
+    // minutos) el navegador se rinde: se pide un token nuevo y se vuelve a
+    // suscribir desde la última alerta recibida
+    source.onerror = () => {
+      if (source.readyState !== EventSource.CLOSED) return
+      refreshAccessToken()
+        .then(() => {
+          setTimeout(() => {
+            if (alertStream.current === source) subscribeAlerts(lastAlertIdRef.current)
+          }, 1000)
+        })
+        .catch((error) => console.error('Error reconnecting price alerts:', error))
+    }
+    alertStream.current = source
+  }
+
   const fetchStats = async () => {
     try {
-      const [productsRes, , alertsRes] = await Promise.all([
-        api.get('/api/products?limit=1'),
-        api.get('/api/orders?limit=1'),
-        api.get('/api/prices/alerts'),
-      ])
-
-      const orders = await api.get('/api/orders')
-      const ordersData = orders.data
-
+      // Una sola petición: el backend agrega productos, pedidos, ingresos y alertas
+      const { data } = await api.get('/api/dashboard/stats')
       setStats({
-        totalProducts: productsRes.data.length > 0 ? 100 : 0, // Aproximado
-        totalOrders: ordersData.length,
-        pendingOrders: ordersData.filter((o: any) => o.status === 'pending').length,
-        totalRevenue: ordersData
-          .filter((o: any) => o.final_price)
-          .reduce((sum: number, o: any) => sum + (o.final_price || 0), 0),
-        priceAlerts: alertsRes.data.length,
+        totalProducts: data.total_products,
+        totalOrders: data.total_orders,
+        pendingOrders: data.pending_orders,
+        totalRevenue: data.total_revenue,
+        priceAlerts: data.price_alerts,
       })
+      subscribeAlerts(data.latest_alert_id ?? 0)
     } catch (error) {
       console.error('Error fetching stats:', error)
     } finally {
@@ -168,6 +206,30 @@ export default function Dashboard() {
         })}
       </div>
 
+      {latestAlert && (
+        <div
+          onClick={() => navigate('/price-comparison')}
+          style={{
+            backgroundColor: 'var(--bg-card)',
+            border: '1px solid var(--border-dark)',
+            borderRadius: '12px',
+            padding: '1rem 1.5rem',
+            marginBottom: '2rem',
+            color: 'var(--text-primary)',
+            cursor: 'pointer',
+            display: 'flex',
+            alignItems: 'center',
+            gap: '0.75rem',
+          }}
+        >
+          <TrendingUp size={20} color="var(--warning)" />
+          <span>
+            Nueva alerta: <strong>{latestAlert.product_name}</strong> — variación de{' '}
+            {latestAlert.variation_percent.toFixed(1)}% (mercado Bs. {latestAlert.new_price.toFixed(2)})
+          </span>
+        </div>
+      )}
+
       <div
         style={{
           background: 'var(--bg-card)',
@@ -1,9 +1,11 @@
 import { useEffect, useState } from 'react'
 import api from '../api/client'
+import { CatalogProduct } from '../api/catalog'
+import ProductPicker from '../components/ProductPicker'
 import { Plus, Check, X, Clock } from 'lucide-react'
 import { format } from 'date-fns'
 
-interface Order {
+interface OrderItem {
   id: number
   product: {
     id: number
@@ -13,26 +15,36 @@ interface Order {
   }
   quantity: number
   requested_price: number
-  final_price?: number
+  final_price?: number | null
+}
+
+interface Order {
+  id: number
+  items: OrderItem[]
+  total_requested: number
+  total_final?: number | null
   status: string
   created_at: string
   approved_at?: string
 }
 
+interface OrderLine {
+  product: CatalogProduct | null
+  quantity: string
+  requested_price: string
+}
+
+const emptyLine: OrderLine = { product: null, quantity: '', requested_price: '' }
+
 export default function Orders() {
   const [orders, setOrders] = useState<Order[]>([])
   const [loading, setLoading] = useState(true)
   const [showForm, setShowForm] = useState(false)
-  const [products, setProducts] = useState<any[]>([])
-  const [formData, setFormData] = useState({
-    product_id: '',
-    quantity: '',
-    requested_price: '',
-  })
+  const [selected, setSelected] = useState<number[]>([])
+  const [lines, setLines] = useState<OrderLine[]>([emptyLine])
 
   useEffect(() => {
     fetchOrders()
-    fetchProducts()
   }, [])
 
   const fetchOrders = async () => {
@@ -46,42 +58,96 @@ export default function Orders() {
     }
   }
 
-  const fetchProducts = async () => {
-    try {
-      const response = await api.get('/api/products')
-      setProducts(response.data)
-    } catch (error) {
-      console.error('Error fetching products:', error)
-    }
-  }
-
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     try {
+      // Un pedido con todas sus líneas: una sola petición y una sola reserva de stock
       await api.post('/api/orders', {
-        ...formData,
-        product_id: parseInt(formData.product_id),
-        quantity: parseInt(formData.quantity),
-        requested_price: parseFloat(formData.requested_price),
+        items: lines.map((line) => ({
+          product_id: line.product!.id,
+          quantity: parseInt(line.quantity),
+          requested_price: parseFloat(line.requested_price),
+        })),
       })
       setShowForm(false)
-      setFormData({ product_id: '', quantity: '', requested_price: '' })
+      setLines([emptyLine])
       fetchOrders()
-    } catch (error) {
+    } catch (error: any) {
       console.error('Error creating order:', error)
-      alert('Error al crear el pedido')
+      // 409: stock insuficiente; el backend indica cuánto hay disponible
+      alert(error.response?.data?.detail || 'Error al crear el pedido')
     }
   }
 
-  const handleApprove = async (orderId: number, finalPrice: number) => {
+  const updateLine = <K extends keyof OrderLine>(index: number, field: K, value: OrderLine[K]) => {
+    setLines(lines.map((line, i) => (i === index ? { ...line, [field]: value } : line)))
+  }
+
+  const handleApprove = async (order: Order) => {
+    // Se pide el precio final de cada línea, con el solicitado como sugerencia
+    const items = []
+    for (const item of order.items) {
+      const finalPrice = prompt(
+        `Precio final aprobado para ${item.product.name} (x${item.quantity}):`,
+        item.requested_price.toString()
+      )
+      if (!finalPrice) {
+        return
+      }
+      items.push({ item_id: item.id, final_price: parseFloat(finalPrice) })
+    }
     try {
-      await api.post(`/api/orders/${orderId}/approve`, null, {
-        params: { final_price: finalPrice },
-      })
+      await api.post(`/api/orders/${order.id}/approve`, { items })
       fetchOrders()
-    } catch (error) {
+    } catch (error: any) {
       console.error('Error approving order:', error)
-      alert('Error al aprobar el pedido')
+      alert(error.response?.data?.detail || 'Error al aprobar el pedido')
+    }
+  }
+
+  const handleReject = async (orderId: number) => {
+    try {
+      await api.post(`/api/orders/${orderId}/reject`)
+      fetchOrders()
+    } catch (error) {
+      console.error('Error rejecting order:', error)
+      alert('Error al rechazar el pedido')
+    }
+  }
+
+  const toggleSelected = (orderId: number) => {
+    setSelected((prev) =>
+      prev.includes(orderId) ? prev.filter((id) => id !== orderId) : [...prev, orderId]
+    )
+  }
+
+  // Aprobación/rechazo en lote: una sola petición y una sola transacción en el backend
+  const handleBatch = async (action: 'approve' | 'reject') => {
+    const decisions = orders
+      .filter((order) => selected.includes(order.id))
+      .map((order) => ({
+        order_id: order.id,
+        action,
+        items:
+          action === 'approve'
+            ? order.items.map((item) => ({ item_id: item.id, final_price: item.requested_price }))
+            : [],
+      }))
+    try {
+      const response = await api.post('/api/orders/batch', { decisions })
+      const { approved, rejected, failed, results } = response.data
+      if (failed > 0) {
+        const errors = results
+          .filter((result: any) => !result.success)
+          .map((result: any) => `#${result.order_id}: ${result.detail}`)
+          .join('\n')
+        alert(`Aprobados: ${approved}, rechazados: ${rejected}, con error: ${failed}\n${errors}`)
+      }
+      setSelected([])
+      fetchOrders()
+    } catch (error: any) {
+      console.error('Error processing batch:', error)
+      alert(error.response?.data?.detail || 'Error al procesar los pedidos seleccionados')
     }
   }
 
@@ -149,39 +215,25 @@ export default function Orders() {
         >
           <h2 style={{ fontSize: '1.5rem', fontWeight: 'bold', marginBottom: '1.5rem', color: 'var(--text-primary)' }}>Crear Nuevo Pedido</h2>
           <form onSubmit={handleSubmit}>
-            <div style={{ display: 'grid', gridTemplateColumns: 'repeat(3, 1fr)', gap: '1rem', marginBottom: '1rem' }}>
+            {lines.map((line, index) => (
+            <div key={index} style={{ display: 'grid', gridTemplateColumns: 'repeat(3, 1fr) auto', gap: '1rem', marginBottom: '1rem', alignItems: 'end' }}>
               <div>
-                <label htmlFor="order-product" style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>Producto</label>
-                <select
-                  id="order-product"
-                  value={formData.product_id}
-                  onChange={(e) => setFormData({ ...formData, product_id: e.target.value })}
+                <label htmlFor={`order-product-${index}`} style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>Producto</label>
+                <ProductPicker
+                  id={`order-product-${index}`}
+                  value={line.product}
+                  onChange={(product) => updateLine(index, 'product', product)}
                   required
-                  aria-label="Seleccionar producto para el pedido"
-                  style={{
-                    width: '100%',
-                    padding: '0.75rem',
-                    border: '1px solid var(--border-dark)',
-                  backgroundColor: 'var(--bg-tertiary)',
-                  color: 'var(--text-primary)',
-                    borderRadius: '8px',
-                  }}
-                >
-                  <option value="">Seleccionar producto</option>
-                  {products.map((p) => (
-                    <option key={p.id} value={p.id}>
-                      {p.name} {p.price !== null && p.price !== undefined ? `- Bs. ${p.price.toFixed(2)}` : '(Consultar precio)'}
-                    </option>
-                  ))}
-                </select>
+                  ariaLabel="Seleccionar producto para el pedido"
+                />
               </div>
               <div>
-                <label htmlFor="order-quantity" style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>Cantidad</label>
+                <label htmlFor={`order-quantity-${index}`} style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>Cantidad</label>
                 <input
-                  id="order-quantity"
+                  id={`order-quantity-${index}`}
                   type="number"
-                  value={formData.quantity}
-                  onChange={(e) => setFormData({ ...formData, quantity: e.target.value })}
+                  value={line.quantity}
+                  onChange={(e) => updateLine(index, 'quantity', e.target.value)}
                   required
                   min="1"
                   placeholder="Ingrese la cantidad"
@@ -196,15 +248,15 @@ export default function Orders() {
                 />
               </div>
               <div>
-                <label htmlFor="order-price" style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>
+                <label htmlFor={`order-price-${index}`} style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>
                   Precio Solicitado (Bs.)
                 </label>
                 <input
-                  id="order-price"
+                  id={`order-price-${index}`}
                   type="number"
                   step="0.01"
-                  value={formData.requested_price}
-                  onChange={(e) => setFormData({ ...formData, requested_price: e.target.value })}
+                  value={line.requested_price}
+                  onChange={(e) => updateLine(index, 'requested_price', e.target.value)}
                   required
                   placeholder="0.00"
                   style={{
@@ -217,7 +269,43 @@ export default function Orders() {
                   }}
                 />
               </div>
+              <button
+                type="button"
+                onClick={() => setLines(lines.filter((_, i) => i !== index))}
+                disabled={lines.length === 1}
+                aria-label="Quitar línea"
+                style={{
+                  padding: '0.75rem',
+                  backgroundColor: 'var(--bg-tertiary)',
+                  color: 'white',
+                  border: 'none',
+                  borderRadius: '8px',
+                  cursor: lines.length === 1 ? 'not-allowed' : 'pointer',
+                }}
+              >
+                <X size={16} />
+              </button>
             </div>
+            ))}
+            <button
+              type="button"
+              onClick={() => setLines([...lines, emptyLine])}
+              style={{
+                padding: '0.5rem 1rem',
+                marginBottom: '1rem',
+                backgroundColor: 'var(--bg-tertiary)',
+                color: 'white',
+                border: 'none',
+                borderRadius: '8px',
+                cursor: 'pointer',
+                display: 'flex',
+                alignItems: 'center',
+                gap: '0.5rem',
+              }}
+            >
+              <Plus size={16} />
+              Agregar producto
+            </button>
             <div style={{ display: 'flex', gap: '1rem' }}>
               <button
                 type="submit"
@@ -253,6 +341,58 @@ export default function Orders() {
         </div>
       )}
 
+      {selected.length > 0 && (
+        <div
+          style={{
+            display: 'flex',
+            alignItems: 'center',
+            gap: '1rem',
+            marginBottom: '1rem',
+            padding: '1rem 1.5rem',
+            backgroundColor: 'var(--bg-card)',
+            border: '1px solid var(--border-dark)',
+            borderRadius: '12px',
+            color: 'var(--text-primary)',
+          }}
+        >
+          <span style={{ flex: 1 }}>{selected.length} pedido(s) seleccionado(s)</span>
+          <button
+            onClick={() => handleBatch('approve')}
+            style={{
+              padding: '0.5rem 1rem',
+              backgroundColor: 'var(--success)',
+              color: 'white',
+              border: 'none',
+              borderRadius: '8px',
+              cursor: 'pointer',
+              fontWeight: '500',
+              fontSize: '0.9rem',
+            }}
+          >
+            Aprobar al precio solicitado
+          </button>
+          <button
+            onClick={() => {
+              if (confirm('¿Rechazar los pedidos seleccionados? El stock reservado volverá al inventario.')) {
+                handleBatch('reject')
+              }
+            }}
+            style={{
+              padding: '0.5rem 1rem',
+              backgroundColor: 'var(--danger)',
+              color: 'white',
+              border: 'none',
+              borderRadius: '8px',
+              cursor: 'pointer',
+              fontWeight: '500',
+              fontSize: '0.9rem',
+            }}
+          >
+            Rechazar seleccionados
+          </button>
+        </div>
+      )}
+
       <div style={{ display: 'flex', flexDirection: 'column', gap: '1rem' }}>
         {orders.map((order) => (
           <div
@@ -269,20 +409,30 @@ export default function Orders() {
             <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'start', marginBottom: '1rem' }}>
               <div>
                 <h3 style={{ fontSize: '1.25rem', fontWeight: 'bold', marginBottom: '0.5rem', color: 'var(--text-primary)' }}>
+                  {order.status === 'pending' && (
+                    <input
+                      type="checkbox"
+                      checked={selected.includes(order.id)}
+                      onChange={() => toggleSelected(order.id)}
+                      style={{ marginRight: '0.75rem', cursor: 'pointer' }}
+                    />
+                  )}
                   Pedido #{order.id}
                 </h3>
+                {order.items.map((item) => (
+                  <p key={item.id} style={{ color: 'var(--text-secondary)', marginBottom: '0.25rem' }}>
+                    <strong>{item.product.name}</strong> — {item.quantity} unidades × Bs. {item.requested_price.toFixed(2)}
+                    {item.final_price !== null && item.final_price !== undefined && (
+                      <> (final Bs. {item.final_price.toFixed(2)})</>
+                    )}
+                  </p>
+                ))}
                 <p style={{ color: 'var(--text-secondary)', marginBottom: '0.25rem' }}>
-                  <strong>Producto:</strong> {order.product.name}
-                </p>
-                <p style={{ color: 'var(--text-secondary)', marginBottom: '0.25rem' }}>
-                  <strong>Cantidad:</strong> {order.quantity} unidades
-                </p>
-                <p style={{ color: 'var(--text-secondary)', marginBottom: '0.25rem' }}>
-                  <strong>Precio solicitado:</strong> Bs. {order.requested_price.toFixed(2)}
+                  <strong>Total solicitado:</strong> Bs. {order.total_requested.toFixed(2)}
                 </p>
-                {order.final_price && (
+                {order.total_final !== null && order.total_final !== undefined && (
                   <p style={{ color: 'var(--text-secondary)', marginBottom: '0.25rem' }}>
-                    <strong>Precio final:</strong> Bs. {order.final_price.toFixed(2)}
+                    <strong>Total final:</strong> Bs. {order.total_final.toFixed(2)}
                   </p>
                 )}
                 <p style={{ color: 'var(--text-tertiary)', fontSize: '0.9rem', marginTop: '0.5rem' }}>
@@ -304,17 +454,33 @@ export default function Orders() {
                   {getStatusIcon(order.status)}
                   <span style={{ textTransform: 'capitalize', fontWeight: '500' }}>{order.status}</span>
                 </div>
+                {order.status === 'pending' && (
+                  <button
+                    onClick={() => handleApprove(order)}
+                    style={{
+                      padding: '0.5rem 1rem',
+                      backgroundColor: 'var(--success)',
+                      color: 'white',
+                      border: 'none',
+                      borderRadius: '8px',
+                      cursor: 'pointer',
+                      fontWeight: '500',
+                      fontSize: '0.9rem',
+                    }}
+                  >
+                    Aprobar Pedido
+                  </button>
+                )}
                 {order.status === 'pending' && (
                   <button
                     onClick={() => {
-                      const finalPrice = prompt('Ingrese el precio final aprobado:', order.requested_price.toString())
-                      if (finalPrice) {
-                        handleApprove(order.id, parseFloat(finalPrice))
+                      if (confirm('¿Rechazar este pedido? El stock reservado volverá al inventario.')) {
+                        handleReject(order.id)
                       }
                     }}
                     style={{
                       padding: '0.5rem 1rem',
-                      backgroundColor: 'var(--success)',
+                      backgroundColor: 'var(--danger)',
                       color: 'white',
                       border: 'none',
                       borderRadius: '8px',
@@ -323,7 +489,7 @@ export default function Orders() {
                       fontSize: '0.9rem',
                     }}
                   >
-                    Aprobar Pedido
+                    Rechazar
                   </button>
                 )}
               </div>
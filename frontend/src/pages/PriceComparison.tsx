@@ -1,19 +1,16 @@
-import { useEffect, useState } from 'react'
-import api from '../api/client'
+import { useState } from 'react'
+import { CatalogProduct } from '../api/catalog'
+import ProductPicker from '../components/ProductPicker'
+import { runJob } from '../api/jobs'
 import { TrendingUp, RefreshCw } from 'lucide-react'
 
-interface Product {
-  id: number
-  name: string
-  category: string
-  price: number | null
-}
-
 interface PriceSuggestion {
   suggested_price: number
   min_price: number
   max_price: number
   avg_price: number
+  median_price: number
+  outlier_sources: string[]
   market_sources: Array<{
     source: string
     price: number
@@ -23,33 +20,22 @@ interface PriceSuggestion {
 }
 
 export default function PriceComparison() {
-  const [products, setProducts] = useState<Product[]>([])
-  const [selectedProduct, setSelectedProduct] = useState<number | null>(null)
+  const [selectedProduct, setSelectedProduct] = useState<CatalogProduct | null>(null)
   const [suggestion, setSuggestion] = useState<PriceSuggestion | null>(null)
   const [loading, setLoading] = useState(false)
 
-  useEffect(() => {
-    fetchProducts()
-  }, [])
-
-  const fetchProducts = async () => {
-    try {
-      const response = await api.get('/api/products')
-      setProducts(response.data)
-    } catch (error) {
-      console.error('Error fetching products:', error)
-    }
-  }
-
   const handleCompare = async () => {
     if (!selectedProduct) return
 
     setLoading(true)
     try {
-      const response = await api.post(`/api/prices/suggest?product_id=${selectedProduct}`)
-      setSuggestion(response.data)
+      // La consulta de mercado corre en segundo plano; se espera su resultado
+      const result = await runJob<PriceSuggestion>('post', '/api/prices/suggest', {
+        params: { product_id: selectedProduct.id },
+      })
+      setSuggestion(result)
     } catch (error: any) {
-      alert(error.response?.data?.detail || 'Error al comparar precios')
+      alert(error.detail || error.response?.data?.detail || 'Error al comparar precios')
     } finally {
       setLoading(false)
     }
@@ -77,28 +63,12 @@ export default function PriceComparison() {
         <div style={{ display: 'grid', gridTemplateColumns: '2fr 1fr', gap: '1rem', marginBottom: '1rem' }}>
           <div>
             <label htmlFor="price-comparison-product" style={{ display: 'block', marginBottom: '0.5rem', fontWeight: '500' }}>Seleccionar Producto</label>
-            <select
+            <ProductPicker
               id="price-comparison-product"
-              value={selectedProduct || ''}
-              onChange={(e) => setSelectedProduct(parseInt(e.target.value) || null)}
-              aria-label="Seleccionar producto para comparar precios"
-              style={{
-                width: '100%',
-                padding: '0.75rem',
-                border: '1px solid var(--border-dark)',
-                backgroundColor: 'var(--bg-tertiary)',
-                color: 'var(--text-primary)',
-                borderRadius: '8px',
-                fontSize: '1rem',
-              }}
-            >
-              <option value="">Seleccionar un producto</option>
-              {products.map((p) => (
-                <option key={p.id} value={p.id}>
-                  {p.name} - {p.category}
-                </option>
-              ))}
-            </select>
+              value={selectedProduct}
+              onChange={setSelectedProduct}
+              ariaLabel="Seleccionar producto para comparar precios"
+            />
           </div>
           <div style={{ display: 'flex', alignItems: 'end' }}>
             <button
@@ -169,8 +139,13 @@ export default function PriceComparison() {
               Bs. {suggestion.suggested_price.toFixed(2)}
             </p>
             <p style={{ color: 'var(--text-tertiary)', marginTop: '0.5rem', fontSize: '0.9rem' }}>
-              Basado en análisis de mercado
+              Basado en análisis de mercado (mediana: Bs. {suggestion.median_price.toFixed(2)})
             </p>
+            {suggestion.outlier_sources.length > 0 && (
+              <p style={{ color: 'var(--warning)', marginTop: '0.25rem', fontSize: '0.9rem' }}>
+                Fuentes descartadas por precio atípico: {suggestion.outlier_sources.join(', ')}
+              </p>
+            )}
           </div>
 
           {/* Estadísticas */}
@@ -456,6 +456,8 @@ export default function Products() {
                 <img
                   src={`${(window.location.hostname !== 'localhost' && !window.location.hostname.includes('127.0.0.1')) ? 'https://innovahack-mobicorp.onrender.com' : 'http://localhost:8000'}${product.image_url}`}
                   alt={product.name}
+                  loading="lazy"
+                  decoding="async"
                   style={{
                     width: '100%',
                     maxHeight: '200px',
@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react'
 import api from '../api/client'
+import { runJob } from '../api/jobs'
 import { Download, TrendingUp, DollarSign, ShoppingCart } from 'lucide-react'
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts'
 
@@ -18,16 +19,19 @@ interface OrderReport {
   }>
 }
 
+interface MarginEntry {
+  key: string
+  name: string
+  revenue: number
+  cost: number
+  margin: number
+  margin_percent: number
+}
+
 interface MarginReport {
   total_margin: number
   avg_margin_percent: number
-  margins: Array<{
-    order_id: number
-    product_name: string
-    cost: number
-    revenue: number
-    margin_percent: number
-  }>
+  top_products: MarginEntry[]
 }
 
 export default function Reports() {
@@ -41,12 +45,13 @@ export default function Reports() {
 
   const fetchReports = async () => {
     try {
-      const [ordersRes, marginsRes] = await Promise.all([
-        api.get('/api/reports/orders'),
-        api.get('/api/reports/margins'),
+      // El reporte de pedidos se genera en segundo plano; los márgenes ya vienen precalculados
+      const [orders, margins] = await Promise.all([
+        runJob<OrderReport>('get', '/api/reports/orders'),
+        api.get<MarginReport>('/api/reports/margins', { params: { top: 10 } }),
       ])
-      setOrderReport(ordersRes.data)
-      setMarginReport(marginsRes.data)
+      setOrderReport(orders)
+      setMarginReport(margins.data)
     } catch (error) {
       console.error('Error fetching reports:', error)
     } finally {
@@ -70,8 +75,8 @@ export default function Reports() {
       ]
     : []
 
-  const marginData = marginReport?.margins.slice(0, 10).map((m) => ({
-    name: m.product_name.substring(0, 20) + '...',
+  const marginData = marginReport?.top_products.map((m) => ({
+    name: m.name.substring(0, 20) + '...',
     margin: m.margin_percent,
   })) || []
 